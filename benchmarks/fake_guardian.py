@@ -0,0 +1,199 @@
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from test.fixtures import results_fixture
+
+# A local stand-in for the Guardian content API's search endpoint, serving
+# articles shaped like those in the test fixtures, with configurable delays
+# and injected failures.
+
+
+@dataclass(frozen=True)
+class FakeGuardianConfig:
+    """
+    How the fake API responds: `pages` pages of `page_size` articles, each
+    after `latency` seconds, with a fraction `rate_429` of requests refused
+    as rate limited (asking to wait `retry_after` seconds) and a fraction
+    `rate_5xx` failing with 503. Failures are drawn from a generator seeded
+    with `seed`, so a run is repeatable.
+    """
+
+    pages: int = 10
+    page_size: int = 200
+    latency: float = 0.0
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    retry_after: int = 0
+    seed: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.pages * self.page_size
+
+
+def make_results(count: int, start: int = 0) -> list[dict]:
+    """
+    Return `count` search results cycling through the fixture articles,
+    each given a unique id and URL.
+    """
+    results = []
+    for number in range(start, start + count):
+        fixture = results_fixture[number % len(results_fixture)]
+        id = f"{fixture['id']}-{number}"
+        results.append(
+            {
+                **fixture,
+                "id": id,
+                "webUrl": f"https://www.theguardian.com/{id}",
+                "apiUrl": f"https://content.guardianapis.com/{id}",
+            }
+        )
+    return results
+
+
+def page_body(config: FakeGuardianConfig, page: int) -> bytes:
+    """Return the encoded body of a page of search results."""
+    start = (page - 1) * config.page_size
+    return json.dumps(
+        {
+            "response": {
+                "status": "ok",
+                "userTier": "developer",
+                "total": config.total,
+                "startIndex": start + 1,
+                "pageSize": config.page_size,
+                "currentPage": page,
+                "pages": config.pages,
+                "orderBy": "newest",
+                "results": make_results(config.page_size, start),
+            }
+        }
+    ).encode("utf-8")
+
+
+class FakeGuardian:
+    """
+    Serve a `FakeGuardianConfig` over HTTP on a free local port, from a
+    background thread, until stopped. Page bodies are encoded up front so
+    the server's own JSON encoding does not count against the client.
+
+    Used as a context manager, the server runs for the body of the block.
+    """
+
+    def __init__(self, config: FakeGuardianConfig):
+        self.config = config
+        self.requests = 0
+        self.refused = 0
+        self.failed = 0
+        self._bodies = {
+            page: page_body(config, page)
+            for page in range(1, config.pages + 1)
+        }
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/search"
+
+    def _outcome(self) -> int:
+        """Count a request and draw the status code it is answered with."""
+        with self._lock:
+            self.requests += 1
+            draw = self._random.random()
+            if draw < self.config.rate_429:
+                self.refused += 1
+                return 429
+            if draw < self.config.rate_429 + self.config.rate_5xx:
+                self.failed += 1
+                return 503
+            return 200
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, which Nagle's
+            # algorithm would hold back for the client's delayed ACK.
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                page = int(query.get("page", ["1"])[0])
+                if fake.config.latency:
+                    time.sleep(fake.config.latency)
+
+                status = fake._outcome()
+                headers = {}
+                if status == 429:
+                    body = json.dumps(
+                        {"message": "API rate limit exceeded"}
+                    ).encode("utf-8")
+                    headers["Retry-After"] = str(fake.config.retry_after)
+                elif status == 503:
+                    body = json.dumps(
+                        {
+                            "response": {
+                                "status": "error",
+                                "message": "Service unavailable",
+                            }
+                        }
+                    ).encode("utf-8")
+                elif page in fake._bodies:
+                    body = fake._bodies[page]
+                else:
+                    status = 400
+                    body = json.dumps(
+                        {
+                            "response": {
+                                "status": "error",
+                                "message": (
+                                    "requested page is beyond the number "
+                                    "of available pages"
+                                ),
+                            }
+                        }
+                    ).encode("utf-8")
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-guardian"
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,414 @@
+import argparse
+from contextlib import ExitStack
+from dataclasses import asdict
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from unittest.mock import patch
+
+import boto3
+from moto import mock_aws
+from moto.sqs.models import Queue
+
+from benchmarks.fake_guardian import FakeGuardian, FakeGuardianConfig
+from src import aws_clients, fetch
+from src.http_session import close_session
+from src.main import run_query
+from src.message_format import ENCODINGS, MessageFormat
+from src.metrics import PERCENTILES, metrics
+from src.queries import Query
+from src.secret_cache import guardian_api_key
+from src.send_to_sqs import _serialise, send_to_sqs
+
+# End-to-end benchmark of the pipeline's stages, run against the fake
+# Guardian API and an in-process moto SQS queue, so results depend only on
+# the code and the machine. Run from the repository root with
+# `python -m benchmarks.run`.
+
+REGION = "eu-west-2"
+QUEUE_NAME = "benchmark"
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# The timer whose latency percentiles are reported for each stage.
+STAGE_TIMERS = {
+    "fetch": "guardian.request",
+    "serialise": "sqs.serialise",
+    "send": "sqs.send_message_batch",
+    "pipeline": "guardian.request",
+}
+
+# Fraction by which a stage may be slower, or use more memory, than the
+# baseline before it counts as a regression.
+DEFAULT_TOLERANCE = 0.2
+
+
+# moto counts a queue's messages on every send, so sending slows as the
+# queue fills and would swamp the pipeline's own costs. The pipeline never
+# reads these counts, so they are held at zero while benchmarking.
+QUEUE_COUNTS = (
+    "approximate_number_of_messages",
+    "approximate_number_of_messages_delayed",
+    "approximate_number_of_messages_not_visible",
+)
+
+
+def measure(run, timer: str, repeat: int = 3, before=None) -> dict:
+    """
+    Run a stage `repeat` times and return the throughput and latency
+    percentiles of its fastest run, then run it once more under
+    tracemalloc for its peak memory, which tracing would otherwise slow.
+
+    `run` returns the number of articles it handled. `before`, if given,
+    is called untimed before every run.
+    """
+    best = None
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        metrics.configure(enabled=True)
+        start = time.perf_counter()
+        articles = run()
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best[1]:
+            best = (articles, seconds, metrics.snapshot())
+    metrics.configure(enabled=False)
+
+    if before is not None:
+        before()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    articles, seconds, snapshot = best
+    latency = snapshot["timers"].get(timer, {})
+    return {
+        "articles": articles,
+        "seconds": seconds,
+        "articles_per_second": articles / seconds if seconds else 0.0,
+        **{f"p{p}_ms": latency.get(f"p{p}", 0.0) * 1000 for p in PERCENTILES},
+        "peak_memory_bytes": peak,
+    }
+
+
+def run_benchmark(
+    config: FakeGuardianConfig,
+    repeat: int = 3,
+    max_workers: int = 1,
+    stream: bool = False,
+    encoding: str = "json",
+    retry_backoff: float = 0.01,
+) -> dict:
+    """
+    Benchmark fetching every page the fake API serves, serialising the
+    articles, sending them to SQS, and the whole pipeline at once, and
+    return the results of each stage along with the configuration.
+
+    Requests refused with 429 are retried after `retry_backoff` seconds
+    rather than the production backoff, so injected rate limiting does not
+    dominate the run.
+    """
+    message_format = MessageFormat(encoding=encoding)
+    options = {
+        "page_size": config.page_size,
+        "max_workers": max_workers,
+        "stream": stream,
+    }
+    articles = []
+
+    def fetch_stage() -> int:
+        nonlocal articles
+        articles = list(fetch.iter_results("benchmark", **options))
+        return len(articles)
+
+    def serialise_stage() -> int:
+        return sum(1 for _ in _serialise(iter(articles), message_format))
+
+    def send_stage() -> int:
+        summary = send_to_sqs(
+            iter(articles), QUEUE_NAME, message_format=message_format
+        )
+        return summary.successful
+
+    def pipeline_stage() -> int:
+        stats = run_query(
+            Query("benchmark", None, QUEUE_NAME),
+            message_format=message_format,
+            **options,
+        )
+        return stats.sent
+
+    stages = {}
+    with ExitStack() as stack:
+        server = stack.enter_context(FakeGuardian(config))
+        stack.enter_context(mock_aws())
+        for name in QUEUE_COUNTS:
+            stack.enter_context(
+                patch.object(Queue, name, property(lambda queue: 0))
+            )
+        stack.enter_context(patch.object(fetch, "ENDPOINT", server.url))
+        stack.enter_context(
+            patch.object(fetch, "RETRY_BACKOFF", retry_backoff)
+        )
+        stack.callback(close_session)
+        stack.callback(aws_clients.clear)
+        stack.callback(guardian_api_key.clear)
+
+        aws_clients.clear()
+        guardian_api_key.clear()
+        boto3.client("secretsmanager", region_name=REGION).create_secret(
+            Name="GUARDIAN_API_KEY", SecretString="benchmark"
+        )
+        sqs = boto3.client("sqs", region_name=REGION)
+        queue_url = sqs.create_queue(QueueName=QUEUE_NAME)["QueueUrl"]
+
+        # moto slows as its queue fills, so every send starts with it empty.
+        def purge():
+            sqs.purge_queue(QueueUrl=queue_url)
+
+        for name, run, before in (
+            ("fetch", fetch_stage, None),
+            ("serialise", serialise_stage, None),
+            ("send", send_stage, purge),
+            ("pipeline", pipeline_stage, purge),
+        ):
+            stages[name] = measure(run, STAGE_TIMERS[name], repeat, before)
+
+        requests = {
+            "requests": server.requests,
+            "refused": server.refused,
+            "failed": server.failed,
+        }
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            **asdict(config),
+            "repeat": repeat,
+            "max_workers": max_workers,
+            "stream": stream,
+            "encoding": encoding,
+            "retry_backoff": retry_backoff,
+        },
+        "server": requests,
+        "stages": stages,
+    }
+
+
+def format_results(results: dict) -> str:
+    """Return a table of each stage's throughput, latency and memory."""
+    rows = [
+        (
+            "stage",
+            "articles",
+            "seconds",
+            "articles/s",
+            *(f"p{p} ms" for p in PERCENTILES),
+            "peak MiB",
+        )
+    ]
+    for name, stage in results["stages"].items():
+        rows.append(
+            (
+                name,
+                str(stage["articles"]),
+                f"{stage['seconds']:.3f}",
+                f"{stage['articles_per_second']:.1f}",
+                *(f"{stage[f'p{p}_ms']:.2f}" for p in PERCENTILES),
+                f"{stage['peak_memory_bytes'] / 1024 / 1024:.1f}",
+            )
+        )
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths))
+        for row in rows
+    )
+
+
+def compare(
+    results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE
+) -> list[str]:
+    """
+    Return a description of each stage whose throughput fell, or whose
+    peak memory rose, by more than `tolerance` against the baseline.
+    """
+    regressions = []
+    for name, stage in results["stages"].items():
+        before = baseline["stages"].get(name)
+        if before is None:
+            continue
+        rate, old_rate = (
+            stage["articles_per_second"],
+            before["articles_per_second"],
+        )
+        if old_rate and rate < old_rate * (1 - tolerance):
+            regressions.append(
+                f"{name}: {rate:.1f} articles/s, down from {old_rate:.1f}"
+            )
+        peak, old_peak = (
+            stage["peak_memory_bytes"],
+            before["peak_memory_bytes"],
+        )
+        if old_peak and peak > old_peak * (1 + tolerance):
+            regressions.append(
+                f"{name}: peak memory {peak} bytes, up from {old_peak}"
+            )
+    return regressions
+
+
+def save_results(results: dict, path: None | str = None) -> str:
+    """
+    Write results as JSON to `path`, or to a file in the results directory
+    named for the time of the run, and return the path written.
+    """
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = os.path.join(RESULTS_DIR, f"{stamp}.json")
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+    return path
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        os.environ.setdefault(name, "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", REGION)
+
+    parser = argparse.ArgumentParser(
+        description=(
+            "Benchmark the pipeline against a fake Guardian API and a moto "
+            "SQS queue."
+        )
+    )
+    parser.add_argument(
+        "--pages",
+        type=int,
+        default=10,
+        help="Number of pages of results the fake API serves.",
+    )
+    parser.add_argument(
+        "--page_size",
+        type=int,
+        default=200,
+        help="Number of articles on each page.",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Seconds the fake API waits before each response.",
+    )
+    parser.add_argument(
+        "--rate_429",
+        type=float,
+        default=0.0,
+        help="Fraction of requests refused with 429.",
+    )
+    parser.add_argument(
+        "--rate_5xx",
+        type=float,
+        default=0.0,
+        help="Fraction of requests failed with 503.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the injected failures.",
+    )
+    parser.add_argument(
+        "--retry_backoff",
+        type=float,
+        default=0.01,
+        help="Seconds of backoff before retrying a 429.",
+    )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=1,
+        help="Number of pages fetched concurrently.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse pages as they download.",
+    )
+    parser.add_argument(
+        "--encoding",
+        choices=ENCODINGS,
+        default="json",
+        help="How messages are encoded.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Times each stage is run; the fastest run is reported.",
+    )
+    parser.add_argument(
+        "--output",
+        help=(
+            "Path to save the results to. Default is a file in "
+            "benchmarks/results named for the time of the run."
+        ),
+    )
+    parser.add_argument(
+        "--baseline",
+        help=(
+            "Results of an earlier run to compare with, exiting with status "
+            "1 if any stage has regressed."
+        ),
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=(
+            "Fraction by which throughput may fall, or peak memory rise, "
+            "before a stage counts as regressed."
+        ),
+    )
+    args = parser.parse_args()
+    if args.stream and args.max_workers != 1:
+        parser.error("--stream cannot be used with --max_workers")
+
+    results = run_benchmark(
+        FakeGuardianConfig(
+            pages=args.pages,
+            page_size=args.page_size,
+            latency=args.latency,
+            rate_429=args.rate_429,
+            rate_5xx=args.rate_5xx,
+            seed=args.seed,
+        ),
+        repeat=args.repeat,
+        max_workers=args.max_workers,
+        stream=args.stream,
+        encoding=args.encoding,
+        retry_backoff=args.retry_backoff,
+    )
+    print(format_results(results))
+    print(f"Saved results to {save_results(results, args.output)}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline["config"] != results["config"]:
+            print("Baseline was run with a different configuration")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
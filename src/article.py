@@ -0,0 +1,154 @@
+from collections.abc import Mapping
+import sys
+
+# Fields every article sent to the queue is guaranteed to have.
+REQUIRED_FIELDS = ("id", "webPublicationDate", "webTitle", "webUrl")
+
+# Fields taking a handful of values across all articles, stored once each.
+INTERNED_FIELDS = (
+    "type",
+    "sectionId",
+    "sectionName",
+    "pillarId",
+    "pillarName",
+)
+
+# The fields of a search result, in the order the Guardian API returns them.
+FIELDS = (
+    "id",
+    "type",
+    "sectionId",
+    "sectionName",
+    "webPublicationDate",
+    "webTitle",
+    "webUrl",
+    "apiUrl",
+    "isHosted",
+    "pillarId",
+    "pillarName",
+)
+
+_FIELD_SET = frozenset(FIELDS)
+_MISSING = object()
+
+
+class Article(Mapping):
+    """
+    A Guardian search result, held in slots rather than a dict.
+
+    Section, pillar and type names are interned, so every article shares
+    one copy of each. Fields outside the standard set, such as the extras
+    requested with `show-fields`, are picked out of the result into a dict
+    the first time they are looked up, and only for the articles that have
+    them. An article is a read-only mapping, so it can be used wherever a
+    result dict was, and compares equal to the dict it was built from.
+    """
+
+    # `_source` is the result until its extras are picked out into
+    # `_extras`, and None for a result without extras.
+    __slots__ = FIELDS + ("_extras", "_source")
+
+    def __init__(self, result: dict):
+        missing = [name for name in REQUIRED_FIELDS if name not in result]
+        if missing:
+            raise ValueError(
+                f"Result {result.get('id')!r} lacks {', '.join(missing)}"
+            )
+
+        found = 0
+        for name, value in result.items():
+            if name in _FIELD_SET:
+                if name in INTERNED_FIELDS and isinstance(value, str):
+                    value = sys.intern(value)
+                object.__setattr__(self, name, value)
+                found += 1
+        object.__setattr__(self, "_extras", None)
+        object.__setattr__(
+            self, "_source", result if len(result) > found else None
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Article is read-only")
+
+    @property
+    def extras(self) -> None | dict:
+        """The fields outside the standard set, or None if there are none."""
+        if self._source is not None:
+            extras = {
+                name: value
+                for name, value in self._source.items()
+                if name not in _FIELD_SET
+            }
+            object.__setattr__(self, "_extras", extras)
+            object.__setattr__(self, "_source", None)
+        return self._extras
+
+    def __getitem__(self, name: str):
+        if name in _FIELD_SET:
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                return value
+        else:
+            extras = self.extras
+            if extras is not None and name in extras:
+                return extras[name]
+        raise KeyError(name)
+
+    def __contains__(self, name) -> bool:
+        if name in _FIELD_SET:
+            return hasattr(self, name)
+        extras = self.extras
+        return extras is not None and name in extras
+
+    def __iter__(self):
+        for name in FIELDS:
+            if hasattr(self, name):
+                yield name
+        extras = self.extras
+        if extras is not None:
+            yield from extras
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"Article({self.to_dict()!r})"
+
+    def __reduce__(self):
+        return (Article, (self.to_dict(),))
+
+    def to_dict(self) -> dict:
+        """
+        Return the article as a plain dict, in the API's field order.
+
+        Every message is serialised from this dict, so it is built in one
+        step: copied from the result while that is still held for its
+        extras, or otherwise read straight from the slots into a dict
+        display, in the order of `FIELDS`.
+        """
+        if self._source is not None:
+            return dict(self._source)
+        try:
+            result = {
+                "id": self.id,
+                "type": self.type,
+                "sectionId": self.sectionId,
+                "sectionName": self.sectionName,
+                "webPublicationDate": self.webPublicationDate,
+                "webTitle": self.webTitle,
+                "webUrl": self.webUrl,
+                "apiUrl": self.apiUrl,
+                "isHosted": self.isHosted,
+                "pillarId": self.pillarId,
+                "pillarName": self.pillarName,
+            }
+        except AttributeError:
+            # A field missing from the result leaves its slot empty.
+            result = {}
+            for name in FIELDS:
+                value = getattr(self, name, _MISSING)
+                if value is not _MISSING:
+                    result[name] = value
+        if self._extras is not None:
+            result.update(self._extras)
+        return result
@@ -0,0 +1,91 @@
+import boto3
+from botocore.exceptions import ClientError
+import logging
+import threading
+
+try:
+    from src.metrics import metrics
+except ModuleNotFoundError:
+    from metrics import metrics
+
+# Error codes SQS uses to report that a queue name or URL no longer exists.
+QUEUE_DOES_NOT_EXIST_CODES = {
+    "AWS.SimpleQueueService.NonExistentQueue",
+    "QueueDoesNotExist",
+}
+
+_lock = threading.Lock()
+_clients = {}
+_queue_urls = {}
+
+
+def get_client(service: str, region_name: None | str = None):
+    """
+    Return a boto3 client for a service and region, creating it on first use
+    and reusing it for the rest of the process.
+
+    boto3 clients are safe to share between threads once created, but their
+    creation is not, so it is serialised here.
+    """
+    key = (service, region_name)
+    with _lock:
+        if key not in _clients:
+            _clients[key] = boto3.client(service, region_name=region_name)
+        return _clients[key]
+
+
+def get_queue_url(queue: str, region_name: None | str = None) -> str:
+    """Return the URL of a named SQS queue, resolving it only once."""
+    key = (region_name, queue)
+    with _lock:
+        if key in _queue_urls:
+            return _queue_urls[key]
+
+    sqs = get_client("sqs", region_name)
+    with metrics.timer("sqs.get_queue_url"):
+        queue_url = sqs.get_queue_url(QueueName=queue)["QueueUrl"]
+
+    with _lock:
+        return _queue_urls.setdefault(key, queue_url)
+
+
+def invalidate_queue_url(
+    queue: str, region_name: None | str = None, stale: None | str = None
+):
+    """
+    Forget the cached URL of a queue so it is resolved again on next use.
+
+    If `stale` is given, the URL is only forgotten if it is still the one
+    cached, so threads reporting the same stale URL cause a single lookup.
+    """
+    key = (region_name, queue)
+    with _lock:
+        if stale is None or _queue_urls.get(key) == stale:
+            _queue_urls.pop(key, None)
+
+
+def is_queue_does_not_exist(error: ClientError) -> bool:
+    return error.response["Error"]["Code"] in QUEUE_DOES_NOT_EXIST_CODES
+
+
+def refresh_queue_url(
+    queue: str, stale: str, region_name: None | str = None
+) -> None | str:
+    """
+    Resolve a queue's URL again after SQS reported that `stale` does not
+    exist, returning None if the queue cannot be found.
+    """
+    invalidate_queue_url(queue, region_name, stale)
+    try:
+        return get_queue_url(queue, region_name)
+    except ClientError as error:
+        if not is_queue_does_not_exist(error):
+            raise
+        logging.error(f"Queue {queue} does not exist")
+
+
+def clear():
+    """Forget every cached client and queue URL."""
+    with _lock:
+        _clients.clear()
+        _queue_urls.clear()
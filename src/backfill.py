@@ -0,0 +1,119 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+try:
+    from src.queries import Query, QueryStats
+    from src.shards import Shard
+except ModuleNotFoundError:
+    from queries import Query, QueryStats
+    from shards import Shard
+
+
+@dataclass
+class BackfillProgress:
+    """Totals the coordinator of a process-parallel backfill keeps."""
+
+    units: int
+    done: int = 0
+    failed_units: list[Query] = field(default_factory=list)
+    fetched: int = 0
+    sent: int = 0
+    failed: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def throughput(self) -> float:
+        """Articles fetched per second across every process."""
+        elapsed = time.perf_counter() - self.started
+        return self.fetched / elapsed if elapsed else 0.0
+
+    def add(self, stats: QueryStats):
+        self.done += 1
+        self.fetched += stats.fetched
+        self.sent += stats.sent
+        self.failed += stats.failed
+        if not stats.complete:
+            self.failed_units.append(stats.query)
+
+    def add_error(self, unit: Query, error: BaseException):
+        self.done += 1
+        self.failed_units.append(unit)
+        logging.error(f"Backfill of {unit} failed: {error!r}")
+
+    def log(self):
+        logging.info(
+            f"Backfill progress: {self.done}/{self.units} units, "
+            f"{self.fetched} articles fetched, {self.sent} sent, "
+            f"{self.failed} failed, {self.throughput:.0f} articles/s"
+        )
+
+
+def partition(
+    query: Query,
+    shards: None | list[Shard] = None,
+    sections: None | list[str] = None,
+) -> list[Query]:
+    """
+    Split a query into independent units of work, one for each date shard
+    and each section, or every combination of the two.
+    """
+    shards = shards or [None]
+    sections = sections or [query.section]
+    return [
+        replace(
+            query,
+            date_from=shard.date_from if shard else query.date_from,
+            date_to=shard.date_to if shard else query.date_to,
+            section=section,
+        )
+        for section in sections
+        for shard in shards
+    ]
+
+
+def unit_key(unit: Query) -> str:
+    """Return the key a finished unit is recorded under in a shard log."""
+    return json.dumps([unit.search_term, unit.section])
+
+
+def run_processes(
+    units: list[Query],
+    worker,
+    max_processes: None | int = None,
+    on_done=None,
+    **options,
+) -> BackfillProgress:
+    """
+    Run `worker(unit, **options)` for every unit across a pool of processes
+    and aggregate the `QueryStats` each returns.
+
+    Processes are started fresh rather than forked, so each opens its own
+    HTTP session and AWS clients rather than sharing the coordinator's.
+    `worker` must be importable by name. `on_done`, if given, is called in
+    the coordinator with the stats of each unit that finishes.
+    """
+    max_processes = max_processes or os.cpu_count() or 1
+    progress = BackfillProgress(len(units))
+    context = multiprocessing.get_context("spawn")
+
+    with ProcessPoolExecutor(max_processes, mp_context=context) as executor:
+        futures = {
+            executor.submit(worker, unit, **options): unit for unit in units
+        }
+        for future in as_completed(futures):
+            try:
+                stats = future.result()
+            except Exception as error:
+                progress.add_error(futures[future], error)
+            else:
+                progress.add(stats)
+                if on_done is not None:
+                    on_done(stats)
+            progress.log()
+
+    return progress
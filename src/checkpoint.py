@@ -0,0 +1,191 @@
+from dataclasses import dataclass, field
+import json
+import os
+import sqlite3
+import threading
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+@dataclass
+class Watermark:
+    """
+    The newest `webPublicationDate` already sent for a query, along with the
+    ids of the articles sent with exactly that date, so that articles which
+    share the timestamp but arrive later are not skipped.
+    """
+
+    published: None | str = None
+    ids: set[str] = field(default_factory=set)
+
+    def is_older(self, article: dict) -> bool:
+        """True if the article was published before the watermark."""
+        return (
+            self.published is not None
+            and article["webPublicationDate"] < self.published
+        )
+
+    def is_seen(self, article: dict) -> bool:
+        """True if the article has already been sent for this query."""
+        return self.is_older(article) or (
+            article["webPublicationDate"] == self.published
+            and article["id"] in self.ids
+        )
+
+    def advance(self, article: dict):
+        """Move the watermark forward to include a sent article."""
+        published = article["webPublicationDate"]
+        if self.published is None or published > self.published:
+            self.published = published
+            self.ids = {article["id"]}
+        elif published == self.published:
+            self.ids.add(article["id"])
+
+    def copy(self) -> "Watermark":
+        return Watermark(self.published, set(self.ids))
+
+    def to_dict(self) -> dict:
+        return {"published": self.published, "ids": sorted(self.ids)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Watermark":
+        return cls(data.get("published"), set(data.get("ids", [])))
+
+
+def query_key(
+    search_term: None | str,
+    date_from: None | str,
+    date_to: None | str = None,
+) -> str:
+    """Return the key a query's progress is stored under."""
+    if date_to is None:
+        return json.dumps([search_term, date_from])
+    return json.dumps([search_term, date_from, date_to])
+
+
+class WatermarkStore:
+    """Base class for places watermarks are persisted between runs."""
+
+    def load(self, key: str) -> Watermark:
+        raise NotImplementedError
+
+    def save(self, key: str, watermark: Watermark):
+        raise NotImplementedError
+
+
+class MemoryWatermarkStore(WatermarkStore):
+    """Keeps watermarks for the life of the process only."""
+
+    def __init__(self):
+        self._watermarks = {}
+        self._lock = threading.Lock()
+
+    def load(self, key: str) -> Watermark:
+        with self._lock:
+            return self._watermarks.get(key, Watermark()).copy()
+
+    def save(self, key: str, watermark: Watermark):
+        with self._lock:
+            self._watermarks[key] = watermark.copy()
+
+
+class FileWatermarkStore(WatermarkStore):
+    """Stores every query's watermark in a single local JSON file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def load(self, key: str) -> Watermark:
+        with self._lock:
+            return Watermark.from_dict(self._read().get(key, {}))
+
+    def save(self, key: str, watermark: Watermark):
+        with self._lock:
+            data = self._read()
+            data[key] = watermark.to_dict()
+            # Write to a temporary file first so a crash cannot leave the
+            # checkpoint half written.
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+
+class SqliteWatermarkStore(WatermarkStore):
+    """Stores watermarks in a local SQLite database."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS watermarks "
+                "(key TEXT PRIMARY KEY, published TEXT, ids TEXT)"
+            )
+
+    def load(self, key: str) -> Watermark:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT published, ids FROM watermarks WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return Watermark()
+        return Watermark(row[0], set(json.loads(row[1])))
+
+    def save(self, key: str, watermark: Watermark):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?)",
+                (key, watermark.published, json.dumps(sorted(watermark.ids))),
+            )
+
+    def close(self):
+        self._connection.close()
+
+
+def open_store(path: str) -> WatermarkStore:
+    """Open a SQLite store for `.db`/`.sqlite` paths, otherwise a JSON file."""
+    if path.endswith(SQLITE_SUFFIXES):
+        return SqliteWatermarkStore(path)
+    return FileWatermarkStore(path)
+
+
+def iter_new(results, watermark: Watermark):
+    """
+    Yield articles from newest-first `results` that are not yet covered by
+    the watermark, stopping as soon as an article older than it is reached
+    so no further pages are fetched.
+    """
+    try:
+        for article in results:
+            if watermark.is_older(article):
+                return
+            if not watermark.is_seen(article):
+                yield article
+    finally:
+        if close := getattr(results, "close", None):
+            close()
+
+
+def take_until(articles, stop):
+    """Pass articles through until the `stop` event is set."""
+    for article in articles:
+        if stop.is_set():
+            return
+        yield article
+
+
+def track(articles, watermark: Watermark):
+    """Pass articles through unchanged, advancing `watermark` past each."""
+    for article in articles:
+        watermark.advance(article)
+        yield article
@@ -0,0 +1,101 @@
+from botocore.exceptions import ClientError
+from collections.abc import Mapping
+from dataclasses import dataclass
+import hashlib
+import json
+import logging
+
+try:
+    from src.aws_clients import get_client
+    from src.metrics import metrics
+except ModuleNotFoundError:
+    from aws_clients import get_client
+    from metrics import metrics
+
+# Messages with larger bodies are offloaded to S3 by default.
+DEFAULT_THRESHOLD = 64 * 1024
+
+# The pointer format of the Amazon SQS Extended Client Library, so that
+# consumers using that library can read offloaded messages unchanged.
+POINTER_CLASS = "software.amazon.payloadoffloading.PayloadS3Pointer"
+PAYLOAD_SIZE_ATTRIBUTE = "ExtendedPayloadSize"
+
+
+@dataclass(frozen=True)
+class ClaimCheck:
+    """
+    Offload message bodies larger than `threshold` bytes to an S3 `bucket`,
+    queueing a small pointer to the stored body in their place.
+
+    Bodies are stored under `prefix` followed by the article's Guardian id,
+    so sending the same article again overwrites the same object rather
+    than leaving copies behind.
+    """
+
+    bucket: str
+    threshold: int = DEFAULT_THRESHOLD
+    prefix: str = "articles/"
+    region_name: None | str = None
+
+    def key(self, message: Mapping, body: str) -> str:
+        """Return the S3 key under which a message's body is stored."""
+        id = message.get("id") if isinstance(message, Mapping) else None
+        if not id:
+            id = hashlib.sha256(body.encode("utf-8")).hexdigest()
+        return f"{self.prefix}{id}"
+
+    def offload(self, entry: dict, message: dict) -> dict:
+        """
+        Return the entry unchanged if its body is within the threshold, or
+        store its body in S3 and return an entry holding a pointer to it.
+
+        Other message attributes, such as the body's encoding, are kept on
+        the pointer. If the body cannot be stored, the entry is returned
+        unchanged and logged.
+        """
+        body = entry["MessageBody"].encode("utf-8")
+        if len(body) <= self.threshold:
+            return entry
+
+        key = self.key(message, entry["MessageBody"])
+        s3 = get_client("s3", self.region_name)
+        try:
+            with metrics.timer("s3.put_object"):
+                s3.put_object(Bucket=self.bucket, Key=key, Body=body)
+        except ClientError as error:
+            logging.error(
+                f"Failed to offload message to s3://{self.bucket}/{key}: "
+                f"{error.response['Error']['Code']}"
+            )
+            return entry
+
+        pointer = [POINTER_CLASS, {"s3BucketName": self.bucket, "s3Key": key}]
+        return {
+            **entry,
+            "MessageBody": json.dumps(pointer),
+            "MessageAttributes": {
+                **entry.get("MessageAttributes", {}),
+                PAYLOAD_SIZE_ATTRIBUTE: {
+                    "DataType": "Number",
+                    "StringValue": str(len(body)),
+                },
+            },
+        }
+
+
+def retrieve(
+    body: str, attributes: None | dict = None, region_name: None | str = None
+) -> str:
+    """
+    Return a received message's body, fetching it from S3 if the message is
+    a claim-check pointer, as a consumer would.
+    """
+    if PAYLOAD_SIZE_ATTRIBUTE not in (attributes or {}):
+        return body
+
+    _, pointer = json.loads(body)
+    s3 = get_client("s3", region_name)
+    stored = s3.get_object(
+        Bucket=pointer["s3BucketName"], Key=pointer["s3Key"]
+    )
+    return stored["Body"].read().decode("utf-8")
@@ -0,0 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+import logging
+import signal
+import threading
+import time
+
+DEFAULT_MIN_INTERVAL = 30.0
+DEFAULT_MAX_INTERVAL = 900.0
+
+
+@dataclass
+class AdaptiveInterval:
+    """
+    Time to wait between polls of a query, tightened while a query keeps
+    returning new articles and backed off while it is quiet.
+    """
+
+    min_interval: float = DEFAULT_MIN_INTERVAL
+    max_interval: float = DEFAULT_MAX_INTERVAL
+    factor: float = 2.0
+    interval: None | float = None
+
+    def __post_init__(self):
+        if self.interval is None:
+            self.interval = self.min_interval
+
+    def update(self, new_articles: int) -> float:
+        """Adjust the interval for the new articles the last poll found."""
+        if new_articles:
+            self.interval = max(self.min_interval, self.interval / self.factor)
+        else:
+            self.interval = min(self.max_interval, self.interval * self.factor)
+        return self.interval
+
+
+@contextmanager
+def stop_on_signals(
+    stop: threading.Event, signals=(signal.SIGTERM, signal.SIGINT)
+):
+    """
+    Set `stop` when any of `signals` is received, restoring the previous
+    handlers on exit. Handlers can only be installed on the main thread, so
+    elsewhere this does nothing.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def handler(signum, frame):
+        logging.info(f"Received {signal.Signals(signum).name}, stopping")
+        stop.set()
+
+    previous = {signum: signal.signal(signum, handler) for signum in signals}
+    try:
+        yield
+    finally:
+        for signum, previous_handler in previous.items():
+            signal.signal(signum, previous_handler)
+
+
+def poll(
+    queries: list,
+    run,
+    stop: threading.Event,
+    min_interval: float = DEFAULT_MIN_INTERVAL,
+    max_interval: float = DEFAULT_MAX_INTERVAL,
+    max_queries: int = 4,
+    after_cycle=None,
+):
+    """
+    Repeatedly call `run(query)` for each query that is due, until `stop`
+    is set, and return the number of polls made.
+
+    `run` returns the `QueryStats` of the poll, and the query's next poll is
+    scheduled from the number of new articles queued. Polls already under
+    way when `stop` is set are allowed to finish, so batches in flight are
+    sent. `after_cycle`, if given, is called with the stats of each cycle.
+
+    A poll that raises is logged and its query backed off as if it had
+    found nothing, so one failing query does not stop the others.
+    """
+    intervals = {
+        query: AdaptiveInterval(min_interval, max_interval)
+        for query in queries
+    }
+    next_due = {query: 0.0 for query in queries}
+    polls = 0
+
+    def attempt(query):
+        try:
+            return query, run(query)
+        except Exception as error:
+            logging.error(
+                f"Poll of query '{query.search_term}' failed: {error!r}"
+            )
+            return query, None
+
+    with ThreadPoolExecutor(max_workers=max_queries) as executor:
+        while not stop.is_set():
+            now = time.monotonic()
+            due = [query for query in queries if next_due[query] <= now]
+            results = list(executor.map(attempt, due))
+            polls += len(results)
+
+            cycle = []
+            for query, stats in results:
+                if stats is None:
+                    interval = intervals[query].update(0)
+                    next_due[query] = time.monotonic() + interval
+                    continue
+                cycle.append(stats)
+                interval = intervals[query].update(stats.queued)
+                next_due[query] = time.monotonic() + interval
+                logging.info(
+                    f"Query '{query.search_term}' sent {stats.sent} "
+                    f"new articles; polling again in {interval:.0f}s"
+                )
+            if after_cycle is not None:
+                after_cycle(cycle)
+
+            stop.wait(max(0.0, min(next_due.values()) - time.monotonic()))
+
+    return polls
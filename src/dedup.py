@@ -0,0 +1,213 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import math
+import os
+import struct
+import threading
+
+DEFAULT_LRU_SIZE = 100_000
+DEFAULT_BLOOM_CAPACITY = 1_000_000
+DEFAULT_ERROR_RATE = 0.001
+
+LRU_FILENAME = "recent_ids.json"
+BLOOM_FILENAME = "ids.bloom"
+
+# Header of a saved Bloom filter: a magic number, then the number of bits
+# and the number of hash functions.
+_BLOOM_HEADER = struct.Struct("<4sQI")
+_BLOOM_MAGIC = b"BLM1"
+
+
+class LRUSet:
+    """A set holding at most `capacity` items, evicting the least recent."""
+
+    def __init__(self, capacity: int = DEFAULT_LRU_SIZE, items=()):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item) -> bool:
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, item):
+        self._items[item] = None
+        self._items.move_to_end(item)
+        if len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+
+class BloomFilter:
+    """
+    A fixed-size probabilistic set. Membership tests may return false
+    positives at roughly `error_rate` once `capacity` items have been added,
+    but never false negatives.
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_BLOOM_CAPACITY,
+        error_rate: float = DEFAULT_ERROR_RATE,
+    ):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.num_bits = math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        )
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray(math.ceil(self.num_bits / 8))
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[pos >> 3] & (1 << (pos & 7))
+            for pos in self._positions(item)
+        )
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(
+                _BLOOM_HEADER.pack(
+                    _BLOOM_MAGIC, self.num_bits, self.num_hashes
+                )
+            )
+            f.write(self._bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BloomFilter":
+        with open(path, "rb") as f:
+            magic, num_bits, num_hashes = _BLOOM_HEADER.unpack(
+                f.read(_BLOOM_HEADER.size)
+            )
+            if magic != _BLOOM_MAGIC:
+                raise ValueError(f"{path} is not a saved Bloom filter")
+            bloom = cls.__new__(cls)
+            bloom.num_bits = num_bits
+            bloom.num_hashes = num_hashes
+            bloom._bits = bytearray(f.read())
+        return bloom
+
+
+class Deduplicator:
+    """
+    Drops articles whose Guardian `id` has already been sent.
+
+    Recently sent ids are held exactly in an LRU set, and optionally every
+    id ever sent is held in a Bloom filter, so memory stays constant no
+    matter how many articles have been sent. If a `directory` is given, both
+    are loaded from and saved to it so duplicates are caught across runs.
+    A saved Bloom filter keeps the size it was created with.
+    """
+
+    def __init__(
+        self,
+        directory: None | str = None,
+        lru_size: int = DEFAULT_LRU_SIZE,
+        bloom_capacity: int = DEFAULT_BLOOM_CAPACITY,
+        error_rate: float = DEFAULT_ERROR_RATE,
+    ):
+        self.directory = directory
+        self.duplicates = 0
+        self._lock = threading.Lock()
+        self._pending = set()
+        recent_ids = []
+        self.bloom = None
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            try:
+                with open(self._path(LRU_FILENAME), encoding="utf-8") as f:
+                    recent_ids = json.load(f)
+            except FileNotFoundError:
+                pass
+            if bloom_capacity and os.path.exists(self._path(BLOOM_FILENAME)):
+                self.bloom = BloomFilter.load(self._path(BLOOM_FILENAME))
+
+        self.recent = LRUSet(lru_size, recent_ids)
+        if bloom_capacity and self.bloom is None:
+            self.bloom = BloomFilter(bloom_capacity, error_rate)
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def is_duplicate(self, article_id: str) -> bool:
+        return article_id in self.recent or (
+            self.bloom is not None and article_id in self.bloom
+        )
+
+    def add(self, article_id: str):
+        self.recent.add(article_id)
+        if self.bloom is not None:
+            self.bloom.add(article_id)
+
+    def filter(self, articles, scope: str = "", pending: None | set = None):
+        """
+        Yield only articles not seen before, remembering each one.
+
+        Ids are remembered separately for each `scope`, such as the name of
+        the queue articles are sent to. Several threads may filter at once.
+
+        If a `pending` set is given, ids are collected in it rather than
+        remembered, as their articles have yet to be sent. Until `commit`
+        remembers them, or `release` forgets them, they are still dropped
+        by every filter, so an article is not sent twice at once.
+        """
+        for article in articles:
+            key = f"{scope}:{article['id']}" if scope else article["id"]
+            with self._lock:
+                if self.is_duplicate(key) or key in self._pending:
+                    self.duplicates += 1
+                    continue
+                if pending is None:
+                    self.add(key)
+                else:
+                    self._pending.add(key)
+                    pending.add(key)
+            yield article
+
+        if self.duplicates:
+            logging.info(f"Dropped {self.duplicates} duplicate articles")
+
+    def commit(self, pending: set):
+        """Remember the pending ids of articles that have been sent."""
+        with self._lock:
+            for key in pending:
+                self.add(key)
+            self._pending -= pending
+
+    def release(self, pending: set):
+        """Forget the pending ids of articles that failed to send."""
+        with self._lock:
+            self._pending -= pending
+
+    def save(self):
+        """Persist the seen ids, if a directory was given."""
+        if not self.directory:
+            return
+        with self._lock:
+            tmp_path = self._path(f"{LRU_FILENAME}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self.recent), f)
+            os.replace(tmp_path, self._path(LRU_FILENAME))
+            if self.bloom is not None:
+                self.bloom.save(self._path(BLOOM_FILENAME))
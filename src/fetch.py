@@ -1,33 +1,92 @@
-import boto3
-from botocore.exceptions import ClientError
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import json
 import logging
 import requests
+from typing import NamedTuple
 from urllib.parse import urlencode
+import zlib
 
-logging.basicConfig(level=logging.INFO)
+try:
+    from src.article import Article
+    from src.http_session import DEFAULT_TIMEOUT, get_session
+    from src.metrics import metrics
+    from src.rate_limit import (
+        QuotaExhausted,
+        backoff,
+        guardian_rate,
+        retry_after,
+    )
+    from src.response_cache import cache_key, get_cache, ttl_for
+    from src.secret_cache import guardian_api_key
+    from src.stream_json import ResultsStream
+except ModuleNotFoundError:
+    from article import Article
+    from http_session import DEFAULT_TIMEOUT, get_session
+    from metrics import metrics
+    from rate_limit import (
+        QuotaExhausted,
+        backoff,
+        guardian_rate,
+        retry_after,
+    )
+    from response_cache import cache_key, get_cache, ttl_for
+    from secret_cache import guardian_api_key
+    from stream_json import ResultsStream
 
 ENDPOINT = "https://content.guardianapis.com/search"
 
+# Largest page size accepted by the Guardian content API.
+MAX_PAGE_SIZE = 200
 
-def fetch(search_term: None | str = None, date_from: None | str = None):
+# Times a request refused with a 429 is retried, and the base of the
+# backoff between attempts in seconds, unless Retry-After asks for longer.
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+
+# Bytes read from the socket at a time when streaming a response.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class FetchError(Exception):
+    """Raised when the Guardian API does not return a page of results."""
+
+    def __init__(self, status_code: int, message: None | str = None):
+        self.status_code = status_code
+        self.message = message
+        super().__init__(f"Failed to fetch results: status code {status_code}")
+
+
+class Page(NamedTuple):
+    """A page of search results, or the error raised while fetching it."""
+
+    number: int
+    results: list[dict]
+    pages: int = 0
+    error: None | Exception = None
+
+
+def get_api_key():
     """
-    Fetch information about articles from the Guardian API based on a search
-    term and an optional `date_from` parameter.
+    Return the Guardian API key, retrieving it from AWS Secrets Manager only
+    when the process-level cache is empty or has expired.
     """
+    return guardian_api_key.get()
 
-    logging.info("Retrieving API key from AWS Secrets Manager")
-    sm_client = boto3.client("secretsmanager", region_name="eu-west-2")
-    try:
-        response = sm_client.get_secret_value(SecretId="GUARDIAN_API_KEY")
 
-        API_KEY = response["SecretString"]
-    except ClientError:
-        logging.error(
-            "Failed to retrieve Guardian API key from Secrets Manager"
-        )
-        return
+def build_params(
+    search_term: None | str = None,
+    date_from: None | str = None,
+    date_to: None | str = None,
+    section: None | str = None,
+) -> dict:
+    """
+    Build the query parameters for a search and log what is requested.
 
-    params = {"api-key": API_KEY}
+    The API key is left out, as `fetch_page` adds the current cached key to
+    every request.
+    """
+    params = {}
     logstring = "Fetching results with no search term"
     if search_term:
         params["q"] = search_term
@@ -35,23 +94,535 @@ def fetch(search_term: None | str = None, date_from: None | str = None):
     if date_from:
         params["from-date"] = date_from
         logstring += f", dated '{date_from}' or later"
+    if date_to:
+        params["to-date"] = date_to
+        logstring += f", dated '{date_to}' or earlier"
+    if section:
+        params["section"] = section
+        logstring += f", in section '{section}'"
 
     logging.info(logstring)
+    return params
+
+
+def _get(
+    url: str,
+    timeout: tuple[float, float],
+    stream: bool,
+    headers: None | dict = None,
+):
+    """
+    Send a GET request over the shared session once the rate governor
+    allows it, retrying with jittered backoff while the API responds 429.
+
+    A 429 pauses every request in the process for the backoff, which is at
+    least as long as the response's Retry-After header asks for.
+    """
+    session = get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            guardian_rate.acquire()
+        except QuotaExhausted as error:
+            raise FetchError(429, str(error))
+
+        with metrics.timer("guardian.request"):
+            response = session.get(
+                url, timeout=timeout, stream=stream, headers=headers
+            )
+        if response.status_code != 429 or attempt == MAX_RETRIES:
+            return response
+        metrics.count("guardian.retries")
+
+        delay = backoff(
+            attempt,
+            RETRY_BACKOFF,
+            retry_after(response.headers.get("Retry-After")),
+        )
+        logging.info(f"Rate limited by Guardian API, retrying in {delay:.1f}s")
+        response.close()
+        guardian_rate.pause(delay)
+
+
+def _error_message(response) -> None | str:
+    """
+    Return the message of an error response. Rate limiting responses carry
+    it at the top level of the body rather than under "response".
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    return body.get("response", body).get("message")
+
+
+class _CachedResponse:
+    """A cached response body, standing in for a `requests` response."""
+
+    status_code = 200
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size: int = 1):
+        for start in range(0, len(self.content), chunk_size):
+            end = start + chunk_size
+            yield self.content[start:end]
+
+    def close(self):
+        pass
+
+
+class _CachingResponse:
+    """
+    A streamed response whose body is compressed into the response cache
+    as it is read, and stored once it has been read to the end.
+    """
+
+    def __init__(self, response, store):
+        self._response = response
+        self._store = store
+        self.status_code = response.status_code
+
+    def iter_content(self, chunk_size: int = 1):
+        compressor = zlib.compressobj()
+        parts = []
+        for chunk in self._response.iter_content(chunk_size=chunk_size):
+            parts.append(compressor.compress(chunk))
+            yield chunk
+        parts.append(compressor.flush())
+        self._store(b"".join(parts))
+
+    def close(self):
+        self._response.close()
+
+
+def _cache_response(response, key: str, ttl: float, stream: bool):
+    """Store a 200 response in the response cache as its body is read."""
+    cache = get_cache()
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    if stream:
+        return _CachingResponse(
+            response,
+            lambda compressed: cache.put_compressed(
+                key, compressed, ttl, **validators
+            ),
+        )
+    cache.put(key, response.content, ttl, **validators)
+    return response
+
+
+def _request(
+    params: dict,
+    page: None | int,
+    timeout: tuple[float, float],
+    stream: bool = False,
+):
+    """
+    Send a search request with the cached API key and return the response
+    once it has status code 200.
+
+    If the response cache is on, a fresh cached page is returned without a
+    request being made. A stale one with an ETag or Last-Modified date is
+    revalidated with a conditional request, and reused if the API responds
+    304 Not Modified.
+
+    If the API key is rejected with a 401, the cached key is refreshed and
+    the request retried once with the new key.
+
+    Raises `FetchError` if the API does not respond with status code 200.
+    """
+    params = {**params}
+    if page is not None:
+        params["page"] = page
+
+    cache = get_cache()
+    headers, cached = {}, None
+    if cache is not None:
+        key, ttl = cache_key(params), ttl_for(params, cache.ttl)
+        cached = cache.get(key)
+        if cached is not None and cached.fresh:
+            metrics.count("guardian.cache_hits")
+            return _CachedResponse(cached.body)
+        if cached is not None and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+    api_key = get_api_key()
+    if api_key is None:
+        raise FetchError(401, "Guardian API key is unavailable")
+    params["api-key"] = api_key
+
     querystring = urlencode(params)
-    response = requests.get(f"{ENDPOINT}?{querystring}", timeout=5)
+    response = _get(f"{ENDPOINT}?{querystring}", timeout, stream, headers)
+
+    if response.status_code == 401:
+        new_key = guardian_api_key.refresh(api_key)
+        if new_key is not None and new_key != api_key:
+            logging.info("Retrying request with refreshed API key")
+            metrics.count("guardian.retries")
+            params["api-key"] = new_key
+            querystring = urlencode(params)
+            response = _get(
+                f"{ENDPOINT}?{querystring}", timeout, stream, headers
+            )
+
+    if response.status_code == 304 and cached is not None:
+        response.close()
+        cache.revalidated(key, ttl)
+        metrics.count("guardian.cache_hits")
+        return _CachedResponse(cached.body)
 
     if response.status_code == 200:
-        return response.json()["response"]["results"]
-    elif response.status_code == 401:
+        if cache is not None:
+            return _cache_response(response, key, ttl, stream)
+        return response
+
+    message = None
+    if response.status_code != 401:
+        message = _error_message(response)
+    raise FetchError(response.status_code, message)
+
+
+def fetch_page(
+    params: dict,
+    page: None | int = None,
+    timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+) -> dict:
+    """
+    Request a single page of search results and return the body of the
+    Guardian response, including the `currentPage` and `pages` fields.
+
+    Requests go over the shared, pooled HTTP session. `timeout` is a
+    (connect, read) pair of seconds.
+
+    If the API key is rejected with a 401, the cached key is refreshed and
+    the request retried once with the new key.
+
+    Raises `FetchError` if the API does not respond with status code 200.
+    """
+    response = _request(params, page, timeout)
+    with metrics.timer("guardian.decode"):
+        body = response.json()
+    metrics.count("guardian.bytes", len(response.content))
+    return body["response"]
+
+
+def fetch_page_stream(
+    params: dict,
+    page: None | int = None,
+    timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+) -> ResultsStream:
+    """
+    Request a single page of search results and return a `ResultsStream`
+    that yields its articles as the body is read, rather than after the
+    whole page has been downloaded and decoded.
+
+    The other fields of the response, such as `pages`, are available on the
+    stream's `fields` once the first article has been yielded. The response
+    is released when the stream is exhausted or closed.
+
+    Raises `FetchError` if the API does not respond with status code 200.
+    """
+    response = _request(params, page, timeout, stream=True)
+    chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+    if metrics.enabled:
+        chunks = _count_bytes(chunks)
+    return ResultsStream(chunks, on_close=response.close)
+
+
+def _count_bytes(chunks):
+    """Count the bytes of a streamed response body as they are read."""
+    read = 0
+    try:
+        for chunk in chunks:
+            read += len(chunk)
+            yield chunk
+    finally:
+        metrics.count("guardian.bytes", read)
+
+
+def log_fetch_error(error: Exception, api_key: str):
+    """Log a failed request in the same terms for every caller."""
+    if not isinstance(error, FetchError):
+        logging.error(f"Failed to fetch results: {error!r}")
+    elif error.status_code == 401:
         logging.error(
             (
                 "Failed to fetch results: status code 401. "
-                f"API key {API_KEY} may be invalid"
+                f"API key {api_key} may be invalid"
             )
         )
     else:
         logging.error(
-            (f"Failed to fetch results: status code {response.status_code}")
+            (f"Failed to fetch results: status code {error.status_code}")
+        )
+        if error.message:
+            logging.error(f"Server returned error message: {error.message}")
+
+
+def fetch(search_term: None | str = None, date_from: None | str = None):
+    """
+    Fetch information about articles from the Guardian API based on a search
+    term and an optional `date_from` parameter.
+    """
+    API_KEY = get_api_key()
+    if API_KEY is None:
+        return
+
+    params = build_params(search_term, date_from)
+
+    try:
+        return list(to_articles(fetch_page(params)["results"]))
+    except FetchError as error:
+        log_fetch_error(error, API_KEY)
+
+
+def to_articles(results):
+    """
+    Yield an `Article` for each search result, logging and skipping any
+    result that lacks a required field.
+    """
+    fetched = 0
+    try:
+        for result in results:
+            try:
+                article = Article(result)
+            except ValueError as error:
+                logging.error(f"Skipped result: {error}")
+                metrics.count("articles.invalid")
+                continue
+            fetched += 1
+            yield article
+    finally:
+        metrics.count("articles.fetched", fetched)
+
+
+def count_results(
+    search_term: None | str = None,
+    date_from: None | str = None,
+    date_to: None | str = None,
+    timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+    section: None | str = None,
+) -> int:
+    """
+    Return the total number of articles matching a search, requesting a
+    single result so the response stays small.
+
+    Raises `FetchError` if the request fails.
+    """
+    params = build_params(search_term, date_from, date_to, section)
+    params["page-size"] = 1
+    return fetch_page(params, timeout=timeout)["total"]
+
+
+def _fetch_page_or_error(
+    params: dict, number: int, timeout: tuple[float, float]
+) -> Page:
+    """Fetch a page, capturing any failure on the returned `Page`."""
+    try:
+        body = fetch_page(params, number, timeout)
+    except (FetchError, requests.RequestException) as error:
+        return Page(number, [], error=error)
+
+    return Page(number, body["results"], body.get("pages", 0))
+
+
+def _ends_walk(error: None | Exception) -> bool:
+    # Once the key is rejected or the API is refusing requests, every
+    # subsequent request would fail in the same way.
+    return isinstance(error, FetchError) and error.status_code in (401, 429)
+
+
+def iter_pages(
+    params: dict,
+    max_workers: int = 1,
+    ordered: bool = True,
+    timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+):
+    """
+    Yield a `Page` for every page of results for the given query parameters.
+
+    The first page is fetched on its own to learn the number of pages. The
+    remaining pages are independent requests; with `max_workers` above 1
+    they are fanned out over a thread pool, with at most two requests per
+    worker in flight so memory stays bounded. Pages are yielded in page
+    order unless `ordered` is false, in which case they are yielded as they
+    complete.
+
+    A page that fails is yielded with its `error` set and the walk carries
+    on, so pages that succeed are never lost. A 401, or a 429 that
+    persists through retries or a spent daily quota, ends the walk, as
+    every subsequent request would fail in the same way.
+
+    Every request waits its turn with the process-wide rate governor.
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+
+    # Keep a pooled connection open for every worker.
+    get_session(pool_size=max_workers)
+
+    first = _fetch_page_or_error(params, 1, timeout)
+    yield first
+    if first.error is not None:
+        return
+
+    numbers = iter(range(2, first.pages + 1))
+
+    if max_workers == 1:
+        for number in numbers:
+            page = _fetch_page_or_error(params, number, timeout)
+            yield page
+            if _ends_walk(page.error):
+                return
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+
+    def submit():
+        number = next(numbers, None)
+        if number is not None:
+            pending.append(
+                executor.submit(_fetch_page_or_error, params, number, timeout)
+            )
+
+    try:
+        for _ in range(max_workers * 2):
+            submit()
+
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+
+            for future in done:
+                submit()
+                page = future.result()
+                yield page
+                if _ends_walk(page.error):
+                    return
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _iter_streamed_results(
+    params: dict,
+    timeout: tuple[float, float],
+    api_key: str,
+    failed_pages: list[int],
+):
+    """
+    Yield the articles of every page in turn, streaming each response, and
+    return the number of pages.
+
+    A page that fails, whether before or part way through its body, is
+    logged and added to `failed_pages`. Articles already yielded from it
+    are kept.
+    """
+    number, pages = 1, 0
+    while number == 1 or number <= pages:
+        try:
+            stream = fetch_page_stream(params, number, timeout)
+            try:
+                yield from to_articles(stream)
+            finally:
+                stream.close()
+        except (FetchError, requests.RequestException, ValueError) as error:
+            log_fetch_error(error, api_key)
+            failed_pages.append(number)
+            if number == 1 or _ends_walk(error):
+                return pages
+            number += 1
+            continue
+
+        pages = max(pages, stream.fields.get("pages", 0))
+        logging.info(f"Fetched page {number} of {pages}")
+        number += 1
+    return pages
+
+
+def iter_results(
+    search_term: None | str = None,
+    date_from: None | str = None,
+    page_size: int = MAX_PAGE_SIZE,
+    max_workers: int = 1,
+    ordered: bool = True,
+    timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+    order_by: None | str = None,
+    date_to: None | str = None,
+    section: None | str = None,
+    stream: bool = False,
+    show_fields: tuple[str, ...] = (),
+    failed_pages: None | list[int] = None,
+):
+    """
+    Lazily yield every article matching a search term and an optional
+    `date_from` parameter, walking all pages of the Guardian response.
+
+    With `max_workers` above 1 the pages after the first are fetched
+    concurrently; see `iter_pages`. Pages that fail are logged and skipped,
+    and the numbers of any failed pages are logged once iteration ends and
+    added to `failed_pages`, if given, so callers can tell a complete walk
+    from one with gaps.
+    `order_by` may be "newest", "oldest" or "relevance", `date_to`
+    excludes content published after that date, and `section` limits
+    results to a Guardian section id such as "politics". `show_fields`
+    names extra fields, such as "trailText", to return under "fields".
+
+    With `stream` set, each page is parsed as its body arrives and articles
+    are yielded as soon as they are decoded, so memory is bounded by one
+    article rather than one page. Pages are then fetched one at a time.
+    """
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    if stream and max_workers != 1:
+        raise ValueError("stream requires max_workers to be 1")
+    if failed_pages is None:
+        failed_pages = []
+
+    API_KEY = get_api_key()
+    if API_KEY is None:
+        # Not even the first page could be requested.
+        failed_pages.append(1)
+        return
+
+    params = build_params(search_term, date_from, date_to, section)
+    params["page-size"] = page_size
+    if order_by:
+        params["order-by"] = order_by
+    if show_fields:
+        params["show-fields"] = ",".join(show_fields)
+
+    pages, first_failed = 0, len(failed_pages)
+    if stream:
+        pages = yield from _iter_streamed_results(
+            params, timeout, API_KEY, failed_pages
+        )
+    else:
+        for page in iter_pages(params, max_workers, ordered, timeout):
+            if page.error is not None:
+                log_fetch_error(page.error, API_KEY)
+                failed_pages.append(page.number)
+                continue
+
+            pages = max(pages, page.pages)
+            logging.info(f"Fetched page {page.number} of {pages}")
+            yield from to_articles(page.results)
+
+    failed = failed_pages[first_failed:]
+    if failed:
+        logging.error(
+            f"Failed to fetch {len(failed)} of {pages} pages: "
+            f"{sorted(failed)}"
         )
-        if error_message := response.json()["response"]["message"]:
-            logging.error(f"Server returned error message: {error_message}")
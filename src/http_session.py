@@ -0,0 +1,57 @@
+import os
+import requests
+from requests.adapters import HTTPAdapter
+import threading
+
+# Seconds to wait for a connection to be established and for a response to
+# be read, passed to requests as a (connect, read) timeout pair.
+CONNECT_TIMEOUT = float(os.environ.get("GUARDIAN_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("GUARDIAN_READ_TIMEOUT", 5))
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+DEFAULT_POOL_SIZE = 10
+
+_lock = threading.Lock()
+_session = None
+_pool_size = 0
+
+
+def _mount_adapter(session: requests.Session, pool_size: int):
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def get_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Return the process-wide HTTP session, creating it on first use.
+
+    Connections are kept alive and reused between requests, so only the
+    first request to a host pays for the TCP and TLS handshakes. The pool
+    holds up to `pool_size` connections per host and is grown if a caller
+    asks for more, so it can match the number of concurrent fetch workers.
+    """
+    global _session, _pool_size
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(
+                {
+                    "Accept-Encoding": "gzip, deflate",
+                    "Connection": "keep-alive",
+                }
+            )
+        if pool_size > _pool_size:
+            _mount_adapter(_session, pool_size)
+            _pool_size = pool_size
+        return _session
+
+
+def close_session():
+    """Close the process-wide session and its pooled connections."""
+    global _session, _pool_size
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _pool_size = 0
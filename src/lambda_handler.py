@@ -0,0 +1,254 @@
+import logging
+import os
+import time
+
+try:
+    from src.metrics import metrics
+    from src.queries import DEFAULT_QUEUE_NAME, Query, parse_queries
+    from src.rate_limit import DAILY_QUOTA, QUOTA_FILE, RATE_LIMIT
+except ModuleNotFoundError:
+    from metrics import metrics
+    from queries import DEFAULT_QUEUE_NAME, Query, parse_queries
+    from rate_limit import DAILY_QUOTA, QUOTA_FILE, RATE_LIMIT
+
+# AWS Lambda entry point. Only the standard library and the query config
+# are imported with this module. The pipeline, and with it boto3 and
+# requests, is imported once per execution environment by `load`, along
+# with the HTTP session, SQS client and Guardian API key, which every warm
+# invocation then reuses.
+
+_main = None
+
+# Parameters an event may take, those of the command line that apply to a
+# single run of queries. Backfills, the daemon and replays run from the
+# command line only.
+EVENT_PARAMETERS = frozenset(
+    {
+        "search_term",
+        "queries",
+        "date_from",
+        "date_to",
+        "sqs_queue_name",
+        "max_queries",
+        "page_size",
+        "max_workers",
+        "unordered",
+        "stream",
+        "connect_timeout",
+        "read_timeout",
+        "fields",
+        "encoding",
+        "claim_check_bucket",
+        "claim_check_threshold",
+        "checkpoint",
+        "dedup_dir",
+        "dedup_bloom_capacity",
+        "dedup_error_rate",
+        "queue_size",
+        "rate_limit",
+        "daily_quota",
+        "quota_file",
+        "cache",
+        "cache_ttl",
+        "cache_max_mb",
+        "spool",
+    }
+)
+
+
+def load():
+    """
+    Import the pipeline and open the clients every invocation shares,
+    once per process, and return the `main` module.
+    """
+    global _main
+    if _main is not None:
+        return _main
+
+    start = time.perf_counter()
+    try:
+        from src import main
+        from src.aws_clients import get_client
+        from src.http_session import get_session
+        from src.secret_cache import guardian_api_key
+    except ModuleNotFoundError:
+        import main
+        from aws_clients import get_client
+        from http_session import get_session
+        from secret_cache import guardian_api_key
+
+    get_session()
+    get_client("sqs")
+    guardian_api_key.get()
+    _main = main
+    logging.info(f"Loaded pipeline in {time.perf_counter() - start:.3f}s")
+    return _main
+
+
+def parse_event(event: dict, main) -> tuple[list, dict]:
+    """
+    Read the queries and options of an invocation from its event, which
+    takes the parameters of the command line in `EVENT_PARAMETERS`.
+
+    Queries are given as a `search_term`, which may be a list, and a
+    `queries` list in the format of a `--config` file.
+
+    Raises `ValueError` for any other parameter, and for the combinations
+    the command line rejects.
+    """
+    unknown = set(event) - EVENT_PARAMETERS
+    if unknown:
+        raise ValueError(
+            f"Unsupported event parameters: {', '.join(sorted(unknown))}"
+        )
+    date_from = event.get("date_from")
+    date_to = event.get("date_to")
+    queue = event.get("sqs_queue_name", DEFAULT_QUEUE_NAME)
+
+    search_terms = event.get("search_term") or []
+    if isinstance(search_terms, str):
+        search_terms = [search_terms]
+    queries = [
+        Query(search_term, date_from, queue, date_to)
+        for search_term in search_terms
+    ]
+    queries += parse_queries(
+        event.get("queries", []), date_from, queue, date_to
+    )
+    if not queries:
+        raise ValueError("Event requires a search_term or queries")
+    if event.get("daily_quota") and not event.get("quota_file", QUOTA_FILE):
+        raise ValueError("daily_quota requires quota_file")
+    error_rate = event.get("dedup_error_rate", main.DEFAULT_ERROR_RATE)
+    if not 0 < error_rate < 1:
+        raise ValueError("dedup_error_rate must be between 0 and 1")
+
+    options = {
+        "max_queries": event.get("max_queries", 4),
+        "checkpoint": event.get("checkpoint"),
+        "dedup_dir": event.get("dedup_dir"),
+        "dedup_bloom_capacity": event.get(
+            "dedup_bloom_capacity", main.DEFAULT_BLOOM_CAPACITY
+        ),
+        "dedup_error_rate": error_rate,
+        "queue_size": event.get("queue_size", main.DEFAULT_QUEUE_SIZE),
+        "page_size": event.get("page_size", main.MAX_PAGE_SIZE),
+        "max_workers": event.get("max_workers", 1),
+        "ordered": not event.get("unordered", False),
+        "timeout": (
+            event.get("connect_timeout", main.CONNECT_TIMEOUT),
+            event.get("read_timeout", main.READ_TIMEOUT),
+        ),
+    }
+    if event.get("stream"):
+        if options["max_workers"] != 1:
+            raise ValueError("stream cannot be used with max_workers")
+        options["stream"] = True
+    if event.get("spool"):
+        options["spool"] = main.Spool(event["spool"])
+
+    fields = event.get("fields")
+    if isinstance(fields, str):
+        fields = main.parse_fields(fields)
+    encoding = event.get("encoding", "json")
+    bucket = event.get("claim_check_bucket")
+    if fields or encoding != "json" or bucket:
+        claim_check = None
+        if bucket:
+            claim_check = main.ClaimCheck(
+                bucket,
+                event.get("claim_check_threshold", main.DEFAULT_THRESHOLD),
+            )
+        options["message_format"] = main.MessageFormat(
+            tuple(fields) if fields else None, encoding, claim_check
+        )
+    return queries, options
+
+
+def configure(event: dict, main):
+    """
+    Set the Guardian API rate limits and response cache of an invocation
+    from its event, keeping those of the last invocation if unchanged, so
+    warm invocations keep their token bucket and open cache.
+    """
+    rate_limits = {
+        "rate": event.get("rate_limit", RATE_LIMIT),
+        "daily_quota": event.get("daily_quota", DAILY_QUOTA),
+        "quota_file": event.get("quota_file", QUOTA_FILE),
+    }
+    if main.guardian_rate.settings() != rate_limits:
+        main.guardian_rate.configure(**rate_limits)
+
+    cache = None
+    if event.get("cache"):
+        cache = {
+            "path": event["cache"],
+            "ttl": event.get("cache_ttl", main.response_cache.DEFAULT_TTL),
+            "max_bytes": int(
+                event.get(
+                    "cache_max_mb",
+                    main.response_cache.DEFAULT_MAX_BYTES / 1024 / 1024,
+                )
+                * 1024
+                * 1024
+            ),
+        }
+    if main.response_cache.settings() != cache:
+        main.response_cache.configure(**(cache or {"path": None}))
+
+
+def handler(event: dict, context=None) -> dict:
+    """
+    Run the queries of an event and return the counts for each of them.
+
+    If metrics are on, those of the invocation are written to the log as
+    Embedded Metric Format JSON, from which CloudWatch records them.
+
+    If the `GUARDIAN_PROFILE` environment variable names a file, such as
+    one in /tmp, the invocation is profiled, and the report written to it
+    and to the log.
+
+    Raises `ValueError` if the event has no queries or parameters it does
+    not take.
+    """
+    main = load()
+    queries, options = parse_event(event, main)
+    configure(event, main)
+    profile = os.environ.get("GUARDIAN_PROFILE")
+    profiler = main.Profiler(profile).start() if profile else None
+    try:
+        stats = main.run_queries(queries, **options)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            logging.info(f"Profile of invocation:\n{profiler.write()}")
+        if metrics.enabled:
+            function = os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+            metrics.emit(
+                dimensions={"FunctionName": function} if function else None
+            )
+            metrics.reset()
+    return {
+        "sent": sum(s.sent for s in stats),
+        "failed": sum(s.failed for s in stats),
+        "queries": [
+            {
+                "search_term": s.query.search_term,
+                "sqs_queue_name": s.query.sqs_queue_name,
+                "fetched": s.fetched,
+                "skipped": s.skipped,
+                "sent": s.sent,
+                "failed": s.failed,
+                "seconds": round(s.seconds, 3),
+            }
+            for s in stats
+        ],
+    }
+
+
+# Lambda runs module scope in its init phase, before the first invocation
+# and with a full CPU allowance, so the expensive work is done there. The
+# log level is only set in Lambda, whose runtime installs a log handler.
+if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+    logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+    load()
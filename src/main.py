@@ -1,53 +1,1084 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import replace
+from datetime import datetime, timezone
+from itertools import chain
+import logging
+import os
+import threading
+import time
 
 try:
-    from src.fetch import fetch
+    from src.backfill import (
+        BackfillProgress,
+        partition,
+        run_processes,
+        unit_key,
+    )
+    from src.checkpoint import (
+        MemoryWatermarkStore,
+        iter_new,
+        open_store,
+        query_key,
+        take_until,
+        track,
+    )
+    from src.daemon import (
+        DEFAULT_MAX_INTERVAL,
+        DEFAULT_MIN_INTERVAL,
+        poll,
+        stop_on_signals,
+    )
+    from src.claim_check import DEFAULT_THRESHOLD, ClaimCheck
+    from src.dedup import (
+        DEFAULT_BLOOM_CAPACITY,
+        DEFAULT_ERROR_RATE,
+        Deduplicator,
+    )
+    from src.fetch import count_results, iter_results, MAX_PAGE_SIZE
+    from src.http_session import (
+        CONNECT_TIMEOUT,
+        DEFAULT_TIMEOUT,
+        READ_TIMEOUT,
+        get_session,
+    )
+    from src.message_format import (
+        DEFAULT_FIELDS,
+        ENCODINGS,
+        MessageFormat,
+        parse_fields,
+    )
+    from src.metrics import metrics
+    from src.pipeline import DEFAULT_QUEUE_SIZE, staged
+    from src.profiling import Profiler
+    from src.queries import (
+        DEFAULT_QUEUE_NAME,
+        Query,
+        QueryStats,
+        SeenIds,
+        count,
+        format_summary,
+        load_queries,
+    )
+    from src.rate_limit import (
+        DAILY_QUOTA,
+        QUOTA_FILE,
+        RATE_LIMIT,
+        guardian_rate,
+    )
+    from src import response_cache
     from src.send_to_sqs import send_to_sqs
+    from src.spool import Spool, replay
+    from src.shards import (
+        DEFAULT_MAX_SHARD_RESULTS,
+        SHARD_DAYS,
+        Shard,
+        ShardLog,
+        iter_shard_results,
+        plan_adaptive,
+        split_range,
+    )
 except ModuleNotFoundError:
-    from fetch import fetch
+    from backfill import (
+        BackfillProgress,
+        partition,
+        run_processes,
+        unit_key,
+    )
+    from checkpoint import (
+        MemoryWatermarkStore,
+        iter_new,
+        open_store,
+        query_key,
+        take_until,
+        track,
+    )
+    from daemon import (
+        DEFAULT_MAX_INTERVAL,
+        DEFAULT_MIN_INTERVAL,
+        poll,
+        stop_on_signals,
+    )
+    from claim_check import DEFAULT_THRESHOLD, ClaimCheck
+    from dedup import (
+        DEFAULT_BLOOM_CAPACITY,
+        DEFAULT_ERROR_RATE,
+        Deduplicator,
+    )
+    from fetch import count_results, iter_results, MAX_PAGE_SIZE
+    from http_session import (
+        CONNECT_TIMEOUT,
+        DEFAULT_TIMEOUT,
+        READ_TIMEOUT,
+        get_session,
+    )
+    from message_format import (
+        DEFAULT_FIELDS,
+        ENCODINGS,
+        MessageFormat,
+        parse_fields,
+    )
+    from metrics import metrics
+    from pipeline import DEFAULT_QUEUE_SIZE, staged
+    from profiling import Profiler
+    from queries import (
+        DEFAULT_QUEUE_NAME,
+        Query,
+        QueryStats,
+        SeenIds,
+        count,
+        format_summary,
+        load_queries,
+    )
+    from rate_limit import (
+        DAILY_QUOTA,
+        QUOTA_FILE,
+        RATE_LIMIT,
+        guardian_rate,
+    )
+    import response_cache
     from send_to_sqs import send_to_sqs
+    from spool import Spool, replay
+    from shards import (
+        DEFAULT_MAX_SHARD_RESULTS,
+        SHARD_DAYS,
+        Shard,
+        ShardLog,
+        iter_shard_results,
+        plan_adaptive,
+        split_range,
+    )
+
+
+def send_messages(
+    messages,
+    stats: QueryStats,
+    message_format: None | MessageFormat = None,
+    spool: None | Spool = None,
+) -> bool:
+    """
+    Send messages to the queue of the stats' query, adding the numbers sent
+    and failed to `stats`, and return True if every message was sent.
+
+    With a `spool`, messages are written to it for the queue rather than
+    sent, to be sent later by `replay`, and count as sent once written.
+    """
+    first = next(messages, None)
+    if first is None:
+        return True
+
+    if spool is not None:
+        stats.sent += spool.append(
+            stats.query.sqs_queue_name,
+            chain([first], messages),
+            message_format,
+        )
+        return True
+
+    summary = send_to_sqs(
+        chain([first], messages),
+        stats.query.sqs_queue_name,
+        message_format=message_format,
+    )
+    stats.sent += summary.successful
+    stats.failed += len(summary.failed)
+    return not summary.failed
+
+
+def with_show_fields(
+    fetch_options: dict, message_format: None | MessageFormat
+) -> dict:
+    """Request the extra fields a message format projects, if any."""
+    if message_format is None or not message_format.show_fields:
+        return fetch_options
+    return {**fetch_options, "show_fields": message_format.show_fields}
+
+
+def run_query(
+    query: Query,
+    store=None,
+    dedup: None | Deduplicator = None,
+    seen: None | SeenIds = None,
+    stop: None | threading.Event = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    message_format: None | MessageFormat = None,
+    spool: None | Spool = None,
+    **fetch_options,
+) -> QueryStats:
+    """
+    Fetch the results of one query and send them to its queue.
+
+    `fetch_options` are passed on to `iter_results`. If a watermark `store`
+    is given, only articles published since the query's watermark are
+    fetched and sent, newest first, and the watermark is moved forward once
+    every message has been sent. Articles already recorded by `dedup` or
+    `seen` are dropped before they are sent, and `dedup` records the rest
+    only once every one has been sent.
+
+    If the `stop` event is set, no further articles are fetched; those
+    already fetched are sent, but the watermark is not moved, as older
+    articles may not have been reached. Nor is it moved if any page failed
+    to fetch; such pages are counted in the stats' `failed_pages`.
+
+    Fetching runs on its own thread, at most `queue_size` articles ahead of
+    sending, so SQS batches are sent while later pages are downloading and
+    a slow queue holds fetching back rather than filling memory. Articles
+    are projected and encoded as set by `message_format`, and written to
+    the `spool` rather than sent, if given.
+    """
+    stats = QueryStats(query)
+    start = time.perf_counter()
+
+    fetch_options = with_show_fields(fetch_options, message_format)
+    if query.date_to:
+        fetch_options = {**fetch_options, "date_to": query.date_to}
+    if query.section:
+        fetch_options = {**fetch_options, "section": query.section}
+    if store is not None:
+        key = query_key(query.search_term, query.date_from, query.date_to)
+        watermark = store.load(key)
+        new_watermark = watermark.copy()
+        # Stopping at the watermark relies on results arriving in order.
+        fetch_options = {**fetch_options, "ordered": True}
+        fetch_options["order_by"] = "newest"
+
+    failed_pages = []
+    messages = iter_results(
+        query.search_term,
+        query.date_from,
+        failed_pages=failed_pages,
+        **fetch_options,
+    )
+    messages = count(messages, stats, "fetched")
+    if stop is not None:
+        messages = take_until(messages, stop)
+    if store is not None:
+        messages = track(iter_new(messages, watermark), new_watermark)
+    if seen is not None:
+        messages = seen.filter(messages, query.sqs_queue_name)
+    if dedup is not None:
+        pending = set()
+        messages = dedup.filter(messages, query.sqs_queue_name, pending)
+    messages = count(messages, stats, "queued")
+    messages = staged(messages, queue_size, name="fetch")
+
+    sent = False
+    try:
+        sent = send_messages(messages, stats, message_format, spool)
+    finally:
+        messages.close()
+        # Ids are only recorded once sent, so a failed send is retried by
+        # the next run rather than dropped as a duplicate.
+        if dedup is not None:
+            if sent:
+                dedup.commit(pending)
+            else:
+                dedup.release(pending)
+    stats.failed_pages = len(failed_pages)
+
+    # Articles on a page that failed may be older than the new watermark,
+    # so it is only moved once every page has been read and sent.
+    stopped = stop is not None and stop.is_set()
+    if store is not None and stats.complete and not stopped:
+        store.save(key, new_watermark)
+
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def run_queries(
+    queries: list[Query],
+    max_queries: int = 4,
+    checkpoint: None | str = None,
+    dedup_dir: None | str = None,
+    dedup_bloom_capacity: int = DEFAULT_BLOOM_CAPACITY,
+    dedup_error_rate: float = DEFAULT_ERROR_RATE,
+    **fetch_options,
+) -> list[QueryStats]:
+    """
+    Run several queries concurrently in one process, sharing the HTTP
+    session, AWS clients and API key between them.
+
+    Articles returned by more than one query are sent once to each
+    destination queue. Stats are returned in the order of `queries`.
+    `dedup_bloom_capacity` and `dedup_error_rate` size the Bloom filter of
+    a `dedup_dir`, which a capacity of 0 turns off.
+    """
+    store = open_store(checkpoint) if checkpoint else None
+    dedup = None
+    if dedup_dir:
+        dedup = Deduplicator(
+            dedup_dir,
+            bloom_capacity=dedup_bloom_capacity,
+            error_rate=dedup_error_rate,
+        )
+    seen = SeenIds() if len(queries) > 1 else None
+
+    # Keep a pooled connection open for every page fetched concurrently.
+    get_session(pool_size=max_queries * fetch_options.get("max_workers", 1))
+
+    with ThreadPoolExecutor(max_workers=max_queries) as executor:
+        stats = list(
+            executor.map(
+                lambda query: run_query(
+                    query, store, dedup, seen, **fetch_options
+                ),
+                queries,
+            )
+        )
+
+    if dedup is not None:
+        dedup.save()
+
+    return stats
+
+
+def run_daemon(
+    queries: list[Query],
+    min_interval: float = DEFAULT_MIN_INTERVAL,
+    max_interval: float = DEFAULT_MAX_INTERVAL,
+    max_queries: int = 4,
+    checkpoint: None | str = None,
+    dedup_dir: None | str = None,
+    stop: None | threading.Event = None,
+    dedup_bloom_capacity: int = DEFAULT_BLOOM_CAPACITY,
+    dedup_error_rate: float = DEFAULT_ERROR_RATE,
+    **fetch_options,
+) -> int:
+    """
+    Poll queries for new articles until SIGTERM is received or `stop` is
+    set, sending new articles to SQS as they are found, and return the
+    number of polls made.
+
+    Each query's poll interval adapts to how often it finds new articles.
+    The HTTP session, AWS clients and API key stay warm between polls.
+    Without a `checkpoint`, watermarks are kept in memory for the life of
+    the process. Articles returned by several queries are sent once to each
+    queue, tracked in a bounded set of recent ids when there is no
+    `dedup_dir`. `dedup_bloom_capacity` and `dedup_error_rate` size the
+    Bloom filter of a `dedup_dir`, which a capacity of 0 turns off.
+    """
+    store = open_store(checkpoint) if checkpoint else MemoryWatermarkStore()
+    if dedup_dir:
+        dedup = Deduplicator(
+            dedup_dir,
+            bloom_capacity=dedup_bloom_capacity,
+            error_rate=dedup_error_rate,
+        )
+    else:
+        dedup = Deduplicator(bloom_capacity=0)
+    stop = stop or threading.Event()
+
+    get_session(pool_size=max_queries * fetch_options.get("max_workers", 1))
+
+    def after_cycle(cycle: list[QueryStats]):
+        if dedup_dir:
+            dedup.save()
+
+    with stop_on_signals(stop):
+        return poll(
+            queries,
+            lambda query: run_query(
+                query, store, dedup, stop=stop, **fetch_options
+            ),
+            stop,
+            min_interval,
+            max_interval,
+            max_queries,
+            after_cycle,
+        )
+
+
+def plan_shards(
+    query: Query,
+    shard: str,
+    max_shard_results: int = DEFAULT_MAX_SHARD_RESULTS,
+    **fetch_options,
+):
+    """
+    Split the dates of a query into shards, either of a fixed length
+    ("daily" or "weekly") or "adaptive", sized from each range's total.
+    Without a `date_to`, the query runs up to today.
+    """
+    date_to = query.date_to or datetime.now(timezone.utc).date().isoformat()
+    if query.date_from is None:
+        raise ValueError("Sharding a query requires a date_from")
+
+    if shard in SHARD_DAYS:
+        return split_range(query.date_from, date_to, SHARD_DAYS[shard])
+
+    timeout = fetch_options.get("timeout", DEFAULT_TIMEOUT)
+    return plan_adaptive(
+        query.date_from,
+        date_to,
+        lambda s: count_results(
+            query.search_term, s.date_from, s.date_to, timeout, query.section
+        ),
+        max_shard_results,
+    )
+
+
+def run_backfill(
+    query: Query,
+    shard: str = "weekly",
+    shard_log: None | str = None,
+    max_shards: int = 4,
+    max_shard_results: int = DEFAULT_MAX_SHARD_RESULTS,
+    dedup_dir: None | str = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    message_format: None | MessageFormat = None,
+    spool: None | Spool = None,
+    dedup_bloom_capacity: int = DEFAULT_BLOOM_CAPACITY,
+    dedup_error_rate: float = DEFAULT_ERROR_RATE,
+    **fetch_options,
+) -> list[QueryStats]:
+    """
+    Fetch a query's whole date range as shards, several at a time, and send
+    their results to SQS in publication order, shard by shard.
+
+    If a `shard_log` path is given, each shard is recorded once all its
+    pages have been fetched and all its articles sent, and shards already
+    recorded are skipped, so a backfill that fails part way resumes with
+    only the missing shards. Ids are added to the `dedup_dir` only from
+    shards whose articles were all sent.
+    With a `spool`, results are written to it rather than sent, so a
+    backfill can be exported once and replayed to SQS many times.
+    Returns the stats of each shard fetched.
+    """
+    shards = plan_shards(query, shard, max_shard_results, **fetch_options)
+    log = ShardLog(shard_log) if shard_log else None
+    key = query_key(query.search_term, query.date_from, query.date_to)
+    if log is not None:
+        shards = [s for s in shards if not log.is_done(key, s)]
+    logging.info(f"Backfilling '{query.search_term}' in {len(shards)} shards")
+
+    dedup = None
+    if dedup_dir:
+        dedup = Deduplicator(
+            dedup_dir,
+            bloom_capacity=dedup_bloom_capacity,
+            error_rate=dedup_error_rate,
+        )
+    fetch_options = {**fetch_options, "order_by": "oldest", "ordered": True}
+    fetch_options = with_show_fields(fetch_options, message_format)
+    get_session(pool_size=max_shards * fetch_options.get("max_workers", 1))
+
+    # Each shard waiting its turn may fetch a whole adaptive shard ahead, so
+    # shards download in parallel rather than stalling once `queue_size`
+    # results are buffered. Memory is bounded by `max_shards` shards.
+    buffer_size = max(queue_size, max_shard_results)
+    all_stats, failed_pages = [], {}
+    for shard_range, results in iter_shard_results(
+        shards,
+        lambda s: iter_results(
+            query.search_term,
+            s.date_from,
+            date_to=s.date_to,
+            section=query.section,
+            failed_pages=failed_pages.setdefault(s, []),
+            **fetch_options,
+        ),
+        max_shards,
+        buffer_size,
+    ):
+        stats = QueryStats(
+            replace(
+                query,
+                date_from=shard_range.date_from,
+                date_to=shard_range.date_to,
+            )
+        )
+        start = time.perf_counter()
+        messages = count(results, stats, "fetched")
+        if dedup is not None:
+            pending = set()
+            messages = dedup.filter(messages, query.sqs_queue_name, pending)
+        messages = count(messages, stats, "queued")
+
+        sent = send_messages(messages, stats, message_format, spool)
+        stats.failed_pages = len(failed_pages.pop(shard_range))
+        if dedup is not None:
+            if sent:
+                dedup.commit(pending)
+                dedup.save()
+            else:
+                dedup.release(pending)
+        if log is not None and stats.complete:
+            log.mark_done(key, shard_range)
+        stats.seconds = time.perf_counter() - start
+        all_stats.append(stats)
+
+    return all_stats
+
+
+def backfill_unit(
+    unit: Query,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    rate_limits: None | dict = None,
+    cache: None | dict = None,
+    **fetch_options,
+) -> QueryStats:
+    """
+    Fetch and send one unit of a process-parallel backfill, governing
+    requests by the coordinator's `rate_limits` and caching responses in
+    its response `cache`, if given.
+    """
+    if rate_limits is not None:
+        guardian_rate.configure(**rate_limits)
+    if cache is not None and response_cache.settings() != cache:
+        response_cache.configure(**cache)
+    return run_query(
+        unit, queue_size=queue_size, order_by="oldest", **fetch_options
+    )
+
+
+def run_process_backfill(
+    query: Query,
+    shard: None | str = None,
+    sections: None | list[str] = None,
+    max_processes: None | int = None,
+    shard_log: None | str = None,
+    max_shard_results: int = DEFAULT_MAX_SHARD_RESULTS,
+    **fetch_options,
+) -> BackfillProgress:
+    """
+    Backfill a query across a pool of processes, so decoding and encoding
+    JSON is spread over every CPU core rather than one.
+
+    The query is partitioned into units by date `shard` and by `sections`,
+    and each unit is fetched and sent by a worker process with its own HTTP
+    session and SQS client. Articles are sent in publication order within a
+    unit, but units finish in any order. If a `shard_log` is given, units
+    whose pages have all been fetched and articles all sent are recorded
+    and skipped on restart.
+    """
+    shards = None
+    if shard:
+        shards = plan_shards(query, shard, max_shard_results, **fetch_options)
+    units = partition(query, shards, sections)
+
+    log = ShardLog(shard_log) if shard_log else None
+    if log is not None:
+        units = [
+            unit
+            for unit in units
+            if not log.is_done(
+                unit_key(unit), Shard(unit.date_from, unit.date_to)
+            )
+        ]
+
+    def on_done(stats: QueryStats):
+        if log is not None and stats.complete:
+            unit = stats.query
+            log.mark_done(unit_key(unit), Shard(unit.date_from, unit.date_to))
+
+    logging.info(
+        f"Backfilling '{query.search_term}' in {len(units)} units "
+        f"across {max_processes or 'all'} processes"
+    )
+    # Each process has its own governor, so they share the rate between
+    # them, and count against the quota together through its file.
+    rate_limits = guardian_rate.settings(max_processes or os.cpu_count() or 1)
+    return run_processes(
+        units,
+        backfill_unit,
+        max_processes,
+        on_done,
+        rate_limits=rate_limits,
+        cache=response_cache.settings(),
+        **fetch_options,
+    )
 
 
 def main(
     search_term: str,
     date_from: None | str = None,
-    sqs_queue_name: str = "guardian_content",
-):
+    sqs_queue_name: str = DEFAULT_QUEUE_NAME,
+    page_size: int = MAX_PAGE_SIZE,
+    max_workers: int = 1,
+    ordered: bool = True,
+    timeout: tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+    checkpoint: None | str = None,
+    dedup_dir: None | str = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    message_format: None | MessageFormat = None,
+) -> QueryStats:
     """
     Main function to accept input parameters, fetch results and send to SQS.
-    """
-    messages = fetch(search_term, date_from)
 
-    if len(messages):
-        send_to_sqs(messages, sqs_queue_name)
+    If a `checkpoint` path is given, only articles published since the
+    query's stored watermark are fetched and sent.
+
+    If a `dedup_dir` is given, articles whose ids were sent by any earlier
+    run are dropped before they are sent.
+
+    A `message_format` limits the fields sent and sets how each message is
+    encoded; by default the whole article is sent as JSON.
+    """
+    [stats] = run_queries(
+        [Query(search_term, date_from, sqs_queue_name)],
+        checkpoint=checkpoint,
+        dedup_dir=dedup_dir,
+        queue_size=queue_size,
+        message_format=message_format,
+        page_size=page_size,
+        max_workers=max_workers,
+        ordered=ordered,
+        timeout=timeout,
+    )
+    return stats
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     parser = argparse.ArgumentParser(
         description=(
-            "Fetch up to 10 search results from "
-            "Guardian API and send to SQS."
+            "Fetch all search results from Guardian API and send to SQS."
         )
     )
     parser.add_argument(
         "search_term",
+        nargs="*",
         help=(
             "Request content containing this free text. "
             "Supports AND, OR and NOT operators, "
             "and exact phrase queries using double quotes. "
             "Note entire search term must be enclosed in single quotes "
-            "if it contains phrases in double quotes."
+            "if it contains phrases in double quotes. "
+            "Several search terms run as separate queries."
+        ),
+    )
+    parser.add_argument(
+        "--config",
+        help=(
+            "JSON file listing further queries, each a search term or an "
+            "object with search_term, and optionally date_from and "
+            "sqs_queue_name."
         ),
     )
     parser.add_argument(
         "--date_from",
         help="Return only content published on or after this date.",
     )
+    parser.add_argument(
+        "--date_to",
+        help="Return only content published on or before this date.",
+    )
     parser.add_argument(
         "--sqs_queue_name",
-        default="guardian_content",
+        default=DEFAULT_QUEUE_NAME,
         help="Name of destination SQS queue.",
     )
+    parser.add_argument(
+        "--max_queries",
+        type=int,
+        default=4,
+        help="Number of queries to run concurrently.",
+    )
+    parser.add_argument(
+        "--page_size",
+        type=int,
+        default=MAX_PAGE_SIZE,
+        help=f"Number of results requested per page, up to {MAX_PAGE_SIZE}.",
+    )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=1,
+        help="Number of pages of results to fetch concurrently.",
+    )
+    parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help=(
+            "Send results as soon as each page arrives rather than in "
+            "page order."
+        ),
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help=(
+            "Parse each page as it downloads and send articles as soon as "
+            "they are decoded, fetching one page at a time."
+        ),
+    )
+    parser.add_argument(
+        "--connect_timeout",
+        type=float,
+        default=CONNECT_TIMEOUT,
+        help="Seconds to wait for a connection to the Guardian API.",
+    )
+    parser.add_argument(
+        "--read_timeout",
+        type=float,
+        default=READ_TIMEOUT,
+        help="Seconds to wait for the Guardian API to send a response.",
+    )
+    parser.add_argument(
+        "--fields",
+        nargs="?",
+        const=",".join(DEFAULT_FIELDS),
+        help=(
+            "Comma-separated article fields to send, such as "
+            "webTitle,webUrl,fields.trailText, where fields.<name> is an "
+            "extra field requested from the API. Without a value, sends "
+            f"{', '.join(DEFAULT_FIELDS)}. By default the whole article "
+            "is sent."
+        ),
+    )
+    parser.add_argument(
+        "--encoding",
+        choices=ENCODINGS,
+        default="json",
+        help=(
+            "How messages are encoded: json, compact (minified JSON) or "
+            "gzip (minified JSON, gzipped and base64 encoded, marked by a "
+            "ContentEncoding message attribute)."
+        ),
+    )
+    parser.add_argument(
+        "--claim_check_bucket",
+        help=(
+            "S3 bucket to store message bodies larger than "
+            "--claim_check_threshold in, queueing a pointer to each instead."
+        ),
+    )
+    parser.add_argument(
+        "--claim_check_threshold",
+        type=int,
+        default=DEFAULT_THRESHOLD,
+        help="Size in bytes above which message bodies are stored in S3.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help=(
+            "Fetch only content published since the last run, tracked in "
+            "this file. Paths ending .db or .sqlite use SQLite, any other "
+            "path a JSON file."
+        ),
+    )
+    parser.add_argument(
+        "--dedup_dir",
+        help=(
+            "Directory recording the ids of articles sent, so articles sent "
+            "by any earlier run are not sent again."
+        ),
+    )
+    parser.add_argument(
+        "--dedup_bloom_capacity",
+        type=int,
+        default=DEFAULT_BLOOM_CAPACITY,
+        help=(
+            "Number of ids the --dedup_dir Bloom filter is sized for. 0 "
+            "turns the filter off, holding only the most recent ids."
+        ),
+    )
+    parser.add_argument(
+        "--dedup_error_rate",
+        type=float,
+        default=DEFAULT_ERROR_RATE,
+        help=(
+            "Rate of false positives the --dedup_dir Bloom filter is sized "
+            "for once full, each dropping an article that was never sent."
+        ),
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help=(
+            "Keep polling the queries for new content until stopped with "
+            "SIGTERM or Ctrl-C."
+        ),
+    )
+    parser.add_argument(
+        "--min_interval",
+        type=float,
+        default=DEFAULT_MIN_INTERVAL,
+        help="Shortest time in seconds between polls of a query.",
+    )
+    parser.add_argument(
+        "--max_interval",
+        type=float,
+        default=DEFAULT_MAX_INTERVAL,
+        help="Longest time in seconds between polls of a query.",
+    )
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help=(
+            "Number of fetched articles that may wait to be sent before "
+            "fetching pauses."
+        ),
+    )
+    parser.add_argument(
+        "--rate_limit",
+        type=float,
+        default=RATE_LIMIT,
+        help=(
+            "Requests per second allowed to the Guardian API, shared by "
+            "every fetch. 0 means no limit."
+        ),
+    )
+    parser.add_argument(
+        "--daily_quota",
+        type=int,
+        default=DAILY_QUOTA,
+        help=(
+            "Requests per day allowed to the Guardian API. Requests slow "
+            "down as the quota runs low and stop once it is spent. 0 means "
+            "no limit."
+        ),
+    )
+    parser.add_argument(
+        "--quota_file",
+        default=QUOTA_FILE,
+        help=(
+            "Path of a file counting requests made today, so the daily "
+            "quota holds across runs and processes. Required with "
+            "--daily_quota."
+        ),
+    )
+    parser.add_argument(
+        "--cache",
+        help=(
+            "Path of a SQLite file caching Guardian API responses, so "
+            "repeated queries are answered from disk."
+        ),
+    )
+    parser.add_argument(
+        "--cache_ttl",
+        type=float,
+        default=response_cache.DEFAULT_TTL,
+        help="Seconds a cached response is used before it is revalidated.",
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        type=float,
+        default=response_cache.DEFAULT_MAX_BYTES / 1024 / 1024,
+        help="Size in MiB the response cache is kept within.",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help=(
+            "Time each stage and count articles, bytes and retries, and "
+            "print them at the end as CloudWatch Embedded Metric Format "
+            "JSON and as a table."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        help=(
+            "Profile the run's CPU time and memory, writing a report of "
+            "the time and memory of each stage, the top functions and "
+            "allocation sites, and the peak RSS to this file."
+        ),
+    )
+    parser.add_argument(
+        "--shard",
+        choices=["daily", "weekly", "adaptive"],
+        help=(
+            "Backfill each query's dates from --date_from to --date_to (or "
+            "today) as shards of a day, a week, or sized adaptively from "
+            "the number of results, fetched in parallel."
+        ),
+    )
+    parser.add_argument(
+        "--max_shards",
+        type=int,
+        default=4,
+        help="Number of shards to fetch concurrently.",
+    )
+    parser.add_argument(
+        "--max_shard_results",
+        type=int,
+        default=DEFAULT_MAX_SHARD_RESULTS,
+        help="Most results an adaptive shard may hold, unless a single day.",
+    )
+    parser.add_argument(
+        "--shard_log",
+        help=(
+            "File recording finished shards, so a restarted backfill only "
+            "fetches the shards that are missing."
+        ),
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help=(
+            "Backfill each query across this many worker processes, "
+            "partitioned by --shard and --sections."
+        ),
+    )
+    parser.add_argument(
+        "--sections",
+        help=(
+            "Comma-separated Guardian section ids, such as politics,sport, "
+            "to partition a process-parallel backfill by."
+        ),
+    )
+    parser.add_argument(
+        "--spool",
+        help=(
+            "Directory to write messages to as compressed segments, rather "
+            "than sending them to SQS, to be sent later with --replay."
+        ),
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help=(
+            "Send the messages in --spool to SQS instead of fetching, "
+            "resuming where an earlier replay stopped."
+        ),
+    )
+    parser.add_argument(
+        "--replay_rate",
+        type=float,
+        default=0,
+        help="Messages per second sent by --replay. 0 means no limit.",
+    )
+    parser.add_argument(
+        "--replay_queue",
+        help=(
+            "Name of the SQS queue --replay sends every message to. By "
+            "default each is sent to the queue it was spooled for."
+        ),
+    )
     args = parser.parse_args()
+    if args.metrics:
+        metrics.configure(enabled=True)
+    guardian_rate.configure(args.rate_limit, args.daily_quota, args.quota_file)
+    if args.cache:
+        response_cache.configure(
+            args.cache, args.cache_ttl, int(args.cache_max_mb * 1024 * 1024)
+        )
+
+    queries = [
+        Query(search_term, args.date_from, args.sqs_queue_name, args.date_to)
+        for search_term in args.search_term
+    ]
+    if args.config:
+        queries += load_queries(
+            args.config, args.date_from, args.sqs_queue_name, args.date_to
+        )
+    # Counted in memory, a quota would start afresh with every run and
+    # with every process of a backfill.
+    if args.daily_quota and not args.quota_file:
+        parser.error(
+            "--daily_quota requires --quota_file or GUARDIAN_QUOTA_FILE"
+        )
+    if not 0 < args.dedup_error_rate < 1:
+        parser.error("--dedup_error_rate must be between 0 and 1")
+    # Each worker process would keep its own copy of the watermarks and
+    # seen ids, and a backfill walks dates oldest first, not from a
+    # watermark.
+    if args.processes and (args.checkpoint or args.dedup_dir):
+        parser.error(
+            "--checkpoint and --dedup_dir cannot be used with --processes"
+        )
+    if args.shard and args.checkpoint:
+        parser.error("--checkpoint cannot be used with --shard")
+    if args.replay and not args.spool:
+        parser.error("--replay requires --spool")
+    if not queries and not args.replay:
+        parser.error("a search term or --config is required")
+
+    fetch_options = dict(
+        queue_size=args.queue_size,
+        page_size=args.page_size,
+        max_workers=args.max_workers,
+        ordered=not args.unordered,
+        timeout=(args.connect_timeout, args.read_timeout),
+    )
+    if args.fields or args.encoding != "json" or args.claim_check_bucket:
+        claim_check = None
+        if args.claim_check_bucket:
+            claim_check = ClaimCheck(
+                args.claim_check_bucket, args.claim_check_threshold
+            )
+        fetch_options["message_format"] = MessageFormat(
+            parse_fields(args.fields) if args.fields else None,
+            args.encoding,
+            claim_check,
+        )
+    if args.stream:
+        if args.max_workers != 1:
+            parser.error("--stream cannot be used with --max_workers")
+        fetch_options["stream"] = True
+    if args.spool and not args.replay:
+        fetch_options["spool"] = Spool(args.spool)
+
+    profiler = Profiler(args.profile) if args.profile else nullcontext()
+    with profiler:
+        if args.replay:
+            summary = replay(
+                Spool(args.spool), args.replay_queue, args.replay_rate
+            )
+            print(
+                f"Replayed {summary.successful} messages, "
+                f"{len(summary.failed)} failed"
+            )
+        elif args.processes:
+            for query in queries:
+                progress = run_process_backfill(
+                    query,
+                    args.shard,
+                    args.sections.split(",") if args.sections else None,
+                    args.processes,
+                    args.shard_log,
+                    args.max_shard_results,
+                    **fetch_options,
+                )
+                print(
+                    f"{query.search_term}: {progress.done} units, "
+                    f"{progress.fetched} fetched, {progress.sent} sent, "
+                    f"{progress.failed} failed, "
+                    f"{len(progress.failed_units)} units failed, "
+                    f"{progress.throughput:.1f} articles/s"
+                )
+        elif args.shard:
+            stats = []
+            for query in queries:
+                stats += run_backfill(
+                    query,
+                    args.shard,
+                    args.shard_log,
+                    args.max_shards,
+                    args.max_shard_results,
+                    dedup_dir=args.dedup_dir,
+                    dedup_bloom_capacity=args.dedup_bloom_capacity,
+                    dedup_error_rate=args.dedup_error_rate,
+                    **fetch_options,
+                )
+            print(format_summary(stats))
+        elif args.daemon:
+            run_daemon(
+                queries,
+                args.min_interval,
+                args.max_interval,
+                max_queries=args.max_queries,
+                checkpoint=args.checkpoint,
+                dedup_dir=args.dedup_dir,
+                dedup_bloom_capacity=args.dedup_bloom_capacity,
+                dedup_error_rate=args.dedup_error_rate,
+                **fetch_options,
+            )
+        else:
+            stats = run_queries(
+                queries,
+                max_queries=args.max_queries,
+                checkpoint=args.checkpoint,
+                dedup_dir=args.dedup_dir,
+                dedup_bloom_capacity=args.dedup_bloom_capacity,
+                dedup_error_rate=args.dedup_error_rate,
+                **fetch_options,
+            )
+            print(format_summary(stats))
 
-    main(args.search_term, args.date_from, args.sqs_queue_name)
+    if metrics.enabled:
+        metrics.emit()
+        print(metrics.summary())
@@ -0,0 +1,116 @@
+import base64
+from dataclasses import dataclass
+import gzip
+import json
+
+try:
+    from src.article import Article
+    from src.claim_check import ClaimCheck
+except ModuleNotFoundError:
+    from article import Article
+    from claim_check import ClaimCheck
+
+# Fields of an article promised to consumers of the queue.
+DEFAULT_FIELDS = ("webPublicationDate", "webTitle", "webUrl")
+
+ENCODINGS = ("json", "compact", "gzip")
+
+# Message attribute marking a body that must be decoded before parsing.
+CONTENT_ENCODING = "ContentEncoding"
+GZIP_BASE64 = "gzip+base64"
+
+# Prefix of a projected field requested with the API's `show-fields`.
+SHOW_FIELDS_PREFIX = "fields."
+
+
+def parse_fields(spec: str) -> tuple[str, ...]:
+    """Split a comma-separated list of fields, such as given on the CLI."""
+    return tuple(name.strip() for name in spec.split(",") if name.strip())
+
+
+@dataclass(frozen=True)
+class MessageFormat:
+    """
+    How articles are turned into SQS message entries.
+
+    `fields` is an allow-list of the article fields to send; None sends the
+    whole article. A name such as "fields.trailText" selects one of the
+    extra fields the API returns when asked for it with `show-fields`, and
+    is sent nested under "fields" as the API returns it.
+
+    `encoding` is "json", the default, "compact" for minified JSON, or
+    "gzip" for minified JSON compressed and base64 encoded, marked by a
+    `ContentEncoding` message attribute of "gzip+base64".
+
+    With a `claim_check`, encoded bodies over its threshold are stored in
+    S3 and a pointer to them is queued instead.
+    """
+
+    fields: None | tuple[str, ...] = None
+    encoding: str = "json"
+    claim_check: None | ClaimCheck = None
+
+    def __post_init__(self):
+        if self.encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {', '.join(ENCODINGS)}")
+
+    @property
+    def show_fields(self) -> tuple[str, ...]:
+        """The names to request with the API's `show-fields` parameter."""
+        return tuple(
+            name.removeprefix(SHOW_FIELDS_PREFIX)
+            for name in self.fields or ()
+            if name.startswith(SHOW_FIELDS_PREFIX)
+        )
+
+    def project(self, article: dict) -> dict:
+        """Return the allowed fields of an article, skipping any missing."""
+        if self.fields is None:
+            if isinstance(article, Article):
+                # json encodes only dicts, built from the slots in one step.
+                return article.to_dict()
+            return article
+
+        projected = {}
+        extras = article.get("fields") or {}
+        for name in self.fields:
+            if name.startswith(SHOW_FIELDS_PREFIX):
+                extra = name.removeprefix(SHOW_FIELDS_PREFIX)
+                if extra in extras:
+                    projected.setdefault("fields", {})[extra] = extras[extra]
+            elif name in article:
+                projected[name] = article[name]
+        return projected
+
+    def entry(self, id: str, article: dict) -> dict:
+        """Build a `send_message_batch` entry for an article."""
+        message = self.project(article)
+        if self.encoding == "json":
+            return {"Id": id, "MessageBody": json.dumps(message)}
+
+        body = json.dumps(message, separators=(",", ":"))
+        if self.encoding == "compact":
+            return {"Id": id, "MessageBody": body}
+
+        compressed = gzip.compress(body.encode("utf-8"), mtime=0)
+        return {
+            "Id": id,
+            "MessageBody": base64.b64encode(compressed).decode("ascii"),
+            "MessageAttributes": {
+                CONTENT_ENCODING: {
+                    "DataType": "String",
+                    "StringValue": GZIP_BASE64,
+                }
+            },
+        }
+
+
+def decode(body: str, attributes: None | dict = None):
+    """
+    Parse a message body in any of the encodings, as a consumer would,
+    given the message attributes received with it.
+    """
+    encoding = (attributes or {}).get(CONTENT_ENCODING, {})
+    if encoding.get("StringValue") == GZIP_BASE64:
+        body = gzip.decompress(base64.b64decode(body)).decode("utf-8")
+    return json.loads(body)
@@ -0,0 +1,268 @@
+from contextlib import nullcontext
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+# Metrics are collected only when turned on, by `--metrics` or, in Lambda,
+# by this environment variable, so that timing costs nothing otherwise.
+ENABLED = os.environ.get("GUARDIAN_METRICS", "").lower() in ("1", "true")
+NAMESPACE = os.environ.get("GUARDIAN_METRICS_NAMESPACE", "GuardianToSqs")
+
+PERCENTILES = (50, 95, 99)
+
+# Timings are counted in buckets growing by this ratio, so memory does not
+# grow with the number of timings and percentiles are within 5% of exact.
+BUCKET_RATIO = 2 ** (1 / 8)
+_LOG_RATIO = math.log(BUCKET_RATIO)
+_ZERO_BUCKET = -(2**31)
+
+# Most values a metric may have in an Embedded Metric Format document.
+MAX_EMF_VALUES = 100
+
+_NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    """
+    Distribution of non-negative values, counted in exponentially sized
+    buckets, with exact count, total, minimum and maximum.
+    """
+
+    __slots__ = ("count", "total", "min", "max", "_buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self._buckets = {}
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value > 0:
+            index = math.ceil(math.log(value) / _LOG_RATIO)
+        else:
+            index = _ZERO_BUCKET
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+
+    def _value(self, index: int) -> float:
+        """
+        Return the geometric middle of a bucket, within the values seen, as
+        the value of everything counted in it.
+        """
+        if index == _ZERO_BUCKET:
+            return 0.0
+        return min(max(BUCKET_RATIO ** (index - 0.5), self.min), self.max)
+
+    def percentile(self, percent: float) -> float:
+        """Return the value below which `percent` of values fall."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * percent / 100))
+        if rank == self.count:
+            return self.max
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                return self._value(index)
+        return self.max
+
+    def buckets(self) -> list[tuple[float, int]]:
+        """Return the value and count of each non-empty bucket."""
+        return [
+            (self._value(index), self._buckets[index])
+            for index in sorted(self._buckets)
+        ]
+
+
+class _Timer:
+    __slots__ = ("_metrics", "_name", "_start")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = self._metrics._clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._metrics.observe(self._name, self._metrics._clock() - self._start)
+
+
+class Metrics:
+    """
+    Process-wide counters and timers of the pipeline's stages.
+
+    `timer` times a block into a histogram of seconds and `count` adds to a
+    counter. While disabled both return at once without recording anything.
+    The collected metrics are written as CloudWatch Embedded Metric Format
+    JSON by `emit`, or as a table by `summary`. All methods are safe to call
+    from several threads at once.
+    """
+
+    def __init__(self, enabled: bool = ENABLED, clock=time.perf_counter):
+        self.enabled = enabled
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+
+    def configure(self, enabled: bool):
+        """Turn collection on or off, discarding metrics collected so far."""
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        """Discard the metrics collected so far."""
+        with self._lock:
+            self._counters = {}
+            self._timers = {}
+
+    def count(self, name: str, value: int = 1):
+        """Add `value` to a counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        """Record a duration in seconds in a timer's histogram."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._timers.get(name)
+            if histogram is None:
+                histogram = self._timers[name] = Histogram()
+            histogram.add(seconds)
+
+    def timer(self, name: str):
+        """Return a context manager timing its block into `name`."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def snapshot(self) -> dict:
+        """
+        Return the counters, and the count, total seconds and percentiles
+        of each timer.
+        """
+        with self._lock:
+            timers = {
+                name: {
+                    "count": histogram.count,
+                    "seconds": histogram.total,
+                    **{f"p{p}": histogram.percentile(p) for p in PERCENTILES},
+                }
+                for name, histogram in sorted(self._timers.items())
+            }
+            counters = dict(sorted(self._counters.items()))
+        return {"counters": counters, "timers": timers}
+
+    def emf(
+        self,
+        dimensions: None | dict = None,
+        namespace: str = NAMESPACE,
+        timestamp: None | float = None,
+    ) -> dict:
+        """
+        Return the metrics as a CloudWatch Embedded Metric Format document.
+
+        Each timer is a distribution of milliseconds given as values and
+        counts, with its percentiles as metrics of their own. Counters are
+        single values.
+        """
+        dimensions = dimensions or {}
+        definitions, values = [], {}
+        with self._lock:
+            for name, value in sorted(self._counters.items()):
+                definitions.append({"Name": name, "Unit": "Count"})
+                values[name] = value
+            for name, histogram in sorted(self._timers.items()):
+                definitions.append({"Name": name, "Unit": "Milliseconds"})
+                values[name] = _distribution(histogram)
+                for p in PERCENTILES:
+                    percentile = f"{name}.p{p}"
+                    definitions.append(
+                        {"Name": percentile, "Unit": "Milliseconds"}
+                    )
+                    values[percentile] = histogram.percentile(p) * 1000
+
+        timestamp = time.time() if timestamp is None else timestamp
+        return {
+            "_aws": {
+                "Timestamp": int(timestamp * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": namespace,
+                        "Dimensions": [sorted(dimensions)],
+                        "Metrics": definitions,
+                    }
+                ],
+            },
+            **dimensions,
+            **values,
+        }
+
+    def emit(self, file=None, dimensions: None | dict = None):
+        """
+        Write the metrics as one line of Embedded Metric Format JSON, which
+        CloudWatch Logs extracts metrics from, to `file` or stdout.
+        """
+        file = file or sys.stdout
+        file.write(json.dumps(self.emf(dimensions)) + "\n")
+        file.flush()
+
+    def summary(self) -> str:
+        """Return a table of each timer's percentiles and each counter."""
+        snapshot = self.snapshot()
+        rows = [("stage", "count", "seconds", "p50 ms", "p95 ms", "p99 ms")]
+        for name, timer in snapshot["timers"].items():
+            rows.append(
+                (
+                    name,
+                    str(timer["count"]),
+                    f"{timer['seconds']:.3f}",
+                    *(f"{timer[f'p{p}'] * 1000:.1f}" for p in PERCENTILES),
+                )
+            )
+        for name, value in snapshot["counters"].items():
+            rows.append((name, str(value), "", "", "", ""))
+
+        widths = [
+            max(len(row[i]) for row in rows) for i in range(len(rows[0]))
+        ]
+        return "\n".join(
+            "  ".join(cell.ljust(width) for cell, width in zip(row, widths))
+            for row in rows
+        )
+
+
+def _distribution(histogram: Histogram) -> dict:
+    """
+    Return a histogram in milliseconds as Embedded Metric Format values and
+    counts, merging neighbouring buckets until within the format's limit.
+    """
+    buckets = histogram.buckets()
+    while len(buckets) > MAX_EMF_VALUES:
+        merged = [
+            (math.sqrt(lower[0] * upper[0]), lower[1] + upper[1])
+            for lower, upper in zip(buckets[::2], buckets[1::2])
+        ]
+        if len(buckets) % 2:
+            merged.append(buckets[-1])
+        buckets = merged
+    return {
+        "Values": [value * 1000 for value, _ in buckets],
+        "Counts": [count for _, count in buckets],
+    }
+
+
+metrics = Metrics()
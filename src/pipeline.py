@@ -0,0 +1,98 @@
+import queue
+import threading
+
+# Default number of items a stage may hold before its producer waits.
+DEFAULT_QUEUE_SIZE = 500
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _put(buffer: queue.Queue, cancelled: threading.Event, item) -> bool:
+    while not cancelled.is_set():
+        try:
+            buffer.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce(iterable, buffer: queue.Queue, cancelled: threading.Event):
+    # Runs on the stage's thread. It holds no reference to the Stage itself,
+    # so a stage that is dropped without being closed can be collected.
+    try:
+        for item in iterable:
+            if not _put(buffer, cancelled, item):
+                return
+    except BaseException as error:
+        _put(buffer, cancelled, _Failure(error))
+        return
+    finally:
+        if close := getattr(iterable, "close", None):
+            close()
+    _put(buffer, cancelled, _DONE)
+
+
+class Stage:
+    """
+    An iterator over `iterable` that is advanced on a background thread,
+    handing items over through a queue holding at most `maxsize` of them.
+
+    This lets the work done producing items, such as waiting on the network,
+    overlap with the work done consuming them. The producer starts as soon
+    as the stage is created. When the consumer falls behind the queue fills
+    and the producer waits, so memory is bounded by `maxsize`. An exception
+    raised by the producer is raised again in the consumer, and closing the
+    stage, or exhausting it, stops the producer.
+    """
+
+    def __init__(
+        self, iterable, maxsize: int = DEFAULT_QUEUE_SIZE, name: str = None
+    ):
+        self._buffer = queue.Queue(maxsize)
+        self._cancelled = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(
+            target=_produce,
+            args=(iterable, self._buffer, self._cancelled),
+            name=name,
+            daemon=True,
+        )
+        self._thread.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        item = self._buffer.get()
+        if item is _DONE:
+            self.close()
+            raise StopIteration
+        if isinstance(item, _Failure):
+            self.close()
+            raise item.error
+        return item
+
+    def close(self):
+        """Stop the producer and wait for its thread to finish."""
+        self._finished = True
+        self._cancelled.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def __del__(self):
+        # Never join here: a stage dropped without being closed just lets
+        # its producer give up at its next attempt to queue an item.
+        self._cancelled.set()
+
+
+def staged(iterable, maxsize: int = DEFAULT_QUEUE_SIZE, name: str = None):
+    """Run `iterable` through a `Stage`, returning it as an iterator."""
+    return Stage(iterable, maxsize, name)
@@ -0,0 +1,267 @@
+import cProfile
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+# Functions whose cumulative time is the time spent in each stage of the
+# pipeline, as (file name, function name). Each is reported on its own, as
+# some stages run inside others: the stream parser reads the network.
+STAGE_FUNCTIONS = {
+    "secrets": [("secret_cache.py", "_fetch")],
+    "request": [("fetch.py", "_request")],
+    "decode": [("models.py", "json"), ("stream_json.py", "__next__")],
+    "articles": [("article.py", "__init__")],
+    "serialise": [("message_format.py", "entry")],
+    "claim check": [("claim_check.py", "offload")],
+    "queue url": [("aws_clients.py", "get_queue_url")],
+    "send": [("send_to_sqs.py", "send_batch")],
+}
+
+# Stage of the memory allocated by each module, judged by the innermost
+# module of the pipeline in an allocation's traceback.
+MODULE_STAGES = {
+    "article.py": "fetch",
+    "fetch.py": "fetch",
+    "http_session.py": "fetch",
+    "rate_limit.py": "fetch",
+    "response_cache.py": "fetch",
+    "secret_cache.py": "secrets",
+    "stream_json.py": "fetch",
+    "message_format.py": "serialise",
+    "claim_check.py": "serialise",
+    "aws_clients.py": "send",
+    "send_to_sqs.py": "send",
+    "pipeline.py": "queues",
+}
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Frames kept of each allocation's traceback, so it can be traced back to
+# the pipeline's code through the libraries it calls.
+TRACEBACK_FRAMES = 32
+
+# Seconds between checks for a new peak of traced memory, when the
+# allocations are captured again.
+SNAPSHOT_INTERVAL = 0.5
+
+
+def _table(rows: list[tuple]) -> str:
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths))
+        for row in rows
+    )
+
+
+def _function(key: tuple) -> str:
+    filename, line, name = key
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def _mib(size: int) -> str:
+    return f"{size / 1024 / 1024:.2f}"
+
+
+def peak_rss() -> int:
+    """Return the peak resident set size of the process, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Profiler:
+    """
+    Profile a run of the pipeline: CPU time with cProfile, in every thread,
+    and memory with tracemalloc, capturing the allocations at the peak of
+    traced memory. `write` saves a report of the time spent in each stage,
+    the top functions, the memory held by each stage and the top allocation
+    sites at the peak, and the peak RSS, along with the raw profile in
+    pstats format.
+
+    Used as a context manager, the body of the block is profiled and the
+    report written to `path` at its end.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        top: int = 25,
+        interval: float = SNAPSHOT_INTERVAL,
+    ):
+        self.path = path
+        self.top = top
+        self.interval = interval
+        self.seconds = 0.0
+        self.peak_traced = 0
+        self._lock = threading.Lock()
+        self._profiles = []
+        self._snapshot = None
+        self._snapshot_size = 0
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def _profile_thread(self, *args):
+        # Each thread needs a profiler of its own before Python 3.12, and
+        # enabling one replaces this hook in the thread it is called from.
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._capture_peak()
+
+    def _capture_peak(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak_traced = max(self.peak_traced, peak)
+        if self._snapshot is None or current > self._snapshot_size:
+            self._snapshot = tracemalloc.take_snapshot()
+            self._snapshot_size = current
+
+    def start(self):
+        tracemalloc.start(TRACEBACK_FRAMES)
+        self._sampler = threading.Thread(
+            target=self._sample, name="profiler", daemon=True
+        )
+        self._sampler.start()
+
+        # From Python 3.12 one profiler sees every thread.
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._profile_thread)
+        self._main = cProfile.Profile()
+        self._profiles.append(self._main)
+        self._start = time.perf_counter()
+        self._main.enable()
+        return self
+
+    def stop(self):
+        self._main.disable()
+        self.seconds = time.perf_counter() - self._start
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        self._stop.set()
+        self._sampler.join()
+        self._capture_peak()
+        tracemalloc.stop()
+
+    def stats(self) -> pstats.Stats:
+        """Return the CPU profile of every thread, merged."""
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def _stages(self, stats: pstats.Stats) -> list[tuple]:
+        rows = [("stage", "calls", "seconds")]
+        for stage, functions in STAGE_FUNCTIONS.items():
+            calls, seconds = 0, 0.0
+            for (filename, _, name), entry in stats.stats.items():
+                if (os.path.basename(filename), name) in functions:
+                    calls += entry[1]
+                    seconds += entry[3]
+            if calls:
+                rows.append((stage, str(calls), f"{seconds:.3f}"))
+        return rows
+
+    def _functions(self, stats: pstats.Stats, column: int) -> list[tuple]:
+        rows = [("calls", "own s", "cumulative s", "function")]
+        ranked = sorted(
+            stats.stats.items(), key=lambda item: item[1][column], reverse=True
+        )
+        top = self.top
+        for key, (_, calls, own, cumulative, _) in ranked[:top]:
+            rows.append(
+                (
+                    str(calls),
+                    f"{own:.3f}",
+                    f"{cumulative:.3f}",
+                    _function(key),
+                )
+            )
+        return rows
+
+    def _memory_by_stage(self) -> list[tuple]:
+        sizes, blocks, in_src = {}, {}, {}
+        for trace in self._snapshot.traces:
+            stage = "other"
+            for frame in reversed(trace.traceback):
+                filename = frame.filename
+                if filename not in in_src:
+                    directory = os.path.dirname(os.path.abspath(filename))
+                    in_src[filename] = directory == SRC_DIR
+                if in_src[filename]:
+                    name = os.path.basename(filename)
+                    stage = MODULE_STAGES.get(name, "other")
+                    break
+            sizes[stage] = sizes.get(stage, 0) + trace.size
+            blocks[stage] = blocks.get(stage, 0) + 1
+        rows = [("stage", "MiB", "blocks")]
+        for stage in sorted(sizes, key=sizes.get, reverse=True):
+            rows.append((stage, _mib(sizes[stage]), str(blocks[stage])))
+        return rows
+
+    def _allocation_sites(self) -> list[tuple]:
+        rows = [("MiB", "blocks", "site")]
+        top = self.top
+        for statistic in self._snapshot.statistics("lineno")[:top]:
+            frame = statistic.traceback[0]
+            rows.append(
+                (
+                    _mib(statistic.size),
+                    str(statistic.count),
+                    f"{frame.filename}:{frame.lineno}",
+                )
+            )
+        return rows
+
+    def report(self) -> str:
+        """Return the profile as a text report."""
+        stats = self.stats()
+        sections = [
+            f"Wall time: {self.seconds:.3f}s",
+            f"Peak RSS: {_mib(peak_rss())} MiB",
+            f"Peak traced memory: {_mib(self.peak_traced)} MiB",
+            "",
+            "Time by stage",
+            _table(self._stages(stats)),
+            "",
+            "Top functions by own time",
+            _table(self._functions(stats, 2)),
+            "",
+            "Top functions by cumulative time",
+            _table(self._functions(stats, 3)),
+            "",
+            "Memory by stage at peak",
+            _table(self._memory_by_stage()),
+            "",
+            "Top allocation sites at peak",
+            _table(self._allocation_sites()),
+        ]
+        return "\n".join(sections) + "\n"
+
+    def write(self) -> str:
+        """
+        Write the report to `path`, and the raw CPU profile beside it with
+        the suffix .prof, and return the report.
+        """
+        report = self.report()
+        with open(self.path, "w") as file:
+            file.write(report)
+        self.stats().dump_stats(f"{self.path}.prof")
+        return report
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        self.write()
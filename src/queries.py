@@ -0,0 +1,153 @@
+from dataclasses import dataclass
+import json
+import threading
+
+DEFAULT_QUEUE_NAME = "guardian_content"
+
+
+@dataclass(frozen=True)
+class Query:
+    """A search and the queue its results are sent to."""
+
+    search_term: str
+    date_from: None | str = None
+    sqs_queue_name: str = DEFAULT_QUEUE_NAME
+    date_to: None | str = None
+    section: None | str = None
+
+
+@dataclass
+class QueryStats:
+    """Counts and timing for one query of a run."""
+
+    query: Query
+    fetched: int = 0
+    queued: int = 0
+    sent: int = 0
+    failed: int = 0
+    failed_pages: int = 0
+    seconds: float = 0.0
+
+    @property
+    def complete(self) -> bool:
+        """Whether every page was fetched and every article sent."""
+        return not self.failed and not self.failed_pages
+
+    @property
+    def skipped(self) -> int:
+        """Articles fetched but not sent as they had been seen before."""
+        return self.fetched - self.queued
+
+    @property
+    def throughput(self) -> float:
+        """Articles fetched per second."""
+        return self.fetched / self.seconds if self.seconds else 0.0
+
+
+def count(articles, stats: QueryStats, field: str):
+    """Pass articles through, incrementing a counter on `stats` for each."""
+    for article in articles:
+        setattr(stats, field, getattr(stats, field) + 1)
+        yield article
+
+
+def load_queries(
+    path: str,
+    date_from: None | str = None,
+    sqs_queue_name: str = DEFAULT_QUEUE_NAME,
+    date_to: None | str = None,
+) -> list[Query]:
+    """
+    Load queries from a JSON config file holding a list of queries, or an
+    object with a "queries" list. Each query is a search term string or an
+    object with a "search_term" and optionally "date_from", "date_to" and
+    "sqs_queue_name", which otherwise default to the given values.
+    """
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    return parse_queries(config, date_from, sqs_queue_name, date_to)
+
+
+def parse_queries(
+    config,
+    date_from: None | str = None,
+    sqs_queue_name: str = DEFAULT_QUEUE_NAME,
+    date_to: None | str = None,
+) -> list[Query]:
+    """Build queries from the decoded contents of a config file."""
+    if isinstance(config, dict):
+        config = config["queries"]
+
+    queries = []
+    for entry in config:
+        if isinstance(entry, str):
+            entry = {"search_term": entry}
+        queries.append(
+            Query(
+                entry["search_term"],
+                entry.get("date_from", date_from),
+                entry.get("sqs_queue_name", sqs_queue_name),
+                entry.get("date_to", date_to),
+            )
+        )
+    return queries
+
+
+class SeenIds:
+    """
+    Thread-safe record of the articles sent to each queue during a run, so
+    that queries with overlapping results send each article once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = set()
+
+    def filter(self, articles, queue: str):
+        for article in articles:
+            key = (queue, article["id"])
+            with self._lock:
+                if key in self._seen:
+                    continue
+                self._seen.add(key)
+            yield article
+
+
+def format_summary(stats: list[QueryStats]) -> str:
+    """Return a table of per-query counts and throughput."""
+    rows = [
+        (
+            "query",
+            "queue",
+            "fetched",
+            "skipped",
+            "sent",
+            "failed",
+            "seconds",
+            "articles/s",
+        )
+    ]
+    for s in stats:
+        name = s.query.search_term
+        if s.query.section:
+            name += f" ({s.query.section})"
+        if s.query.date_to:
+            name += f" [{s.query.date_from or ''} to {s.query.date_to}]"
+        rows.append(
+            (
+                name,
+                s.query.sqs_queue_name,
+                str(s.fetched),
+                str(s.skipped),
+                str(s.sent),
+                str(s.failed),
+                f"{s.seconds:.2f}",
+                f"{s.throughput:.1f}",
+            )
+        )
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths))
+        for row in rows
+    )
@@ -0,0 +1,227 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+import fcntl
+import json
+import os
+import random
+import threading
+import time
+
+# Requests per second allowed to the Guardian API across the process, and
+# requests allowed per day across every process sharing a quota file. Zero
+# means no limit. A developer key allows 1 request a second and 500 a day.
+RATE_LIMIT = float(os.environ.get("GUARDIAN_RATE_LIMIT", 0))
+DAILY_QUOTA = int(os.environ.get("GUARDIAN_DAILY_QUOTA", 0))
+QUOTA_FILE = os.environ.get("GUARDIAN_QUOTA_FILE")
+
+# Once no more than this fraction of the daily quota remains, the remaining
+# requests are spread over the rest of the day rather than used up at once.
+QUOTA_RESERVE = 0.2
+
+_jitter = random.SystemRandom()
+
+
+class QuotaExhausted(Exception):
+    """Raised when the daily request quota has been used up."""
+
+
+def _today(now: datetime) -> str:
+    return now.date().isoformat()
+
+
+def _seconds_until_midnight(now: datetime) -> float:
+    midnight = datetime.combine(
+        now.date() + timedelta(days=1), datetime.min.time(), now.tzinfo
+    )
+    return (midnight - now).total_seconds()
+
+
+class DailyCounter:
+    """
+    Count the requests made each day, in memory or in a JSON file.
+
+    A file is locked while it is read and updated, so several processes
+    sharing one file count against the same quota.
+    """
+
+    def __init__(self, path: None | str = None):
+        self.path = path
+        self._day, self._count = None, 0
+
+    def _take(self, count: int, limit: int) -> None | int:
+        if limit and count >= limit:
+            return None
+        return count + 1
+
+    def take(self, day: str, limit: int = 0) -> None | int:
+        """
+        Count a request on `day` and return the day's new total, or return
+        None without counting it if `limit` requests have already been made.
+        """
+        if self.path is None:
+            if self._day != day:
+                self._day, self._count = day, 0
+            count = self._take(self._count, limit)
+            if count is not None:
+                self._count = count
+            return count
+
+        with open(self.path, "a+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.seek(0)
+                try:
+                    state = json.loads(file.read() or "{}")
+                except ValueError:
+                    state = {}
+                used = state.get("count", 0) if state.get("date") == day else 0
+                count = self._take(used, limit)
+                if count is not None:
+                    file.seek(0)
+                    file.truncate()
+                    json.dump({"date": day, "count": count}, file)
+                    file.flush()
+                    os.fsync(file.fileno())
+                return count
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class RateGovernor:
+    """
+    Process-wide governor of requests to an API: a token bucket allowing
+    `rate` requests a second with bursts of up to `burst`, and a counter of
+    requests against a `daily_quota`, persisted to `quota_file` if given.
+
+    Every request calls `acquire`, which waits for its turn. When the API
+    asks callers to back off, `pause` holds back every caller, not only the
+    one that was told to. Once the quota's reserve is reached, requests are
+    spaced so those remaining last until the quota resets at midnight UTC,
+    and once it is spent `acquire` raises `QuotaExhausted`. All methods are
+    safe to call from several threads at once.
+    """
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT,
+        daily_quota: int = DAILY_QUOTA,
+        quota_file: None | str = QUOTA_FILE,
+        burst: None | int = None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        now=lambda: datetime.now(timezone.utc),
+    ):
+        self._clock = clock
+        self._sleep = sleep
+        self._now = now
+        self._lock = threading.Lock()
+        self.configure(rate, daily_quota, quota_file, burst)
+
+    def configure(
+        self,
+        rate: float = 0,
+        daily_quota: int = 0,
+        quota_file: None | str = None,
+        burst: None | int = None,
+    ):
+        """Replace the governor's limits, starting with a full bucket."""
+        with self._lock:
+            self.rate = rate
+            self.burst = burst or max(1, int(rate))
+            self.daily_quota = daily_quota
+            self.quota_file = quota_file
+            self._counter = DailyCounter(quota_file)
+            self._tokens = float(self.burst)
+            self._updated = self._clock()
+            self._paused_until = 0.0
+            self._next_paced = 0.0
+
+    def settings(self, share: int = 1) -> dict:
+        """
+        Return the governor's limits as keyword arguments to `configure`,
+        with the rate divided between `share` processes.
+        """
+        return {
+            "rate": self.rate / share,
+            "daily_quota": self.daily_quota,
+            "quota_file": self.quota_file,
+        }
+
+    def _reserve(self) -> float:
+        """Take a token and count a request, returning how long to wait."""
+        now = self._clock()
+        wait = max(0.0, self._paused_until - now)
+
+        if self.rate > 0:
+            elapsed = now - self._updated
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.rate)
+
+        if self.daily_quota > 0:
+            today = self._now()
+            count = self._counter.take(_today(today), self.daily_quota)
+            if count is None:
+                if self.rate > 0:
+                    self._tokens += 1
+                raise QuotaExhausted(
+                    f"Daily quota of {self.daily_quota} requests used up"
+                )
+            remaining = self.daily_quota - count + 1
+            if remaining <= self.daily_quota * QUOTA_RESERVE:
+                gap = _seconds_until_midnight(today) / remaining
+                slot = max(now, self._next_paced)
+                self._next_paced = slot + gap
+                wait = max(wait, slot - now)
+
+        return wait
+
+    def acquire(self):
+        """
+        Wait until a request may be made, and count it against the quota.
+
+        Raises `QuotaExhausted` if the daily quota has been used up.
+        """
+        with self._lock:
+            wait = self._reserve()
+        if wait > 0:
+            self._sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold back every request for at least `seconds` from now."""
+        with self._lock:
+            self._paused_until = max(
+                self._paused_until, self._clock() + seconds
+            )
+
+
+def retry_after(value: None | str, now: None | datetime = None) -> float:
+    """
+    Return the seconds to wait given by a Retry-After header, which is
+    either a number of seconds or an HTTP date, or 0 if there is none.
+    """
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 0.0
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+def backoff(attempt: int, base: float, minimum: float = 0.0) -> float:
+    """
+    Return the seconds to wait before retry number `attempt`: exponential,
+    jittered backoff from `base`, and never less than `minimum`.
+    """
+    return max(minimum, base * 2**attempt * _jitter.uniform(0.5, 1.5))
+
+
+guardian_rate = RateGovernor()
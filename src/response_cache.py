@@ -0,0 +1,237 @@
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+import zlib
+
+# Seconds a cached page is used without asking the API again, unless the
+# query ends in the past, when its results will hardly change.
+DEFAULT_TTL = float(os.environ.get("GUARDIAN_CACHE_TTL", 300))
+HISTORICAL_TTL = 7 * 24 * 60 * 60
+
+# Total size of compressed bodies kept before the least recently used are
+# evicted.
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Query parameters that do not change the response, left out of cache keys.
+UNKEYED_PARAMS = {"api-key"}
+
+_lock = threading.Lock()
+_cache = None
+
+
+def cache_key(params: dict) -> str:
+    """
+    Return the key of a request's query parameters: the same for the same
+    query however its parameters are ordered, and whatever the API key.
+    """
+    return json.dumps(
+        sorted(
+            (name, str(value))
+            for name, value in params.items()
+            if name not in UNKEYED_PARAMS and value is not None
+        ),
+        separators=(",", ":"),
+    )
+
+
+def ttl_for(params: dict, ttl: float, now: None | datetime = None) -> float:
+    """
+    Return how long a response to `params` may be cached: `ttl`, or longer
+    if the query ends at least two days ago, as published articles are
+    rarely changed and nothing new falls in its dates.
+    """
+    to_date = params.get("to-date")
+    if not to_date:
+        return ttl
+    now = now or datetime.now(timezone.utc)
+    if to_date < (now - timedelta(days=2)).date().isoformat():
+        return max(ttl, HISTORICAL_TTL)
+    return ttl
+
+
+class CachedPage(NamedTuple):
+    """A cached response body, and the validators it was served with."""
+
+    body: bytes
+    etag: None | str
+    last_modified: None | str
+    fresh: bool
+
+
+class ResponseCache:
+    """
+    An on-disk cache of API response bodies in a SQLite database.
+
+    Bodies are stored compressed with zlib. Each entry expires after its
+    own TTL; an expired entry that came with an ETag or Last-Modified
+    header is kept so the API can be asked whether it has changed. Once the
+    stored bodies exceed `max_bytes`, the least recently used are evicted.
+    The cache may be shared by threads and by processes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        clock=time.time,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False
+        )
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, body BLOB, etag TEXT, "
+                "last_modified TEXT, expires REAL, accessed REAL, "
+                "size INTEGER)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed "
+                "ON responses (accessed)"
+            )
+
+    def get(self, key: str) -> None | CachedPage:
+        """
+        Return the cached page for a key, marking it recently used, or None
+        if there is none or it has expired without a validator.
+        """
+        now = self._clock()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT body, etag, last_modified, expires FROM responses "
+                "WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            body, etag, last_modified, expires = row
+            fresh = now < expires
+            if not fresh and etag is None and last_modified is None:
+                return None
+            self._connection.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+            )
+        return CachedPage(zlib.decompress(body), etag, last_modified, fresh)
+
+    def put(
+        self,
+        key: str,
+        body: bytes,
+        ttl: None | float = None,
+        etag: None | str = None,
+        last_modified: None | str = None,
+    ):
+        """Store a response body, evicting others to stay within size."""
+        compressed = zlib.compress(body)
+        self.put_compressed(key, compressed, ttl, etag, last_modified)
+
+    def put_compressed(
+        self,
+        key: str,
+        compressed: bytes,
+        ttl: None | float = None,
+        etag: None | str = None,
+        last_modified: None | str = None,
+    ):
+        """Store a body already compressed with zlib."""
+        now = self._clock()
+        expires = now + (self.ttl if ttl is None else ttl)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES "
+                "(?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    compressed,
+                    etag,
+                    last_modified,
+                    expires,
+                    now,
+                    len(compressed),
+                ),
+            )
+            self._evict()
+
+    def revalidated(self, key: str, ttl: None | float = None):
+        """Mark an entry fresh again after the API reported no change."""
+        now = self._clock()
+        expires = now + (self.ttl if ttl is None else ttl)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE responses SET expires = ?, accessed = ? "
+                "WHERE key = ?",
+                (expires, now, key),
+            )
+
+    def _evict(self):
+        (total,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = self._connection.execute(
+            "SELECT key, size FROM responses ORDER BY accessed"
+        )
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._connection.executemany(
+            "DELETE FROM responses WHERE key = ?", evicted
+        )
+
+    def size(self) -> int:
+        """Return the total size of the stored, compressed bodies."""
+        with self._lock:
+            (total,) = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return total
+
+    def close(self):
+        self._connection.close()
+
+
+def configure(
+    path: None | str,
+    ttl: float = DEFAULT_TTL,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+):
+    """
+    Open the process-wide response cache at `path`, or turn caching off if
+    `path` is None.
+    """
+    global _cache
+    with _lock:
+        if _cache is not None:
+            _cache.close()
+        _cache = ResponseCache(path, ttl, max_bytes) if path else None
+
+
+def get_cache() -> None | ResponseCache:
+    """Return the process-wide response cache, or None if it is off."""
+    return _cache
+
+
+def settings() -> None | dict:
+    """Return the keyword arguments to `configure` the current cache."""
+    if _cache is None:
+        return None
+    return {
+        "path": _cache.path,
+        "ttl": _cache.ttl,
+        "max_bytes": _cache.max_bytes,
+    }
@@ -0,0 +1,99 @@
+from botocore.exceptions import ClientError
+import logging
+import os
+import threading
+import time
+
+try:
+    from src.aws_clients import get_client
+    from src.metrics import metrics
+except ModuleNotFoundError:
+    from aws_clients import get_client
+    from metrics import metrics
+
+# Seconds a secret is reused before it is fetched again from Secrets Manager.
+DEFAULT_TTL = float(os.environ.get("GUARDIAN_API_KEY_TTL", 900))
+
+
+class SecretCache:
+    """
+    Process-level cache of a single Secrets Manager secret string.
+
+    The secret is fetched on first use and reused until `ttl` seconds have
+    passed, so warm Lambda invocations and repeated fetches do not pay for a
+    network round trip each time. All methods are
+    safe to call from several threads at once.
+    """
+
+    def __init__(
+        self,
+        secret_id: str,
+        region_name: str = "eu-west-2",
+        ttl: float = DEFAULT_TTL,
+        clock=time.monotonic,
+    ):
+        self.secret_id = secret_id
+        self.region_name = region_name
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires_at = 0.0
+        # The rejected value the current one was last refreshed from.
+        self._refreshed_from = None
+
+    def _fetch(self):
+        logging.info("Retrieving API key from AWS Secrets Manager")
+        client = get_client("secretsmanager", self.region_name)
+        try:
+            with metrics.timer("secrets.get_secret_value"):
+                response = client.get_secret_value(SecretId=self.secret_id)
+        except ClientError:
+            logging.error(
+                "Failed to retrieve Guardian API key from Secrets Manager"
+            )
+            self._value = None
+            return
+
+        self._value = response["SecretString"]
+        self._expires_at = self._clock() + self.ttl
+        return self._value
+
+    def get(self) -> None | str:
+        """Return the cached secret, fetching it if missing or expired."""
+        with self._lock:
+            if self._value is not None and self._clock() < self._expires_at:
+                return self._value
+            self._refreshed_from = None
+            return self._fetch()
+
+    def refresh(self, stale: str) -> None | str:
+        """
+        Replace a secret that has been rejected and return the current one.
+
+        Only the first caller to report a given stale value triggers a fetch;
+        concurrent callers reporting the same value receive the refreshed
+        secret without fetching it again, even if it is unchanged.
+        """
+        with self._lock:
+            if self._value is not None and (
+                self._value != stale or self._refreshed_from == stale
+            ):
+                return self._value
+            self._refreshed_from = stale
+            value = self._fetch()
+            if value == stale:
+                # Still the rejected secret: answer these callers with it,
+                # but fetch it again on the next `get`, once it is rotated.
+                self._expires_at = 0.0
+            return value
+
+    def clear(self):
+        """Forget the cached secret."""
+        with self._lock:
+            self._value = None
+            self._expires_at = 0.0
+            self._refreshed_from = None
+
+
+guardian_api_key = SecretCache("GUARDIAN_API_KEY")
@@ -1,23 +1,240 @@
-import boto3
-import json
+from botocore.exceptions import ClientError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 import logging
+import random
+import time
+from typing import Iterable
 
+try:
+    from src.aws_clients import (
+        get_client,
+        get_queue_url,
+        is_queue_does_not_exist,
+        refresh_queue_url,
+    )
+    from src.message_format import MessageFormat
+    from src.metrics import metrics
+    from src.pipeline import DEFAULT_QUEUE_SIZE, staged
+except ModuleNotFoundError:
+    from aws_clients import (
+        get_client,
+        get_queue_url,
+        is_queue_does_not_exist,
+        refresh_queue_url,
+    )
+    from message_format import MessageFormat
+    from metrics import metrics
+    from pipeline import DEFAULT_QUEUE_SIZE, staged
 
-def send_to_sqs(messages: list[dict], queue: str):
-    """Sends messages to named SQS queue."""
-    sqs = boto3.client("sqs")
+# Limits SQS places on a single send_message_batch request.
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
 
-    entries = [
-        {"Id": str(i), "MessageBody": json.dumps(message)}
-        for i, message in enumerate(messages)
-    ]
+_jitter = random.SystemRandom()
+
+
+@dataclass
+class SendSummary:
+    """Aggregated outcome of sending messages to a queue."""
+
+    successful: int = 0
+    failed: list[dict] = field(default_factory=list)
+    retries: int = 0
+
+    def merge(self, other: "SendSummary"):
+        self.successful += other.successful
+        self.failed.extend(other.failed)
+        self.retries += other.retries
+
+
+def entry_size(entry: dict) -> int:
+    """
+    Return the number of bytes an entry counts towards a batch's limit: its
+    body, and the name, type and value of each of its message attributes.
+    """
+    size = len(entry["MessageBody"].encode("utf-8"))
+    for name, attribute in entry.get("MessageAttributes", {}).items():
+        size += len(name.encode("utf-8"))
+        size += len(attribute["DataType"].encode("utf-8"))
+        size += len(attribute.get("StringValue", "").encode("utf-8"))
+        size += len(attribute.get("BinaryValue", b""))
+    return size
+
+
+def pack_batches(
+    entries: Iterable[dict],
+    max_entries: int = MAX_BATCH_ENTRIES,
+    max_bytes: int = MAX_BATCH_BYTES,
+):
+    """
+    Lazily group entries into batches that respect both the number of
+    entries and the total payload size SQS accepts in a single request.
+
+    An entry that is larger than `max_bytes` on its own is placed in a batch
+    by itself, so that SQS reports it as failed without holding back others.
+    """
+    batch, batch_bytes = [], 0
+    for entry in entries:
+        size = entry_size(entry)
+        if batch and (
+            len(batch) == max_entries or batch_bytes + size > max_bytes
+        ):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(entry)
+        batch_bytes += size
+
+    if batch:
+        yield batch
+
+
+def _send_message_batch(sqs, queue_url, entries, queue, region_name):
+    """
+    Call send_message_batch, and if the queue no longer exists at the cached
+    URL, resolve the queue by name again and retry once.
+    """
+    try:
+        return sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+    except ClientError as error:
+        if queue is None or not is_queue_does_not_exist(error):
+            raise
+        new_url = refresh_queue_url(queue, queue_url, region_name)
+        if new_url is None or new_url == queue_url:
+            raise
+        logging.info(f"Resolved new URL for queue {queue}")
+        return sqs.send_message_batch(QueueUrl=new_url, Entries=entries)
+
+
+def send_batch(
+    sqs,
+    queue_url: str,
+    entries: list[dict],
+    max_retries: int = 3,
+    backoff: float = 0.1,
+    queue: None | str = None,
+    region_name: None | str = None,
+) -> SendSummary:
+    """
+    Send one batch of entries, retrying only the entries SQS reports in the
+    response's `Failed` array.
+
+    Entries that failed through a fault of the sender are not retried, as
+    they would fail again. Retries wait with exponential, jittered backoff.
+    If the name of the `queue` is given, a queue that has been redeployed
+    under a new URL is looked up again rather than failing the batch.
+    """
+    summary = SendSummary()
+    for attempt in range(max_retries + 1):
+        try:
+            with metrics.timer("sqs.send_message_batch"):
+                response = _send_message_batch(
+                    sqs, queue_url, entries, queue, region_name
+                )
+        except ClientError as error:
+            code = error.response["Error"]["Code"]
+            summary.failed.extend(
+                {"Id": entry["Id"], "Code": code, "SenderFault": False}
+                for entry in entries
+            )
+            return summary
+
+        summary.successful += len(response.get("Successful", []))
+        failed = response.get("Failed", [])
+        retryable = [f for f in failed if not f.get("SenderFault")]
+        summary.failed.extend(f for f in failed if f.get("SenderFault"))
+
+        if not retryable:
+            return summary
+        if attempt == max_retries:
+            summary.failed.extend(retryable)
+            return summary
+
+        retry_ids = {f["Id"] for f in retryable}
+        entries = [entry for entry in entries if entry["Id"] in retry_ids]
+        summary.retries += len(entries)
+        metrics.count("sqs.retries", len(entries))
+        time.sleep(backoff * 2**attempt * _jitter.uniform(0.5, 1.5))
+
+    return summary
+
+
+def _serialise(messages: Iterable[dict], message_format: MessageFormat):
+    claim_check = message_format.claim_check
+    for i, message in enumerate(messages):
+        with metrics.timer("sqs.serialise"):
+            entry = message_format.entry(str(i), message)
+        if claim_check is not None:
+            entry = claim_check.offload(entry, message)
+        yield entry
+
+
+def send_to_sqs(
+    messages: Iterable[dict],
+    queue: str,
+    max_workers: int = 4,
+    max_retries: int = 3,
+    region_name: None | str = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    message_format: None | MessageFormat = None,
+) -> SendSummary:
+    """
+    Sends messages to named SQS queue.
+
+    Messages may be any iterable, including a generator, and are packed into
+    batches within the SQS entry count and payload size limits. Batches are
+    sent concurrently over a pool of `max_workers` threads, with at most two
+    batches per worker waiting so memory stays bounded. Messages are
+    serialised on a separate thread, at most `queue_size` ahead of the
+    batches being sent, projected and encoded as set by `message_format`.
+    If it has a claim check, oversized bodies are offloaded to S3 as they
+    are serialised, so batches stay dense and no message is too large.
+
+    The SQS client and the queue's URL are created once per process and
+    reused by later calls.
+    """
+    sqs = get_client("sqs", region_name)
 
     # Get URL for queue
-    queue_url = sqs.get_queue_url(QueueName=queue)
-    queue_url = queue_url["QueueUrl"]
+    queue_url = get_queue_url(queue, region_name)
+
+    message_format = message_format or MessageFormat()
+    entries = staged(
+        _serialise(messages, message_format), queue_size, name="serialise"
+    )
 
     # Send to queue
-    logging.info(f"Sending {len(messages)} messages to queue {queue}")
-    response = sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+    summary = SendSummary()
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in pack_batches(entries):
+            if len(pending) >= max_workers * 2:
+                summary.merge(pending.popleft().result())
+            logging.info(f"Sending {len(batch)} messages to queue {queue}")
+            if metrics.enabled:
+                metrics.count("sqs.batches")
+                metrics.count("sqs.bytes", sum(map(entry_size, batch)))
+            pending.append(
+                executor.submit(
+                    send_batch,
+                    sqs,
+                    queue_url,
+                    batch,
+                    max_retries,
+                    queue=queue,
+                    region_name=region_name,
+                )
+            )
+        while pending:
+            summary.merge(pending.popleft().result())
+
+    metrics.count("articles.sent", summary.successful)
+    metrics.count("articles.failed", len(summary.failed))
+    logging.info(f"Sent {summary.successful} messages to queue {queue}")
+    if summary.failed:
+        logging.error(
+            f"Failed to send {len(summary.failed)} messages to queue {queue}"
+        )
 
-    return response
+    return summary
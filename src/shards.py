@@ -0,0 +1,173 @@
+from collections import deque
+from dataclasses import dataclass
+from datetime import date, timedelta
+import json
+import os
+import threading
+
+try:
+    from src.pipeline import DEFAULT_QUEUE_SIZE, Stage
+except ModuleNotFoundError:
+    from pipeline import DEFAULT_QUEUE_SIZE, Stage
+
+# Length in days of each shard for the fixed sharding modes.
+SHARD_DAYS = {"daily": 1, "weekly": 7}
+
+# Largest number of results an adaptive shard is allowed to hold, unless it
+# is already a single day.
+DEFAULT_MAX_SHARD_RESULTS = 5000
+
+
+@dataclass(frozen=True)
+class Shard:
+    """An inclusive range of publication dates, as YYYY-MM-DD strings."""
+
+    date_from: str
+    date_to: str
+
+    @property
+    def days(self) -> int:
+        return (parse_date(self.date_to) - parse_date(self.date_from)).days + 1
+
+
+def parse_date(value: str) -> date:
+    """Return the calendar date of a date or date and time string."""
+    return date.fromisoformat(value[:10])
+
+
+def split_range(date_from: str, date_to: str, days: int) -> list[Shard]:
+    """Split a date range into consecutive shards of `days` days or fewer."""
+    start, end = parse_date(date_from), parse_date(date_to)
+    if start > end:
+        raise ValueError(f"date_from {date_from} is after date_to {date_to}")
+
+    shards = []
+    while start <= end:
+        stop = min(start + timedelta(days=days - 1), end)
+        shards.append(Shard(start.isoformat(), stop.isoformat()))
+        start = stop + timedelta(days=1)
+    return shards
+
+
+def plan_adaptive(
+    date_from: str,
+    date_to: str,
+    count,
+    max_results: int = DEFAULT_MAX_SHARD_RESULTS,
+) -> list[Shard]:
+    """
+    Split a date range into shards of at most `max_results` results each.
+
+    `count(shard)` returns the number of results in a shard. Ranges holding
+    too many are halved until they fit or are a single day, so busy periods
+    get short shards and quiet ones long shards.
+    """
+    start, end = parse_date(date_from), parse_date(date_to)
+    if start > end:
+        raise ValueError(f"date_from {date_from} is after date_to {date_to}")
+
+    shards, pending = [], [Shard(start.isoformat(), end.isoformat())]
+    while pending:
+        shard = pending.pop()
+        if shard.days == 1 or count(shard) <= max_results:
+            shards.append(shard)
+            continue
+        middle = parse_date(shard.date_from) + timedelta(
+            days=shard.days // 2 - 1
+        )
+        pending += [
+            Shard((middle + timedelta(days=1)).isoformat(), shard.date_to),
+            Shard(shard.date_from, middle.isoformat()),
+        ]
+    return shards
+
+
+class ShardLog:
+    """
+    Append-only record of the shards that have been fetched and sent for
+    each query, so an interrupted backfill resumes with the missing ones.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash records nothing.
+                        continue
+                    self._done.add(
+                        (
+                            entry["query"],
+                            Shard(entry["date_from"], entry["date_to"]),
+                        )
+                    )
+
+    def is_done(self, key: str, shard: Shard) -> bool:
+        with self._lock:
+            return (key, shard) in self._done
+
+    def mark_done(self, key: str, shard: Shard):
+        entry = {
+            "query": key,
+            "date_from": shard.date_from,
+            "date_to": shard.date_to,
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._done.add((key, shard))
+
+
+def iter_shard_results(
+    shards: list[Shard],
+    fetch_shard,
+    max_shards: int = 4,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+):
+    """
+    Yield `(shard, results)` pairs in the order of `shards`, where `results`
+    iterates over `fetch_shard(shard)`.
+
+    Up to `max_shards` shards are fetched at once, each on its own thread
+    and at most `queue_size` results ahead of the consumer, so later shards
+    download while earlier ones are consumed. With shards in date order and
+    each fetched oldest first, results come out in publication order.
+    """
+    shards = iter(shards)
+    pending = deque()
+
+    def start():
+        shard = next(shards, None)
+        if shard is not None:
+            pending.append(
+                (
+                    shard,
+                    Stage(
+                        fetch_shard(shard),
+                        queue_size,
+                        name=f"shard {shard.date_from}",
+                    ),
+                )
+            )
+
+    for _ in range(max_shards):
+        start()
+
+    try:
+        while pending:
+            shard, results = pending.popleft()
+            try:
+                yield shard, results
+            finally:
+                results.close()
+            start()
+    finally:
+        for _, results in pending:
+            results.close()
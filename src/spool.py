@@ -0,0 +1,417 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import fcntl
+import gzip
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from typing import Iterable
+
+try:
+    from src.aws_clients import get_client, get_queue_url
+    from src.message_format import MessageFormat
+    from src.metrics import metrics
+    from src.rate_limit import RateGovernor
+    from src.send_to_sqs import (
+        SendSummary,
+        _serialise,
+        pack_batches,
+        send_batch,
+    )
+except ModuleNotFoundError:
+    from aws_clients import get_client, get_queue_url
+    from message_format import MessageFormat
+    from metrics import metrics
+    from rate_limit import RateGovernor
+    from send_to_sqs import (
+        SendSummary,
+        _serialise,
+        pack_batches,
+        send_batch,
+    )
+
+# Messages written to a segment before another is started.
+DEFAULT_SEGMENT_SIZE = 10_000
+
+SEGMENT_SUFFIX = ".ndjson.gz"
+PARTIAL_SUFFIX = ".part"
+# A partial segment is created under this suffix and locked before it is
+# renamed to its partial name, so it is never seen unlocked while written.
+NEW_SUFFIX = ".new"
+
+# gzip level of segments: most of the saving of level 9 at a fraction of
+# the time, so spooling keeps up with fetching.
+COMPRESSLEVEL = 6
+
+
+class Spool:
+    """
+    Write-ahead spool of serialised messages on local disk, to be sent to
+    SQS later by `replay`, as often as needed.
+
+    Messages are kept in a directory per destination queue, as gzipped
+    NDJSON segments of at most `segment_size` SQS entries each. A segment
+    is written under a temporary name and renamed once complete, so a
+    segment that can be replayed is never changed again. Segment names
+    start with the time they were begun, so they sort in the order written,
+    and hold the writer's process id, so processes can share a spool.
+    """
+
+    def __init__(
+        self, directory: str, segment_size: int = DEFAULT_SEGMENT_SIZE
+    ):
+        self.directory = directory
+        self.segment_size = segment_size
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def __getstate__(self):
+        # Worker processes open the spool anew, numbering their own segments.
+        return {"directory": self.directory, "segment_size": self.segment_size}
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)
+
+    def queue_directory(self, queue: str) -> str:
+        return os.path.join(self.directory, queue)
+
+    def _segment_path(self, queue: str) -> str:
+        with self._lock:
+            sequence = next(self._sequence)
+        name = f"{time.time_ns():020d}-{os.getpid()}-{sequence:06d}"
+        return os.path.join(
+            self.queue_directory(queue), f"{name}{SEGMENT_SUFFIX}"
+        )
+
+    def _open_segment(self, queue: str) -> "_SegmentWriter":
+        return _SegmentWriter(self._segment_path(queue))
+
+    def append(
+        self,
+        queue: str,
+        messages: Iterable[dict],
+        message_format: None | MessageFormat = None,
+    ) -> int:
+        """
+        Serialise messages for `queue` as set by `message_format` and write
+        them to the spool, returning the number written.
+
+        Each message is compressed into the open segment as it arrives, so
+        memory does not grow with the segment size. Every segment is
+        complete when this returns, even if `messages` raised, as the
+        messages written before it are whole.
+        """
+        message_format = message_format or MessageFormat()
+        os.makedirs(self.queue_directory(queue), exist_ok=True)
+
+        written, segment = 0, None
+        try:
+            for entry in _serialise(messages, message_format):
+                if segment is None:
+                    segment = self._open_segment(queue)
+                # Ids are given again on replay, unique within each segment.
+                del entry["Id"]
+                segment.write(entry)
+                written += 1
+                if segment.count == self.segment_size:
+                    segment.close()
+                    segment = None
+        finally:
+            if segment is not None:
+                segment.close()
+
+        metrics.count("spool.written", written)
+        logging.info(f"Spooled {written} messages for queue {queue}")
+        return written
+
+    def queues(self) -> list[str]:
+        """Return the queues the spool holds messages for."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name
+            for name in os.listdir(self.directory)
+            if os.path.isdir(self.queue_directory(name))
+        )
+
+    def recover(self, queue: str) -> int:
+        """
+        Complete the segments left half written by writers that have died,
+        keeping every whole message they hold, and return the number of
+        messages recovered.
+
+        A writer holds a lock on its partial segment until the segment is
+        complete, so a partial whose lock can be taken has been abandoned,
+        whatever became of the process that wrote it.
+        """
+        directory = self.queue_directory(queue)
+        recovered = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(PARTIAL_SUFFIX):
+                continue
+            partial = os.path.join(directory, name)
+            try:
+                file = open(partial, "rb")
+            except FileNotFoundError:
+                # Completed since the directory was listed.
+                continue
+            with file:
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                try:
+                    current = os.stat(partial).st_ino
+                except FileNotFoundError:
+                    current = None
+                if current != os.fstat(file.fileno()).st_ino:
+                    # Completed while the lock was being taken.
+                    continue
+                lines = _whole_lines(file)
+                complete = partial.removesuffix(PARTIAL_SUFFIX)
+                with gzip.open(complete, "wb", COMPRESSLEVEL) as segment:
+                    segment.writelines(lines)
+                os.remove(partial)
+            logging.info(f"Recovered {len(lines)} messages from {name}")
+            recovered += len(lines)
+        return recovered
+
+    def segments(self, queue: str) -> list[str]:
+        """Return the names of a queue's complete segments, oldest first."""
+        directory = self.queue_directory(queue)
+        return sorted(
+            name
+            for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def read(self, queue: str, segment: str, start: int = 0):
+        """Yield the SQS entries of a segment, from line `start` on."""
+        path = os.path.join(self.queue_directory(queue), segment)
+        with gzip.open(path, "rb") as lines:
+            for number, line in enumerate(lines):
+                if number >= start:
+                    yield {"Id": str(number), **json.loads(line)}
+
+
+def _whole_lines(file) -> list[bytes]:
+    """Return the complete lines of a gzip stream that may be cut short."""
+    lines = []
+    try:
+        with gzip.GzipFile(fileobj=file, mode="rb") as segment:
+            for line in segment:
+                if line.endswith(b"\n"):
+                    lines.append(line)
+    except (EOFError, OSError):
+        # The rest of the segment was never written.
+        pass
+    return lines
+
+
+class _SegmentWriter:
+    """
+    A segment being written: messages are compressed into its partial file
+    one by one, and `close` syncs it to disk and renames it into place.
+    The partial file is locked for as long as it is written, so `recover`
+    leaves it alone.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        partial = path + PARTIAL_SUFFIX
+        self._file = open(partial + NEW_SUFFIX, "wb")
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        os.replace(partial + NEW_SUFFIX, partial)
+        self._gzip = gzip.GzipFile(
+            fileobj=self._file, mode="wb", compresslevel=COMPRESSLEVEL, mtime=0
+        )
+
+    def write(self, entry: dict):
+        self._gzip.write(
+            json.dumps(entry, separators=(",", ":")).encode() + b"\n"
+        )
+        self.count += 1
+
+    def close(self):
+        self._gzip.close()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        # Renamed before the lock is released by closing.
+        os.replace(self.path + PARTIAL_SUFFIX, self.path)
+        self._file.close()
+
+
+class ReplayLog:
+    """
+    Append-only record of how far each segment of a queue's spool has been
+    replayed to a destination queue, so an interrupted replay resumes after
+    the last batch sent, and segments once sent in full are skipped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sent = {}
+        self._done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash records nothing.
+                        continue
+                    if entry.get("done"):
+                        self._done.add(entry["segment"])
+                    else:
+                        self._sent[entry["segment"]] = entry["sent"]
+
+    def _append(self, entry: dict):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def is_done(self, segment: str) -> bool:
+        with self._lock:
+            return segment in self._done
+
+    def sent(self, segment: str) -> int:
+        """Return the number of a segment's messages already sent."""
+        with self._lock:
+            return self._sent.get(segment, 0)
+
+    def mark_sent(self, segment: str, sent: int):
+        with self._lock:
+            self._append({"segment": segment, "sent": sent})
+            self._sent[segment] = sent
+
+    def mark_done(self, segment: str):
+        with self._lock:
+            self._append({"segment": segment, "done": True})
+            self._done.add(segment)
+            self._sent.pop(segment, None)
+
+
+def _replay_segment(
+    spool: Spool,
+    queue: str,
+    segment: str,
+    destination: str,
+    log: ReplayLog,
+    governor: RateGovernor,
+    max_workers: int,
+    region_name: None | str,
+) -> SendSummary:
+    """
+    Send a segment's unsent messages to `destination`, recording progress
+    after each batch, and mark it done if every message was sent.
+
+    Batches are sent concurrently, but progress only moves past a batch
+    once it and every batch before it have been sent. Messages SQS rejects
+    as malformed are logged and skipped; if others fail, the segment stops
+    at the failed batch, to be resumed by the next replay.
+    """
+    sqs = get_client("sqs", region_name)
+    queue_url = get_queue_url(destination, region_name)
+    summary = SendSummary()
+    start = log.sent(segment)
+    sent = start
+    failed = False
+    pending = deque()
+
+    def settle():
+        nonlocal sent, failed
+        future, size = pending.popleft()
+        result = future.result()
+        summary.merge(result)
+        retryable = [f for f in result.failed if not f.get("SenderFault")]
+        if failed or retryable:
+            failed = True
+            return
+        for rejected in result.failed:
+            logging.error(
+                f"SQS rejected message {rejected['Id']} of {segment}: "
+                f"{rejected.get('Code')}"
+            )
+        sent += size
+        log.mark_sent(segment, sent)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in pack_batches(spool.read(queue, segment, start)):
+            if failed:
+                break
+            for _ in batch:
+                governor.acquire()
+            if len(pending) >= max_workers * 2:
+                settle()
+            pending.append(
+                (
+                    executor.submit(
+                        send_batch,
+                        sqs,
+                        queue_url,
+                        batch,
+                        queue=destination,
+                        region_name=region_name,
+                    ),
+                    len(batch),
+                )
+            )
+        while pending:
+            settle()
+
+    if not failed:
+        log.mark_done(segment)
+    return summary
+
+
+def replay(
+    spool: Spool,
+    queue: None | str = None,
+    rate: float = 0,
+    max_workers: int = 4,
+    region_name: None | str = None,
+) -> SendSummary:
+    """
+    Send every message in the spool to SQS, at most `rate` messages a
+    second if given, and return the numbers sent and failed.
+
+    Messages go to the queue they were spooled for, or all to `queue` if
+    given. Progress is recorded per destination queue, so a spool can be
+    replayed to several queues, and a replay that stops part way, whether
+    it crashed or SQS failed, resumes from the last batch sent. A batch in
+    flight when a replay stopped may be sent twice.
+    """
+    governor = RateGovernor(rate=rate, daily_quota=0, quota_file=None)
+    summary = SendSummary()
+    for source in spool.queues():
+        destination = queue or source
+        spool.recover(source)
+        log = ReplayLog(
+            os.path.join(spool.queue_directory(source), f"{destination}.log")
+        )
+        for segment in spool.segments(source):
+            if log.is_done(segment):
+                continue
+            result = _replay_segment(
+                spool,
+                source,
+                segment,
+                destination,
+                log,
+                governor,
+                max_workers,
+                region_name,
+            )
+            summary.merge(result)
+            logging.info(
+                f"Replayed {result.successful} messages of {segment} "
+                f"to queue {destination}"
+            )
+    metrics.count("spool.replayed", summary.successful)
+    return summary
@@ -0,0 +1,137 @@
+import codecs
+import json
+
+_WHITESPACE = " \t\n\r"
+
+
+class ResultsStream:
+    """
+    Incrementally parse a Guardian search response from an iterator of
+    byte chunks, yielding each element of `response.results` as soon as it
+    has been decoded.
+
+    Only the article being decoded and the unread part of the latest chunk
+    are held in memory, however large the page. The other fields of the
+    response, such as `pages` and `total`, are collected in `fields` as
+    they are read; the Guardian API sends them before `results`.
+    """
+
+    def __init__(self, chunks, on_close=None):
+        self.fields = {}
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._on_close = on_close
+        self._results = self._parse()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._results)
+
+    def close(self):
+        self._results.close()
+
+    def _read_more(self, at_least: int = 1) -> bool:
+        """Append at least `at_least` more characters to the buffer."""
+        if self._eof:
+            return False
+        # Drop what has been consumed so the buffer does not grow.
+        consumed, self._pos = self._pos, 0
+        self._buffer = self._buffer[consumed:]
+        added = 0
+        while added < at_least:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._buffer += self._decoder.decode(b"", final=True)
+                self._eof = True
+                break
+            text = self._decoder.decode(chunk)
+            self._buffer += text
+            added += len(text)
+        return True
+
+    def _peek(self) -> str:
+        """Skip whitespace and return the next character without reading it."""
+        while True:
+            while (
+                self._pos < len(self._buffer)
+                and self._buffer[self._pos] in _WHITESPACE
+            ):
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read_more():
+                raise ValueError("Unexpected end of JSON response")
+
+    def _expect(self, char: str):
+        found = self._peek()
+        if found != char:
+            raise ValueError(
+                f"Expected '{char}' in JSON response, got '{found}'"
+            )
+        self._pos += 1
+
+    def _value(self):
+        """Decode the next complete JSON value."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                end = None
+            # A value running to the end of the buffer, such as a number,
+            # may continue in the next chunk.
+            if end is not None and (end < len(self._buffer) or self._eof):
+                self._pos = end
+                return value
+            # Read at least as much again as is buffered, so a large value
+            # is decoded in a number of attempts logarithmic in its size.
+            remaining = len(self._buffer) - self._pos
+            if not self._read_more(at_least=max(remaining, 1)):
+                raise ValueError("Unexpected end of JSON response")
+
+    def _members(self):
+        """Yield the keys of an object, leaving each value to be read."""
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            yield key
+            if self._peek() == ",":
+                self._pos += 1
+                continue
+            self._expect("}")
+            return
+
+    def _parse(self):
+        try:
+            for key in self._members():
+                if key != "response":
+                    self._value()
+                    continue
+                for field in self._members():
+                    if field != "results":
+                        self.fields[field] = self._value()
+                        continue
+                    self._expect("[")
+                    if self._peek() == "]":
+                        self._pos += 1
+                        continue
+                    while True:
+                        yield self._value()
+                        if self._peek() == ",":
+                            self._pos += 1
+                            continue
+                        self._expect("]")
+                        break
+        finally:
+            if self._on_close is not None:
+                self._on_close()
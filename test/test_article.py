@@ -0,0 +1,94 @@
+import pickle
+import pytest
+import sys
+from src.article import Article, FIELDS, REQUIRED_FIELDS
+from test.fixtures import results_fixture
+
+
+def test_article_equals_the_result_it_was_built_from():
+    article = Article(results_fixture[0])
+
+    assert article == results_fixture[0]
+    assert article.to_dict() == results_fixture[0]
+    assert list(article) == list(results_fixture[0])
+    assert len(article) == len(results_fixture[0])
+
+
+def test_article_reads_fields_like_a_dict():
+    article = Article(results_fixture[0])
+
+    assert article["webTitle"] == results_fixture[0]["webTitle"]
+    assert article.get("missing") is None
+    assert "webUrl" in article
+    assert "missing" not in article
+    with pytest.raises(KeyError):
+        article["missing"]
+
+
+def test_article_keeps_fields_outside_the_standard_set():
+    result = {**results_fixture[0], "fields": {"trailText": "A preview"}}
+
+    article = Article(result)
+
+    assert article["fields"] == {"trailText": "A preview"}
+    assert article == result
+
+
+def test_article_picks_out_extras_when_first_read():
+    result = {**results_fixture[0], "fields": {"trailText": "A preview"}}
+    article = Article(result)
+
+    assert article.to_dict() == result
+    assert article._extras is None
+
+    assert article.extras == {"fields": {"trailText": "A preview"}}
+    assert article._source is None
+    assert article.to_dict() == result
+    assert Article(results_fixture[0]).extras is None
+
+
+def test_article_to_dict_lists_fields_in_api_order():
+    full = Article(results_fixture[0]).to_dict()
+    result = dict(results_fixture[0])
+    del result["pillarId"]
+
+    assert list(full) == list(FIELDS)
+    assert Article(result).to_dict() == result
+
+
+def test_article_requires_fields():
+    for name in REQUIRED_FIELDS:
+        result = dict(results_fixture[0])
+        del result[name]
+
+        with pytest.raises(ValueError, match=name):
+            Article(result)
+
+
+def test_article_is_read_only():
+    article = Article(results_fixture[0])
+
+    with pytest.raises(AttributeError):
+        article.webTitle = "Changed"
+
+
+def test_article_shares_section_names():
+    first, second = (
+        Article({**result, "sectionName": "".join(["Te", "chnology"])})
+        for result in results_fixture[:2]
+    )
+
+    assert first["sectionName"] is second["sectionName"]
+
+
+def test_article_is_smaller_than_its_dict():
+    article = Article(results_fixture[0])
+
+    assert sys.getsizeof(article) < sys.getsizeof(results_fixture[0])
+    assert not hasattr(article, "__dict__")
+
+
+def test_article_pickles():
+    result = {**results_fixture[0], "fields": {"trailText": "A preview"}}
+
+    assert pickle.loads(pickle.dumps(Article(result))) == result
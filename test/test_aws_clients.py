@@ -0,0 +1,80 @@
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_aws
+import os
+import pytest
+from src import aws_clients
+
+
+@pytest.fixture(autouse=True)
+def clear_aws_clients():
+    """Start every test without cached AWS clients or queue URLs."""
+    aws_clients.clear()
+    yield
+    aws_clients.clear()
+
+
+@pytest.fixture(scope="function")
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "eu-west-2"
+
+
+@pytest.fixture(scope="function")
+def mock_sqs_client(aws_credentials):
+    """Return a mocked SQS client."""
+    with mock_aws():
+        yield boto3.client("sqs", region_name="eu-west-2")
+
+
+def test_get_client_reuses_client_per_service_and_region(aws_credentials):
+    sqs = aws_clients.get_client("sqs", "eu-west-2")
+
+    assert aws_clients.get_client("sqs", "eu-west-2") is sqs
+    assert aws_clients.get_client("sqs", "eu-west-1") is not sqs
+    assert aws_clients.get_client("secretsmanager", "eu-west-2") is not sqs
+
+
+def test_get_queue_url_memoises_url(mock_sqs_client):
+    queue_url = mock_sqs_client.create_queue(QueueName="SENTINEL")["QueueUrl"]
+
+    assert aws_clients.get_queue_url("SENTINEL") == queue_url
+    mock_sqs_client.delete_queue(QueueUrl=queue_url)
+    assert aws_clients.get_queue_url("SENTINEL") == queue_url
+
+
+def test_invalidate_queue_url_forces_new_lookup(mock_sqs_client):
+    mock_sqs_client.create_queue(QueueName="SENTINEL")
+    aws_clients.get_queue_url("SENTINEL")
+
+    aws_clients.invalidate_queue_url("SENTINEL")
+    mock_sqs_client.delete_queue(
+        QueueUrl=mock_sqs_client.get_queue_url(QueueName="SENTINEL")[
+            "QueueUrl"
+        ]
+    )
+
+    with pytest.raises(ClientError):
+        aws_clients.get_queue_url("SENTINEL")
+
+
+def test_invalidate_queue_url_keeps_url_that_is_no_longer_stale(
+    mock_sqs_client,
+):
+    queue_url = mock_sqs_client.create_queue(QueueName="SENTINEL")["QueueUrl"]
+    aws_clients.get_queue_url("SENTINEL")
+
+    aws_clients.invalidate_queue_url("SENTINEL", stale="another-url")
+
+    assert aws_clients._queue_urls[(None, "SENTINEL")] == queue_url
+
+
+def test_refresh_queue_url_returns_none_for_missing_queue(
+    mock_sqs_client, caplog
+):
+    assert aws_clients.refresh_queue_url("MISSING", "stale-url") is None
+    assert "Queue MISSING does not exist" in caplog.text
@@ -0,0 +1,104 @@
+import logging
+import os
+from src.backfill import partition, run_processes, unit_key
+from src.queries import Query, QueryStats
+from src.shards import Shard
+
+
+def worker(unit, multiplier=1):
+    """Stand-in for a backfill worker, run in a child process."""
+    if unit.section == "broken":
+        raise RuntimeError("Test error")
+    fetched = int(unit.date_from[-2:]) * multiplier
+    return QueryStats(
+        unit,
+        fetched=fetched,
+        queued=fetched,
+        sent=fetched,
+        failed_pages=int(unit.section == "gaps"),
+    )
+
+
+def worker_pid(unit):
+    return QueryStats(unit, fetched=os.getpid())
+
+
+def test_partition_by_shard_and_section():
+    query = Query("test", "2024-01-01", "q", "2024-01-14")
+    shards = [
+        Shard("2024-01-01", "2024-01-07"),
+        Shard("2024-01-08", "2024-01-14"),
+    ]
+
+    units = partition(query, shards, ["politics", "sport"])
+
+    assert units == [
+        Query("test", "2024-01-01", "q", "2024-01-07", "politics"),
+        Query("test", "2024-01-08", "q", "2024-01-14", "politics"),
+        Query("test", "2024-01-01", "q", "2024-01-07", "sport"),
+        Query("test", "2024-01-08", "q", "2024-01-14", "sport"),
+    ]
+
+
+def test_partition_without_shards_or_sections_is_the_query():
+    query = Query("test", "2024-01-01")
+
+    assert partition(query) == [query]
+
+
+def test_unit_key_distinguishes_sections():
+    assert unit_key(Query("test", section="a")) != unit_key(
+        Query("test", section="b")
+    )
+
+
+def test_run_processes_aggregates_stats_from_every_unit():
+    units = [Query("test", f"2024-01-0{day}") for day in (1, 2, 3)]
+    done = []
+
+    progress = run_processes(
+        units, worker, 2, on_done=done.append, multiplier=10
+    )
+
+    assert progress.done == 3
+    assert progress.fetched == progress.sent == 60
+    assert sorted(s.query.date_from for s in done) == [
+        u.date_from for u in units
+    ]
+
+
+def test_run_processes_runs_units_in_other_processes():
+    units = [Query("test", f"2024-01-0{day}") for day in (1, 2)]
+    pids = []
+
+    run_processes(
+        units, worker_pid, 2, on_done=lambda s: pids.append(s.fetched)
+    )
+
+    assert os.getpid() not in pids
+
+
+def test_run_processes_records_failed_units_and_keeps_going(caplog):
+    units = [
+        Query("test", "2024-01-01", section="broken"),
+        Query("test", "2024-01-02"),
+    ]
+
+    with caplog.at_level(logging.ERROR):
+        progress = run_processes(units, worker, 2)
+
+    assert progress.done == 2
+    assert progress.failed_units == [units[0]]
+    assert progress.fetched == 2
+    assert "Test error" in caplog.text
+
+
+def test_run_processes_counts_units_with_failed_pages_as_failed():
+    units = [
+        Query("test", "2024-01-01", section="gaps"),
+        Query("test", "2024-01-02"),
+    ]
+
+    progress = run_processes(units, worker, 2)
+
+    assert progress.failed_units == [units[0]]
@@ -0,0 +1,89 @@
+from benchmarks.fake_guardian import FakeGuardian, FakeGuardianConfig
+from benchmarks.run import compare, format_results, run_benchmark
+import os
+import pytest
+import requests
+
+
+@pytest.fixture(scope="function")
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "eu-west-2"
+
+
+def test_fake_guardian_serves_pages_of_unique_articles():
+    config = FakeGuardianConfig(pages=2, page_size=3)
+
+    with FakeGuardian(config) as server:
+        pages = [
+            requests.get(server.url, params={"page": page}).json()
+            for page in (1, 2)
+        ]
+        beyond = requests.get(server.url, params={"page": 3})
+
+    ids = [
+        result["id"]
+        for page in pages
+        for result in page["response"]["results"]
+    ]
+    assert len(set(ids)) == 6
+    assert pages[1]["response"]["currentPage"] == 2
+    assert pages[1]["response"]["pages"] == 2
+    assert beyond.status_code == 400
+    assert server.requests == 3
+
+
+def test_fake_guardian_injects_failures_repeatably():
+    config = FakeGuardianConfig(pages=1, rate_429=0.3, rate_5xx=0.3, seed=7)
+    runs = []
+    for _ in range(2):
+        with FakeGuardian(config) as server:
+            runs.append(
+                [requests.get(server.url).status_code for _ in range(20)]
+            )
+
+    assert runs[0] == runs[1]
+    assert {200, 429, 503} == set(runs[0])
+
+
+def test_run_benchmark_reports_every_stage(aws_credentials):
+    results = run_benchmark(
+        FakeGuardianConfig(pages=3, page_size=10, rate_429=0.2, seed=1),
+        repeat=1,
+    )
+
+    assert set(results["stages"]) == {"fetch", "serialise", "send", "pipeline"}
+    for stage in results["stages"].values():
+        assert stage["articles"] == 30
+        assert stage["articles_per_second"] > 0
+        assert stage["p50_ms"] <= stage["p95_ms"] <= stage["p99_ms"]
+        assert stage["peak_memory_bytes"] > 0
+    assert results["server"]["refused"] > 0
+    assert "pipeline" in format_results(results)
+
+
+def test_compare_reports_slower_and_larger_stages():
+    baseline = {
+        "stages": {
+            "fetch": {"articles_per_second": 100, "peak_memory_bytes": 1000},
+            "send": {"articles_per_second": 100, "peak_memory_bytes": 1000},
+        }
+    }
+    results = {
+        "stages": {
+            "fetch": {"articles_per_second": 70, "peak_memory_bytes": 1000},
+            "send": {"articles_per_second": 90, "peak_memory_bytes": 1500},
+            "pipeline": {"articles_per_second": 1, "peak_memory_bytes": 1},
+        }
+    }
+
+    regressions = compare(results, baseline, tolerance=0.2)
+
+    assert regressions == [
+        "fetch: 70.0 articles/s, down from 100.0",
+        "send: peak memory 1500 bytes, up from 1000",
+    ]
@@ -0,0 +1,95 @@
+import pytest
+from src.checkpoint import (
+    FileWatermarkStore,
+    SqliteWatermarkStore,
+    Watermark,
+    iter_new,
+    open_store,
+    query_key,
+    track,
+)
+
+
+def article(id, published):
+    return {"id": id, "webPublicationDate": published}
+
+
+def test_watermark_advances_to_newest_date_and_collects_ids_at_it():
+    watermark = Watermark()
+
+    for a in [
+        article("a", "2024-01-01"),
+        article("b", "2024-01-02"),
+        article("c", "2024-01-02"),
+        article("d", "2024-01-01"),
+    ]:
+        watermark.advance(a)
+
+    assert watermark == Watermark("2024-01-02", {"b", "c"})
+
+
+def test_watermark_is_seen_for_older_and_already_sent_articles():
+    watermark = Watermark("2024-01-02", {"b"})
+
+    assert watermark.is_seen(article("a", "2024-01-01"))
+    assert watermark.is_seen(article("b", "2024-01-02"))
+    assert not watermark.is_seen(article("c", "2024-01-02"))
+    assert not watermark.is_seen(article("d", "2024-01-03"))
+
+
+def test_iter_new_stops_at_first_article_older_than_watermark():
+    watermark = Watermark("2024-01-02", {"b"})
+    consumed = []
+
+    def results():
+        for a in [
+            article("d", "2024-01-03"),
+            article("c", "2024-01-02"),
+            article("b", "2024-01-02"),
+            article("a", "2024-01-01"),
+            article("z", "2023-12-31"),
+        ]:
+            consumed.append(a["id"])
+            yield a
+
+    new = list(iter_new(results(), watermark))
+
+    assert [a["id"] for a in new] == ["d", "c"]
+    assert consumed == ["d", "c", "b", "a"]
+
+
+def test_iter_new_yields_everything_for_empty_watermark():
+    results = [article("b", "2024-01-02"), article("a", "2024-01-01")]
+
+    assert list(iter_new(iter(results), Watermark())) == results
+
+
+def test_track_advances_watermark_past_yielded_articles():
+    watermark = Watermark("2024-01-01", {"a"})
+
+    list(track([article("b", "2024-01-02")], watermark))
+
+    assert watermark == Watermark("2024-01-02", {"b"})
+
+
+@pytest.mark.parametrize("filename", ["checkpoint.json", "checkpoint.db"])
+def test_store_round_trips_watermarks_per_query(tmp_path, filename):
+    path = str(tmp_path / filename)
+    store = open_store(path)
+    key = query_key("test", "2024-01-01")
+    other_key = query_key("test", None)
+
+    store.save(key, Watermark("2024-01-02", {"b", "c"}))
+    store.save(other_key, Watermark("2024-01-05", {"e"}))
+
+    reopened = open_store(path)
+    assert reopened.load(key) == Watermark("2024-01-02", {"b", "c"})
+    assert reopened.load(other_key) == Watermark("2024-01-05", {"e"})
+    assert reopened.load(query_key("other", None)) == Watermark()
+
+
+def test_open_store_chooses_backend_by_suffix(tmp_path):
+    assert isinstance(open_store(str(tmp_path / "a.json")), FileWatermarkStore)
+    assert isinstance(
+        open_store(str(tmp_path / "a.sqlite")), SqliteWatermarkStore
+    )
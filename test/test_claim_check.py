@@ -0,0 +1,122 @@
+import boto3
+import json
+from moto import mock_aws
+import os
+import pytest
+from src import aws_clients
+from src.claim_check import ClaimCheck, retrieve
+from src.message_format import MessageFormat, decode
+from src.send_to_sqs import MAX_BATCH_BYTES, send_to_sqs
+
+
+@pytest.fixture(autouse=True)
+def clear_aws_clients():
+    """Start every test without cached AWS clients or queue URLs."""
+    aws_clients.clear()
+    yield
+    aws_clients.clear()
+
+
+@pytest.fixture(scope="function")
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "eu-west-2"
+
+
+@pytest.fixture(scope="function")
+def mock_aws_clients(aws_credentials):
+    """Return a mocked S3 client with a bucket, and a mocked SQS client."""
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="eu-west-2")
+        s3.create_bucket(
+            Bucket="claims",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        yield s3, boto3.client("sqs", region_name="eu-west-2")
+
+
+def article(id, size):
+    return {"id": id, "webTitle": "x" * size}
+
+
+def test_claim_check_leaves_small_entries_unchanged(mock_aws_clients):
+    s3, _ = mock_aws_clients
+    entry = {"Id": "0", "MessageBody": json.dumps(article("a", 10))}
+
+    assert ClaimCheck("claims", threshold=1024).offload(entry, {}) == entry
+    assert "Contents" not in s3.list_objects_v2(Bucket="claims")
+
+
+def test_claim_check_stores_large_body_under_guardian_id(mock_aws_clients):
+    s3, _ = mock_aws_clients
+    message = article("politics/2024/dec/10/story", 2048)
+    entry = {"Id": "0", "MessageBody": json.dumps(message)}
+
+    pointer = ClaimCheck("claims", threshold=1024).offload(entry, message)
+
+    stored = s3.get_object(
+        Bucket="claims", Key="articles/politics/2024/dec/10/story"
+    )
+    assert json.loads(stored["Body"].read()) == message
+    assert len(pointer["MessageBody"]) < 1024
+    assert retrieve(pointer["MessageBody"], pointer["MessageAttributes"]) == (
+        entry["MessageBody"]
+    )
+
+
+def test_claim_check_is_idempotent_across_resends(mock_aws_clients):
+    s3, _ = mock_aws_clients
+    message = article("a", 2048)
+    entry = {"Id": "0", "MessageBody": json.dumps(message)}
+    claim_check = ClaimCheck("claims", threshold=1024)
+
+    first = claim_check.offload(entry, message)
+    second = claim_check.offload(entry, message)
+
+    assert first == second
+    assert s3.list_objects_v2(Bucket="claims")["KeyCount"] == 1
+
+
+def test_claim_check_returns_entry_when_bucket_is_missing(
+    mock_aws_clients, caplog
+):
+    message = article("a", 2048)
+    entry = {"Id": "0", "MessageBody": json.dumps(message)}
+
+    assert ClaimCheck("missing", threshold=1024).offload(entry, message) == (
+        entry
+    )
+    assert "Failed to offload message to s3://missing/articles/a" in (
+        caplog.text
+    )
+
+
+def test_send_to_sqs_offloads_messages_too_large_for_sqs(mock_aws_clients):
+    _, sqs = mock_aws_clients
+    queue_url = sqs.create_queue(QueueName="SENTINEL")["QueueUrl"]
+    messages = [article(str(i), MAX_BATCH_BYTES) for i in range(3)]
+    message_format = MessageFormat(claim_check=ClaimCheck("claims"))
+
+    summary = send_to_sqs(messages, "SENTINEL", message_format=message_format)
+
+    received = sqs.receive_message(
+        QueueUrl=queue_url,
+        MaxNumberOfMessages=10,
+        MessageAttributeNames=["All"],
+    )["Messages"]
+    assert summary.successful == 3
+    assert all(
+        "ExtendedPayloadSize" in message["MessageAttributes"]
+        for message in received
+    )
+    assert sorted(
+        decode(
+            retrieve(message["Body"], message["MessageAttributes"]),
+            message["MessageAttributes"],
+        )["id"]
+        for message in received
+    ) == ["0", "1", "2"]
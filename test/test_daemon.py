@@ -0,0 +1,98 @@
+import logging
+import os
+import signal
+import threading
+from src.daemon import AdaptiveInterval, poll, stop_on_signals
+from src.queries import Query, QueryStats
+
+
+def test_adaptive_interval_tightens_when_busy_and_backs_off_when_quiet():
+    interval = AdaptiveInterval(min_interval=10, max_interval=80)
+
+    assert interval.interval == 10
+    assert [interval.update(0) for _ in range(4)] == [20, 40, 80, 80]
+    assert [interval.update(5) for _ in range(4)] == [40, 20, 10, 10]
+
+
+def test_poll_runs_due_queries_until_stopped():
+    stop = threading.Event()
+    queries = [Query("busy"), Query("quiet")]
+    calls = []
+
+    def run(query):
+        calls.append(query.search_term)
+        if len(calls) >= 6:
+            stop.set()
+        queued = 1 if query.search_term == "busy" else 0
+        return QueryStats(query, queued=queued)
+
+    polls = poll(queries, run, stop, min_interval=0, max_interval=0)
+
+    assert polls == len(calls) >= 6
+    assert set(calls) == {"busy", "quiet"}
+
+
+def test_poll_backs_off_quiet_queries():
+    stop = threading.Event()
+    queries = [Query("busy"), Query("quiet")]
+    calls = []
+
+    def run(query):
+        calls.append(query.search_term)
+        if calls.count("busy") == 50:
+            stop.set()
+        queued = 1 if query.search_term == "busy" else 0
+        return QueryStats(query, queued=queued)
+
+    poll(queries, run, stop, min_interval=0.001, max_interval=10)
+
+    # Backing off exponentially, the quiet query is polled only a handful
+    # of times however long the busy one keeps the loop running.
+    assert calls.count("quiet") < 15
+
+
+def test_poll_keeps_polling_other_queries_when_one_raises(caplog):
+    stop = threading.Event()
+    queries = [Query("broken"), Query("working")]
+    calls = []
+
+    def run(query):
+        calls.append(query.search_term)
+        if calls.count("working") == 3:
+            stop.set()
+        if query.search_term == "broken":
+            raise ConnectionError("Test error")
+        return QueryStats(query, queued=1)
+
+    with caplog.at_level(logging.ERROR):
+        polls = poll(queries, run, stop, min_interval=0.001, max_interval=10)
+
+    assert polls == len(calls)
+    assert calls.count("working") == 3
+    assert "broken" in calls
+    assert "Poll of query 'broken' failed" in caplog.text
+
+
+def test_poll_calls_after_cycle_with_stats():
+    stop = threading.Event()
+    cycles = []
+
+    def run(query):
+        stop.set()
+        return QueryStats(query)
+
+    poll([Query("test")], run, stop, after_cycle=cycles.append)
+
+    assert len(cycles) == 1
+    assert cycles[0][0].query == Query("test")
+
+
+def test_stop_on_signals_sets_stop_on_sigterm():
+    stop = threading.Event()
+    previous = signal.getsignal(signal.SIGTERM)
+
+    with stop_on_signals(stop):
+        os.kill(os.getpid(), signal.SIGTERM)
+        assert stop.wait(1)
+
+    assert signal.getsignal(signal.SIGTERM) is previous
@@ -0,0 +1,107 @@
+import pytest
+from src.dedup import BloomFilter, Deduplicator, LRUSet
+
+
+def test_lru_set_evicts_least_recently_added():
+    lru = LRUSet(capacity=3)
+
+    for item in "abcab":
+        lru.add(item)
+    lru.add("d")
+
+    assert list(lru) == ["a", "b", "d"]
+    assert "c" not in lru
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    ids = [f"article/{i}" for i in range(1000)]
+
+    for article_id in ids:
+        bloom.add(article_id)
+
+    assert all(article_id in bloom for article_id in ids)
+
+
+def test_bloom_filter_false_positive_rate_is_near_configured_rate():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"article/{i}")
+
+    false_positives = sum(f"other/{i}" in bloom for i in range(10_000))
+
+    assert false_positives / 10_000 < 0.03
+
+
+def test_bloom_filter_size_does_not_depend_on_items_added():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    size = len(bloom._bits)
+
+    for i in range(5000):
+        bloom.add(f"article/{i}")
+
+    assert len(bloom._bits) == size
+
+
+def test_bloom_filter_round_trips_through_file(tmp_path):
+    path = str(tmp_path / "ids.bloom")
+    bloom = BloomFilter(capacity=100, error_rate=0.01)
+    bloom.add("a")
+
+    bloom.save(path)
+    loaded = BloomFilter.load(path)
+
+    assert "a" in loaded
+    assert (loaded.num_bits, loaded.num_hashes) == (
+        bloom.num_bits,
+        bloom.num_hashes,
+    )
+
+
+def test_bloom_filter_rejects_invalid_error_rate():
+    with pytest.raises(ValueError):
+        BloomFilter(error_rate=1)
+
+
+def test_deduplicator_filter_drops_repeated_ids():
+    dedup = Deduplicator(bloom_capacity=0)
+
+    result = list(dedup.filter([{"id": "a"}, {"id": "b"}, {"id": "a"}]))
+
+    assert result == [{"id": "a"}, {"id": "b"}]
+    assert dedup.duplicates == 1
+
+
+def test_deduplicator_uses_bloom_filter_for_ids_evicted_from_lru():
+    dedup = Deduplicator(lru_size=1, bloom_capacity=100)
+
+    list(dedup.filter([{"id": "a"}, {"id": "b"}]))
+
+    assert "a" not in dedup.recent
+    assert dedup.is_duplicate("a")
+
+
+def test_deduplicator_persists_seen_ids_across_instances(tmp_path):
+    dedup = Deduplicator(str(tmp_path), lru_size=1, bloom_capacity=100)
+    list(dedup.filter([{"id": "a"}, {"id": "b"}]))
+    dedup.save()
+
+    reloaded = Deduplicator(str(tmp_path), lru_size=1, bloom_capacity=100)
+
+    assert list(reloaded.recent) == ["b"]
+    assert reloaded.is_duplicate("a")
+    assert list(reloaded.filter([{"id": "a"}, {"id": "c"}])) == [{"id": "c"}]
+
+
+def test_deduplicator_records_pending_ids_only_once_committed():
+    dedup = Deduplicator(bloom_capacity=0)
+    failed, sent = set(), set()
+
+    assert len(list(dedup.filter([{"id": "a"}], "q", failed))) == 1
+    assert list(dedup.filter([{"id": "a"}], "q")) == []
+    dedup.release(failed)
+    assert len(list(dedup.filter([{"id": "a"}], "q", sent))) == 1
+    dedup.commit(sent)
+
+    assert list(dedup.filter([{"id": "a"}], "q")) == []
+    assert not dedup._pending
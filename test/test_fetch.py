@@ -1,14 +1,48 @@
-from src.fetch import fetch
+from src.article import Article
+from src.fetch import count_results, fetch, iter_pages, iter_results
+from src import aws_clients
+from src.http_session import close_session, get_session
+from src import response_cache
+from src.rate_limit import guardian_rate
+from src.secret_cache import guardian_api_key
 import boto3
+from functools import partial
+import io
+import json
 import logging
 from moto import mock_aws
 import os
 from unittest.mock import MagicMock, patch
 from urllib.parse import urlparse, parse_qs, unquote
 import pytest
+import time
 from test.fixtures import response_fixture
 
 
+@pytest.fixture(autouse=True)
+def clear_api_key_cache():
+    """Start every test without a cached Guardian API key."""
+    guardian_api_key.clear()
+    yield
+    guardian_api_key.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_aws_clients():
+    """Start every test without cached AWS clients or queue URLs."""
+    aws_clients.clear()
+    yield
+    aws_clients.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_governor():
+    """Start every test with an unlimited rate governor."""
+    guardian_rate.configure()
+    yield
+    guardian_rate.configure()
+
+
 @pytest.fixture(scope="function")
 def aws_credentials():
     """Mocked AWS Credentials for moto."""
@@ -41,7 +75,7 @@ def response():
     return response_fixture
 
 
-@patch("src.fetch.requests.get")
+@patch("src.http_session.requests.Session.get")
 def test_fetch_returns_list(mock_get, mock_sm_client, response):
     mock_get.return_value.status_code = 200
     mock_get.return_value.json.return_value = response
@@ -50,16 +84,16 @@ def test_fetch_returns_list(mock_get, mock_sm_client, response):
     assert isinstance(result, list)
 
 
-@patch("src.fetch.requests.get")
-def test_fetch_returns_list_of_dicts(mock_get, mock_sm_client, response):
+@patch("src.http_session.requests.Session.get")
+def test_fetch_returns_list_of_articles(mock_get, mock_sm_client, response):
     mock_get.return_value.status_code = 200
     mock_get.return_value.json.return_value = response
     result = fetch()
 
-    assert all(isinstance(item, dict) for item in result)
+    assert all(isinstance(item, Article) for item in result)
 
 
-@patch("src.fetch.requests.get")
+@patch("src.http_session.requests.Session.get")
 def test_fetch_returns_list_of_length_10(mock_get, mock_sm_client, response):
     mock_get.return_value.status_code = 200
     mock_get.return_value.json.return_value = response
@@ -68,7 +102,7 @@ def test_fetch_returns_list_of_length_10(mock_get, mock_sm_client, response):
     assert len(result) == 10
 
 
-@patch("src.fetch.requests.get")
+@patch("src.http_session.requests.Session.get")
 def test_fetch_correctly_constructs_querystring(mock_get, mock_sm_client):
     url = None
 
@@ -94,7 +128,7 @@ def test_fetch_correctly_constructs_querystring(mock_get, mock_sm_client):
     assert parsed_qs["from-date"][0] == "2023-01-01"
 
 
-@patch("src.fetch.requests.get")
+@patch("src.http_session.requests.Session.get")
 def test_fetch_logs_call_with_no_search_term_and_no_date_from(
     mock_get, mock_sm_client, response, caplog
 ):
@@ -108,7 +142,7 @@ def test_fetch_logs_call_with_no_search_term_and_no_date_from(
     assert "dated" not in caplog.text
 
 
-@patch("src.fetch.requests.get")
+@patch("src.http_session.requests.Session.get")
 def test_fetch_logs_call_with_search_term_and_no_date_from(
     mock_get, mock_sm_client, response, caplog
 ):
@@ -123,7 +157,7 @@ def test_fetch_logs_call_with_search_term_and_no_date_from(
     assert "dated" not in caplog.text
 
 
-@patch("src.fetch.requests.get")
+@patch("src.http_session.requests.Session.get")
 def test_fetch_logs_call_with_no_search_term_and_date_from(
     mock_get, mock_sm_client, response, caplog
 ):
@@ -138,7 +172,7 @@ def test_fetch_logs_call_with_no_search_term_and_date_from(
     assert f" dated '{date_from}" in caplog.text
 
 
-@patch("src.fetch.requests.get")
+@patch("src.http_session.requests.Session.get")
 def test_fetch_logs_call_with_search_term_and_date_from(
     mock_get, mock_sm_client, response, caplog
 ):
@@ -154,7 +188,7 @@ def test_fetch_logs_call_with_search_term_and_date_from(
     assert f" dated '{date_from}" in caplog.text
 
 
-@patch("src.fetch.requests.get")
+@patch("src.http_session.requests.Session.get")
 def test_fetch_logs_failed_api_requests_with_status_code_401(
     mock_get, mock_sm_client, caplog
 ):
@@ -166,7 +200,7 @@ def test_fetch_logs_failed_api_requests_with_status_code_401(
     assert "Failed to fetch results" in caplog.text
 
 
-@patch("src.fetch.requests.get")
+@patch("src.http_session.requests.Session.get")
 def test_fetch_logs_failed_api_requests_with_non_401_status_code(
     mock_get, mock_sm_client, caplog
 ):
@@ -185,7 +219,7 @@ def test_fetch_logs_failed_api_requests_with_non_401_status_code(
     assert f"Server returned error message: {error_message}" in caplog.text
 
 
-@patch("src.fetch.requests.get")
+@patch("src.http_session.requests.Session.get")
 def test_fetch_applies_url_encoding_to_query_parameters(
     mock_get, mock_sm_client
 ):
@@ -214,7 +248,7 @@ def test_fetch_applies_url_encoding_to_query_parameters(
     assert unquote(parsed_qs["from-date"][0]) == date_from
 
 
-@patch("src.fetch.requests.get")
+@patch("src.http_session.requests.Session.get")
 def test_fetch_logs_failure_to_retrieve_api_key_from_aws_sm(
     mock_get, mock_sm_client_no_api_key, caplog
 ):
@@ -224,3 +258,551 @@ def test_fetch_logs_failure_to_retrieve_api_key_from_aws_sm(
         fetch(search_term)
 
     assert "Failed to retrieve Guardian API key" in caplog.text
+
+
+def article(id):
+    """Return a search result with the required fields and an `id`."""
+    return {
+        "id": id,
+        "webPublicationDate": "2023-01-01T00:00:00Z",
+        "webTitle": f"Article {id}",
+        "webUrl": f"https://www.theguardian.com/{id}",
+    }
+
+
+def paged_response(page, pages, results):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {
+        "response": {"currentPage": page, "pages": pages, "results": results}
+    }
+    return response
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_walks_every_page(mock_get, mock_sm_client):
+    requested_pages = []
+
+    def side_effect(arg_url, *args, **kwargs):
+        page = int(parse_qs(urlparse(arg_url).query)["page"][0])
+        requested_pages.append(page)
+        return paged_response(
+            page, 3, [article(f"{page}-{i}") for i in (0, 1)]
+        )
+
+    mock_get.side_effect = side_effect
+
+    result = list(iter_results("test"))
+
+    assert requested_pages == [1, 2, 3]
+    assert [item["id"] for item in result] == [
+        "1-0",
+        "1-1",
+        "2-0",
+        "2-1",
+        "3-0",
+        "3-1",
+    ]
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_skips_results_missing_required_fields(
+    mock_get, mock_sm_client, caplog
+):
+    mock_get.return_value = paged_response(
+        1, 1, [article("a"), {"id": "untitled"}, article("c")]
+    )
+
+    with caplog.at_level(logging.ERROR):
+        result = list(iter_results("test"))
+
+    assert result == [article("a"), article("c")]
+    assert "'untitled' lacks webPublicationDate" in caplog.text
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_is_lazy(mock_get, mock_sm_client):
+    mock_get.side_effect = lambda url, *a, **kw: paged_response(
+        1, 5, [article("a"), article("b")]
+    )
+
+    results = iter_results("test")
+    next(results)
+
+    assert mock_get.call_count == 1
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_requests_page_size(mock_get, mock_sm_client):
+    mock_get.return_value = paged_response(1, 1, [])
+
+    list(iter_results("test", page_size=50))
+
+    parsed_qs = parse_qs(urlparse(mock_get.call_args.args[0]).query)
+    assert parsed_qs["page-size"][0] == "50"
+
+
+def test_iter_results_rejects_page_size_above_api_maximum():
+    with pytest.raises(ValueError):
+        list(iter_results("test", page_size=201))
+
+
+def error_response(status_code, message="Test error"):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = {"response": {"message": message}}
+    return response
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_logs_failed_page_and_keeps_later_pages(
+    mock_get, mock_sm_client, caplog
+):
+    mock_get.side_effect = [
+        paged_response(1, 3, [article("a")]),
+        error_response(500),
+        paged_response(3, 3, [article("c")]),
+    ]
+
+    with caplog.at_level(logging.ERROR):
+        result = list(iter_results("test"))
+
+    assert result == [article("a"), article("c")]
+    assert "status code 500" in caplog.text
+    assert "Failed to fetch 1 of 3 pages: [2]" in caplog.text
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_reports_failed_pages_to_caller(mock_get, mock_sm_client):
+    mock_get.side_effect = [
+        paged_response(1, 3, [article("a")]),
+        error_response(503),
+        paged_response(3, 3, [article("c")]),
+    ]
+    failed_pages = []
+
+    result = list(iter_results("test", failed_pages=failed_pages))
+
+    assert result == [article("a"), article("c")]
+    assert failed_pages == [2]
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_stops_on_401(mock_get, mock_sm_client, caplog):
+    mock_get.side_effect = [
+        paged_response(1, 3, [article("a")]),
+        error_response(401),
+        paged_response(3, 3, [article("c")]),
+    ]
+
+    with caplog.at_level(logging.ERROR):
+        result = list(iter_results("test"))
+
+    assert result == [article("a")]
+    assert mock_get.call_count == 2
+
+
+def page_number(url):
+    return int(parse_qs(urlparse(url).query)["page"][0])
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_fetches_pages_concurrently_in_order(
+    mock_get, mock_sm_client
+):
+    def side_effect(arg_url, *args, **kwargs):
+        page = page_number(arg_url)
+        # Later pages respond first, so ordering must be restored.
+        time.sleep((10 - page) * 0.005)
+        return paged_response(page, 8, [article(page)])
+
+    mock_get.side_effect = side_effect
+
+    result = list(iter_results("test", max_workers=4))
+
+    assert [item["id"] for item in result] == list(range(1, 9))
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_unordered_returns_every_page(mock_get, mock_sm_client):
+    mock_get.side_effect = lambda url, *a, **kw: paged_response(
+        page_number(url), 8, [article(page_number(url))]
+    )
+
+    result = list(iter_results("test", max_workers=4, ordered=False))
+
+    assert sorted(item["id"] for item in result) == list(range(1, 9))
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_pages_reports_concurrent_failures_without_losing_pages(
+    mock_get, mock_sm_client
+):
+    def side_effect(arg_url, *args, **kwargs):
+        page = page_number(arg_url)
+        if page in (3, 5):
+            return error_response(503)
+        return paged_response(page, 6, [article(page)])
+
+    mock_get.side_effect = side_effect
+
+    pages = list(iter_pages({"api-key": "test"}, max_workers=3))
+
+    assert [page.number for page in pages] == [1, 2, 3, 4, 5, 6]
+    assert [page.number for page in pages if page.error] == [3, 5]
+    assert all(page.error.status_code == 503 for page in pages if page.error)
+    assert [page.results for page in pages if not page.error] == [
+        [article(1)],
+        [article(2)],
+        [article(4)],
+        [article(6)],
+    ]
+
+
+def test_iter_pages_rejects_fewer_than_one_worker():
+    with pytest.raises(ValueError):
+        list(iter_pages({}, max_workers=0))
+
+
+@patch("src.http_session.requests.Session.get")
+def test_fetch_retrieves_api_key_once_across_calls(
+    mock_get, mock_sm_client, response, caplog
+):
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = response
+
+    with caplog.at_level(logging.INFO):
+        fetch()
+        fetch()
+
+    assert caplog.text.count("Retrieving API key") == 1
+
+
+@patch("src.http_session.requests.Session.get")
+def test_fetch_refreshes_api_key_and_retries_once_on_401(
+    mock_get, mock_sm_client, response
+):
+    used_keys = []
+
+    def side_effect(arg_url, *args, **kwargs):
+        key = parse_qs(urlparse(arg_url).query)["api-key"][0]
+        used_keys.append(key)
+        if key == "rotated":
+            return paged_response(1, 1, [article("a")])
+        return error_response(401)
+
+    mock_get.side_effect = side_effect
+
+    guardian_api_key.get()
+    mock_sm_client.put_secret_value(
+        SecretId="GUARDIAN_API_KEY", SecretString="rotated"
+    )
+    result = fetch()
+
+    assert result == [article("a")]
+    assert used_keys == ["test", "rotated"]
+
+
+@patch("src.http_session.requests.Session.get")
+def test_fetch_picks_up_a_rotated_key_after_a_refresh_found_none(
+    mock_get, mock_sm_client, response
+):
+    used_keys = []
+
+    def side_effect(arg_url, *args, **kwargs):
+        key = parse_qs(urlparse(arg_url).query)["api-key"][0]
+        used_keys.append(key)
+        if key == "rotated":
+            return paged_response(1, 1, [article("a")])
+        return error_response(401)
+
+    mock_get.side_effect = side_effect
+
+    fetch()
+    mock_sm_client.put_secret_value(
+        SecretId="GUARDIAN_API_KEY", SecretString="rotated"
+    )
+    result = fetch()
+
+    assert result == [article("a")]
+    assert used_keys == ["test", "rotated"]
+
+
+@patch("src.http_session.requests.Session.get")
+def test_fetch_reuses_pooled_session_with_separate_timeouts(
+    mock_get, mock_sm_client, response
+):
+    close_session()
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = response
+    session = get_session()
+
+    fetch()
+    fetch()
+
+    assert get_session() is session
+    assert mock_get.call_args.kwargs["timeout"] == (5, 5)
+    assert "gzip" in session.headers["Accept-Encoding"]
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_requests_to_date(mock_get, mock_sm_client, caplog):
+    mock_get.return_value = paged_response(1, 1, [])
+
+    with caplog.at_level(logging.INFO):
+        list(iter_results("test", "2024-01-01", date_to="2024-01-31"))
+
+    parsed_qs = parse_qs(urlparse(mock_get.call_args.args[0]).query)
+    assert parsed_qs["to-date"][0] == "2024-01-31"
+    assert "dated '2024-01-31' or earlier" in caplog.text
+
+
+@patch("src.http_session.requests.Session.get")
+def test_count_results_requests_one_result_and_returns_total(
+    mock_get, mock_sm_client, response
+):
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = response
+
+    total = count_results("test", "2024-01-01", "2024-01-31")
+
+    parsed_qs = parse_qs(urlparse(mock_get.call_args.args[0]).query)
+    assert parsed_qs["page-size"][0] == "1"
+    assert total == 2556540
+
+
+def streamed_response(page, pages, results, chunk_size=32):
+    body = json.dumps(
+        {"response": {"currentPage": page, "pages": pages, "results": results}}
+    ).encode("utf-8")
+    response = MagicMock()
+    response.status_code = 200
+    response.iter_content.return_value = list(
+        iter(partial(io.BytesIO(body).read, chunk_size), b"")
+    )
+    return response
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_streams_every_page(mock_get, mock_sm_client):
+    responses = {}
+
+    def side_effect(arg_url, *args, **kwargs):
+        page = page_number(arg_url)
+        responses[page] = streamed_response(
+            page, 3, [article(f"{page}-{i}") for i in (0, 1)]
+        )
+        return responses[page]
+
+    mock_get.side_effect = side_effect
+
+    result = list(iter_results("test", stream=True))
+
+    assert [item["id"] for item in result] == [
+        "1-0",
+        "1-1",
+        "2-0",
+        "2-1",
+        "3-0",
+        "3-1",
+    ]
+    assert mock_get.call_args.kwargs["stream"] is True
+    for response in responses.values():
+        response.json.assert_not_called()
+        response.close.assert_called_once()
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_stream_keeps_articles_read_before_failure(
+    mock_get, mock_sm_client, caplog
+):
+    truncated = streamed_response(
+        2, 3, [article("b"), article("lost")], chunk_size=8
+    )
+    # The connection drops part way through the second article.
+    del truncated.iter_content.return_value[-2:]
+    mock_get.side_effect = [
+        streamed_response(1, 3, [article("a")]),
+        truncated,
+        streamed_response(3, 3, [article("c")]),
+    ]
+
+    with caplog.at_level(logging.ERROR):
+        result = list(iter_results("test", stream=True))
+
+    assert result == [article("a"), article("b"), article("c")]
+    assert "Failed to fetch 1 of 3 pages: [2]" in caplog.text
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_stream_stops_on_401(mock_get, mock_sm_client):
+    mock_get.side_effect = [
+        streamed_response(1, 3, [article("a")]),
+        error_response(401),
+        streamed_response(3, 3, [article("c")]),
+    ]
+
+    result = list(iter_results("test", stream=True))
+
+    assert result == [article("a")]
+    assert mock_get.call_count == 2
+
+
+def test_iter_results_stream_rejects_concurrent_workers():
+    with pytest.raises(ValueError):
+        list(iter_results("test", max_workers=4, stream=True))
+
+
+def rate_limited_response(retry_after=None):
+    response = MagicMock()
+    response.status_code = 429
+    response.headers = {"Retry-After": retry_after} if retry_after else {}
+    response.json.return_value = {"message": "API rate limit exceeded"}
+    return response
+
+
+@patch("src.fetch.RETRY_BACKOFF", 0.001)
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_retries_rate_limited_requests(mock_get, mock_sm_client):
+    mock_get.side_effect = [
+        rate_limited_response(),
+        rate_limited_response(),
+        paged_response(1, 1, [article("a")]),
+    ]
+
+    assert list(iter_results("test")) == [article("a")]
+    assert mock_get.call_count == 3
+
+
+@patch("src.fetch.guardian_rate")
+@patch("src.http_session.requests.Session.get")
+def test_fetch_pauses_every_request_for_retry_after(
+    mock_get, mock_guardian_rate, mock_sm_client
+):
+    mock_get.side_effect = [
+        rate_limited_response("30"),
+        paged_response(1, 1, [article("a")]),
+    ]
+
+    fetch("test")
+
+    [call] = mock_guardian_rate.pause.call_args_list
+    assert call.args[0] >= 30
+    assert mock_guardian_rate.acquire.call_count == 2
+
+
+@patch("src.fetch.RETRY_BACKOFF", 0.001)
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_stops_when_still_rate_limited(
+    mock_get, mock_sm_client, caplog
+):
+    mock_get.side_effect = [paged_response(1, 3, [article("a")])] + [
+        rate_limited_response()
+    ] * 4
+
+    with caplog.at_level(logging.ERROR):
+        result = list(iter_results("test"))
+
+    assert result == [article("a")]
+    assert mock_get.call_count == 5
+    assert "API rate limit exceeded" in caplog.text
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_stops_once_daily_quota_is_spent(
+    mock_get, mock_sm_client, caplog
+):
+    guardian_rate.configure(daily_quota=2)
+    mock_get.side_effect = lambda url, *args, **kwargs: paged_response(
+        page_number(url), 5, [article(page_number(url))]
+    )
+
+    with caplog.at_level(logging.ERROR):
+        result = list(iter_results("test"))
+
+    assert result == [article(1), article(2)]
+    assert mock_get.call_count == 2
+    assert "Daily quota of 2 requests used up" in caplog.text
+
+
+@pytest.fixture
+def cache(tmp_path):
+    response_cache.configure(str(tmp_path / "cache.db"), ttl=60)
+    yield response_cache.get_cache()
+    response_cache.configure(None)
+
+
+def cacheable(response, etag=None):
+    response.headers = {"ETag": etag} if etag else {}
+    response.content = json.dumps(response.json.return_value).encode()
+    return response
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_replays_cached_pages_without_requests(
+    mock_get, mock_sm_client, cache
+):
+    mock_get.side_effect = lambda url, *args, **kwargs: cacheable(
+        paged_response(page_number(url), 2, [article(page_number(url))])
+    )
+
+    first = list(iter_results("test"))
+    second = list(iter_results("test"))
+
+    assert first == second == [article(1), article(2)]
+    assert mock_get.call_count == 2
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_revalidates_stale_pages_with_etag(
+    mock_get, mock_sm_client, cache
+):
+    not_modified = MagicMock()
+    not_modified.status_code = 304
+    mock_get.side_effect = [
+        cacheable(paged_response(1, 1, [article("a")]), etag='"v1"'),
+        not_modified,
+    ]
+
+    # Entries expire at once, so the second run must revalidate.
+    cache.ttl = 0
+
+    list(iter_results("test"))
+    result = list(iter_results("test"))
+
+    assert result == [article("a")]
+    assert mock_get.call_args.kwargs["headers"] == {"If-None-Match": '"v1"'}
+
+
+@patch("src.http_session.requests.Session.get")
+def test_iter_results_caches_streamed_pages_once_read(
+    mock_get, mock_sm_client, cache
+):
+    def side_effect(arg_url, *args, **kwargs):
+        response = streamed_response(page_number(arg_url), 1, [article("a")])
+        response.headers = {}
+        return response
+
+    mock_get.side_effect = side_effect
+
+    first = list(iter_results("test", stream=True))
+    second = list(iter_results("test", stream=True))
+
+    assert first == second == [article("a")]
+    assert mock_get.call_count == 1
+
+
+@patch("src.http_session.requests.Session.get")
+def test_cached_pages_are_shared_across_api_keys(
+    mock_get, mock_sm_client, cache
+):
+    mock_get.return_value = cacheable(paged_response(1, 1, [article("a")]))
+
+    list(iter_results("test"))
+    guardian_api_key.clear()
+    mock_sm_client.put_secret_value(
+        SecretId="GUARDIAN_API_KEY", SecretString="rotated"
+    )
+    list(iter_results("test"))
+
+    assert mock_get.call_count == 1
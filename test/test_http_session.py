@@ -0,0 +1,37 @@
+import pytest
+from src.http_session import close_session, get_session
+
+
+@pytest.fixture(autouse=True)
+def fresh_session():
+    """Start and end every test without a shared session."""
+    close_session()
+    yield
+    close_session()
+
+
+def test_get_session_returns_same_session():
+    assert get_session() is get_session()
+
+
+def test_get_session_accepts_compressed_responses_and_keeps_alive():
+    session = get_session()
+
+    assert "gzip" in session.headers["Accept-Encoding"]
+    assert session.headers["Connection"] == "keep-alive"
+
+
+def test_get_session_grows_pool_to_requested_size():
+    session = get_session(pool_size=2)
+    get_session(pool_size=16)
+    get_session(pool_size=4)
+
+    adapter = session.get_adapter("https://content.guardianapis.com")
+    assert adapter._pool_maxsize == 16
+
+
+def test_close_session_discards_session():
+    session = get_session()
+    close_session()
+
+    assert get_session() is not session
@@ -0,0 +1,261 @@
+import boto3
+import json
+from moto import mock_aws
+import os
+import pytest
+import subprocess
+import sys
+from unittest.mock import patch
+from src import aws_clients, lambda_handler, main
+from src.message_format import MessageFormat
+from src.metrics import metrics
+from src.queries import Query
+from src.secret_cache import guardian_api_key
+from src.send_to_sqs import SendSummary
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+
+# Seconds allowed to import the handler module alone, which Lambda does on
+# every cold start, and to import the pipeline it loads during init.
+IMPORT_BUDGET = 0.25
+COLD_START_BUDGET = 2.0
+
+# Modules too slow to import with the handler, before they are needed.
+HEAVY_MODULES = ("boto3", "botocore", "requests")
+
+
+def time_import(statements: str) -> float:
+    """
+    Return the seconds taken to run import statements in a fresh
+    interpreter, laid out as in the Lambda layer.
+    """
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        f"{statements}\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.split()[-1])
+
+
+@pytest.fixture(autouse=True)
+def reset_handler():
+    """Start every test as a cold start, without cached clients or keys."""
+    lambda_handler._main = None
+    aws_clients.clear()
+    guardian_api_key.clear()
+    yield
+    lambda_handler._main = None
+    aws_clients.clear()
+    guardian_api_key.clear()
+
+
+@pytest.fixture(scope="function")
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "eu-west-2"
+
+
+@pytest.fixture(scope="function")
+def mock_sm_client(aws_credentials):
+    """Return a mocked Secrets Manager client with a stored secret."""
+    with mock_aws():
+        client = boto3.client("secretsmanager", region_name="eu-west-2")
+        client.create_secret(Name="GUARDIAN_API_KEY", SecretString="test")
+        yield client
+
+
+def test_handler_module_imports_within_budget_without_heavy_modules():
+    seconds = time_import(
+        "import sys\n"
+        "import lambda_handler\n"
+        f"assert not set({HEAVY_MODULES!r}) & set(sys.modules)"
+    )
+
+    assert seconds < IMPORT_BUDGET, f"Handler imported in {seconds:.3f}s"
+
+
+def test_pipeline_imports_within_cold_start_budget():
+    seconds = time_import("import lambda_handler\nimport main")
+
+    assert seconds < COLD_START_BUDGET, f"Pipeline loaded in {seconds:.3f}s"
+
+
+def test_load_opens_clients_and_key_once(mock_sm_client):
+    with patch.object(
+        guardian_api_key, "get", wraps=guardian_api_key.get
+    ) as get:
+        first = lambda_handler.load()
+        second = lambda_handler.load()
+
+    assert first is second
+    assert get.call_count == 1
+    assert guardian_api_key.get() == "test"
+
+
+def test_parse_event_reads_cli_parameters():
+    queries, options = lambda_handler.parse_event(
+        {
+            "search_term": "brexit",
+            "queries": ["football", {"search_term": "tennis"}],
+            "date_from": "2024-01-01",
+            "sqs_queue_name": "SENTINEL",
+            "page_size": 50,
+            "unordered": True,
+            "fields": "webTitle,webUrl",
+            "encoding": "gzip",
+        },
+        main,
+    )
+
+    assert queries == [
+        Query("brexit", "2024-01-01", "SENTINEL"),
+        Query("football", "2024-01-01", "SENTINEL"),
+        Query("tennis", "2024-01-01", "SENTINEL"),
+    ]
+    assert options["page_size"] == 50
+    assert options["ordered"] is False
+    assert options["message_format"] == MessageFormat(
+        ("webTitle", "webUrl"), "gzip"
+    )
+
+
+def test_parse_event_requires_a_query():
+    with pytest.raises(ValueError):
+        lambda_handler.parse_event({}, main)
+
+
+def test_parse_event_reads_dedup_and_spool_parameters(tmp_path):
+    _, options = lambda_handler.parse_event(
+        {
+            "search_term": "brexit",
+            "dedup_dir": str(tmp_path / "dedup"),
+            "dedup_bloom_capacity": 0,
+            "dedup_error_rate": 0.01,
+            "spool": str(tmp_path / "spool"),
+        },
+        main,
+    )
+
+    assert options["dedup_bloom_capacity"] == 0
+    assert options["dedup_error_rate"] == 0.01
+    assert options["spool"].directory == str(tmp_path / "spool")
+
+
+@pytest.mark.parametrize(
+    "event",
+    [
+        {"search_term": "brexit", "shard": "daily"},
+        {"search_term": "brexit", "processes": 4},
+        {"search_term": "brexit", "sqs_queue": "SENTINEL"},
+        {"search_term": "brexit", "daily_quota": 500},
+        {"search_term": "brexit", "dedup_error_rate": 1},
+    ],
+)
+def test_parse_event_rejects_parameters_it_does_not_take(event):
+    with pytest.raises(ValueError):
+        lambda_handler.parse_event(event, main)
+
+
+def test_configure_sets_rate_limits_and_cache_once(tmp_path):
+    event = {
+        "search_term": "brexit",
+        "rate_limit": 2,
+        "daily_quota": 500,
+        "quota_file": str(tmp_path / "quota"),
+        "cache": str(tmp_path / "cache.db"),
+        "cache_ttl": 60,
+    }
+    try:
+        lambda_handler.configure(event, main)
+        cache = main.response_cache.get_cache()
+        with patch.object(main.guardian_rate, "configure") as configure:
+            lambda_handler.configure(event, main)
+
+        assert not configure.called
+        assert main.response_cache.get_cache() is cache
+        assert main.guardian_rate.settings() == {
+            "rate": 2,
+            "daily_quota": 500,
+            "quota_file": str(tmp_path / "quota"),
+        }
+        assert cache.ttl == 60
+
+        lambda_handler.configure({"search_term": "brexit"}, main)
+
+        assert main.guardian_rate.rate == main.RATE_LIMIT
+        assert main.response_cache.get_cache() is None
+    finally:
+        main.guardian_rate.configure(main.RATE_LIMIT)
+        main.response_cache.configure(None)
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_handler_sends_results_and_returns_counts(
+    mock_iter_results, mock_send_to_sqs, mock_sm_client
+):
+    mock_iter_results.return_value = iter({"id": i} for i in range(5))
+    mock_send_to_sqs.return_value = SendSummary(successful=5)
+
+    result = lambda_handler.handler(
+        {"search_term": "brexit", "sqs_queue_name": "SENTINEL"}, None
+    )
+
+    assert result["sent"] == 5
+    assert result["failed"] == 0
+    assert result["queries"][0]["search_term"] == "brexit"
+    assert result["queries"][0]["fetched"] == 5
+    assert mock_send_to_sqs.call_args.args[1] == "SENTINEL"
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_handler_emits_metrics_of_each_invocation(
+    mock_iter_results, mock_send_to_sqs, mock_sm_client, capsys
+):
+    mock_iter_results.side_effect = lambda *args, **kwargs: iter([])
+    mock_send_to_sqs.return_value = SendSummary()
+    lambda_handler.load()
+    metrics.configure(enabled=True)
+    metrics.count("articles.sent", 2)
+
+    try:
+        with patch.dict(os.environ, {"AWS_LAMBDA_FUNCTION_NAME": "fetch"}):
+            lambda_handler.handler({"search_term": "brexit"}, None)
+        lambda_handler.handler({"search_term": "brexit"}, None)
+    finally:
+        metrics.configure(enabled=False)
+
+    first, second = map(json.loads, capsys.readouterr().out.splitlines())
+    assert first["FunctionName"] == "fetch"
+    assert first["articles.sent"] == 2
+    assert "FunctionName" not in second
+    assert "articles.sent" not in second
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_handler_profiles_invocation_when_asked(
+    mock_iter_results, mock_send_to_sqs, mock_sm_client, tmp_path
+):
+    mock_iter_results.return_value = iter({"id": i} for i in range(5))
+    mock_send_to_sqs.return_value = SendSummary(successful=5)
+    path = tmp_path / "profile.txt"
+
+    with patch.dict(os.environ, {"GUARDIAN_PROFILE": str(path)}):
+        result = lambda_handler.handler({"search_term": "brexit"}, None)
+
+    assert result["sent"] == 5
+    assert "Time by stage" in path.read_text()
@@ -1,34 +1,507 @@
+import json
+import os
+import threading
 from unittest.mock import patch
-from src.main import main
+from src.dedup import BloomFilter
+from src.main import (
+    backfill_unit,
+    main,
+    run_backfill,
+    run_daemon,
+    run_process_backfill,
+    run_queries,
+)
+from src.message_format import MessageFormat
+from src.queries import Query, QueryStats
+from src.send_to_sqs import SendSummary
+from src.spool import Spool
 
 
 @patch("src.main.send_to_sqs")
-@patch("src.main.fetch")
-def test_main_calls_fetch_with_correct_arguments_without_date_from(
-    mock_fetch, mock_send_to_sqs
+@patch("src.main.iter_results")
+def test_main_calls_iter_results_with_correct_arguments_without_date_from(
+    mock_iter_results, mock_send_to_sqs
 ):
     main("machine learning")
 
-    mock_fetch.assert_called_once_with("machine learning", None)
+    mock_iter_results.assert_called_once_with(
+        "machine learning",
+        None,
+        failed_pages=[],
+        page_size=200,
+        max_workers=1,
+        ordered=True,
+        timeout=(5, 5),
+    )
 
 
 @patch("src.main.send_to_sqs")
-@patch("src.main.fetch")
-def test_main_calls_fetch_with_correct_arguments_with_date_from(
-    mock_fetch, mock_send_to_sqs
+@patch("src.main.iter_results")
+def test_main_calls_iter_results_with_correct_arguments_with_date_from(
+    mock_iter_results, mock_send_to_sqs
 ):
     main("machine learning", "2023-01-01")
 
-    mock_fetch.assert_called_once_with("machine learning", "2023-01-01")
+    mock_iter_results.assert_called_once_with(
+        "machine learning",
+        "2023-01-01",
+        failed_pages=[],
+        page_size=200,
+        max_workers=1,
+        ordered=True,
+        timeout=(5, 5),
+    )
 
 
 @patch("src.main.send_to_sqs")
-@patch("src.main.fetch")
+@patch("src.main.iter_results")
 def test_main_does_not_call_send_to_sqs_when_no_results_from_fetch(
-    mock_fetch, mock_send_to_sqs
+    mock_iter_results, mock_send_to_sqs
 ):
-    mock_fetch.return_value = []
+    mock_iter_results.return_value = iter([])
 
     main("test")
 
     mock_send_to_sqs.assert_not_called()
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_main_streams_every_result_to_send_to_sqs(
+    mock_iter_results, mock_send_to_sqs
+):
+    mock_iter_results.return_value = iter({"id": i} for i in range(25))
+    sent = []
+
+    def send(messages, queue, **kwargs):
+        sent.extend(messages)
+        return SendSummary(successful=len(sent))
+
+    mock_send_to_sqs.side_effect = send
+
+    main("test", sqs_queue_name="SENTINEL")
+
+    assert sent == [{"id": i} for i in range(25)]
+    mock_send_to_sqs.assert_called_once()
+    assert mock_send_to_sqs.call_args.args[1] == "SENTINEL"
+
+
+def article(id, published):
+    return {"id": id, "webPublicationDate": published}
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_main_with_checkpoint_sends_only_new_articles(
+    mock_iter_results, mock_send_to_sqs, tmp_path
+):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    sent = []
+
+    def send(messages, queue, **kwargs):
+        sent.extend(messages)
+        return SendSummary(successful=len(sent))
+
+    mock_send_to_sqs.side_effect = send
+    mock_iter_results.return_value = iter(
+        [article("b", "2024-01-02"), article("a", "2024-01-01")]
+    )
+    main("test", checkpoint=checkpoint)
+
+    sent.clear()
+    mock_iter_results.return_value = iter(
+        [
+            article("d", "2024-01-03"),
+            article("c", "2024-01-02"),
+            article("b", "2024-01-02"),
+            article("a", "2024-01-01"),
+        ]
+    )
+    main("test", checkpoint=checkpoint)
+
+    assert [a["id"] for a in sent] == ["d", "c"]
+    assert mock_iter_results.call_args.kwargs["order_by"] == "newest"
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_main_with_checkpoint_keeps_watermark_when_sending_fails(
+    mock_iter_results, mock_send_to_sqs, tmp_path
+):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    mock_send_to_sqs.side_effect = lambda messages, queue, **kw: SendSummary(
+        failed=[{"Id": str(i)} for i, _ in enumerate(messages)]
+    )
+    mock_iter_results.return_value = iter([article("a", "2024-01-01")])
+
+    main("test", checkpoint=checkpoint)
+
+    assert not os.path.exists(checkpoint)
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_main_with_checkpoint_keeps_watermark_when_a_page_fails(
+    mock_iter_results, mock_send_to_sqs, tmp_path
+):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    mock_send_to_sqs.side_effect = lambda messages, queue, **kw: SendSummary(
+        successful=len(list(messages))
+    )
+
+    def results(term, date_from, failed_pages, **kwargs):
+        yield article("b", "2024-01-03")
+        failed_pages.append(2)
+
+    mock_iter_results.side_effect = results
+
+    stats = main("test", checkpoint=checkpoint)
+
+    assert stats.sent == 1
+    assert stats.failed_pages == 1
+    assert not stats.complete
+    assert not os.path.exists(checkpoint)
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_main_with_dedup_dir_drops_articles_sent_by_earlier_runs(
+    mock_iter_results, mock_send_to_sqs, tmp_path
+):
+    sent = []
+
+    def send(messages, queue, **kwargs):
+        sent.extend(messages)
+        return SendSummary(successful=len(sent))
+
+    mock_send_to_sqs.side_effect = send
+    mock_iter_results.return_value = iter([{"id": "a"}, {"id": "b"}])
+    main("test", dedup_dir=str(tmp_path))
+
+    sent.clear()
+    mock_iter_results.return_value = iter(
+        [{"id": "b"}, {"id": "c"}, {"id": "c"}]
+    )
+    main("other", dedup_dir=str(tmp_path))
+
+    assert sent == [{"id": "c"}]
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_run_queries_sizes_or_turns_off_the_dedup_bloom_filter(
+    mock_iter_results, mock_send_to_sqs, tmp_path
+):
+    mock_iter_results.side_effect = lambda *args, **kw: iter([{"id": "a"}])
+    mock_send_to_sqs.return_value = SendSummary(successful=1)
+    sized, off = tmp_path / "sized", tmp_path / "off"
+
+    run_queries(
+        [Query("test")],
+        dedup_dir=str(sized),
+        dedup_bloom_capacity=1000,
+        dedup_error_rate=0.01,
+    )
+    run_queries([Query("test")], dedup_dir=str(off), dedup_bloom_capacity=0)
+
+    assert BloomFilter.load(str(sized / "ids.bloom")).num_bits == 9586
+    assert not (off / "ids.bloom").exists()
+    assert (off / "recent_ids.json").exists()
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_run_queries_sends_overlapping_articles_once_per_queue(
+    mock_iter_results, mock_send_to_sqs
+):
+    results = {
+        "a": [{"id": "1"}, {"id": "2"}],
+        "b": [{"id": "2"}, {"id": "3"}],
+        "c": [{"id": "2"}],
+    }
+    mock_iter_results.side_effect = lambda term, date_from, **kw: iter(
+        results[term]
+    )
+    sent = {"q1": [], "q2": []}
+
+    def send(messages, queue, **kwargs):
+        messages = list(messages)
+        sent[queue].extend(m["id"] for m in messages)
+        return SendSummary(successful=len(messages))
+
+    mock_send_to_sqs.side_effect = send
+
+    stats = run_queries(
+        [
+            Query("a", None, "q1"),
+            Query("b", None, "q1"),
+            Query("c", None, "q2"),
+        ]
+    )
+
+    assert sorted(sent["q1"]) == ["1", "2", "3"]
+    assert sent["q2"] == ["2"]
+    assert [s.query.search_term for s in stats] == ["a", "b", "c"]
+    assert sum(s.fetched for s in stats) == 5
+    assert sum(s.sent for s in stats) == 4
+    assert sum(s.skipped for s in stats) == 1
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_run_queries_passes_per_query_date_from(
+    mock_iter_results, mock_send_to_sqs
+):
+    mock_iter_results.return_value = iter([])
+
+    run_queries(
+        [Query("a", "2024-01-01"), Query("b", "2024-02-01")], max_queries=1
+    )
+
+    assert [c.args for c in mock_iter_results.call_args_list] == [
+        ("a", "2024-01-01"),
+        ("b", "2024-02-01"),
+    ]
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_run_daemon_sends_only_new_articles_on_each_poll(
+    mock_iter_results, mock_send_to_sqs
+):
+    stop = threading.Event()
+    polls = [
+        [article("a", "2024-01-01")],
+        [article("b", "2024-01-02"), article("a", "2024-01-01")],
+        [article("b", "2024-01-02"), article("a", "2024-01-01")],
+    ]
+
+    def fetch(*args, **kwargs):
+        results = polls.pop(0)
+        if not polls:
+            stop.set()
+        return iter(results)
+
+    mock_iter_results.side_effect = fetch
+    sent = []
+
+    def send(messages, queue, **kwargs):
+        messages = list(messages)
+        sent.append([m["id"] for m in messages])
+        return SendSummary(successful=len(messages))
+
+    mock_send_to_sqs.side_effect = send
+
+    polls_made = run_daemon(
+        [Query("test")], min_interval=0, max_interval=0, stop=stop
+    )
+
+    assert polls_made == 3
+    assert sent == [["a"], ["b"]]
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_run_daemon_sends_again_articles_whose_send_failed(
+    mock_iter_results, mock_send_to_sqs
+):
+    stop = threading.Event()
+    polls = 3
+
+    def fetch(*args, **kwargs):
+        nonlocal polls
+        polls -= 1
+        if not polls:
+            stop.set()
+        return iter([article("a", "2024-01-01")])
+
+    mock_iter_results.side_effect = fetch
+    sent = []
+
+    def send(messages, queue, **kwargs):
+        messages = list(messages)
+        sent.append([m["id"] for m in messages])
+        if len(sent) == 1:
+            return SendSummary(failed=[{"Id": "0"}])
+        return SendSummary(successful=len(messages))
+
+    mock_send_to_sqs.side_effect = send
+
+    run_daemon([Query("test")], min_interval=0, max_interval=0, stop=stop)
+
+    assert sent == [["a"], ["a"]]
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_run_backfill_sends_shards_in_order_and_resumes_missing_ones(
+    mock_iter_results, mock_send_to_sqs, tmp_path
+):
+    shard_log = str(tmp_path / "shards.log")
+    mock_iter_results.side_effect = lambda term, date_from, **kw: iter(
+        [article(date_from, date_from)]
+    )
+    sent, fail_on = [], {"2024-01-03"}
+
+    def send(messages, queue, **kwargs):
+        ids = [m["id"] for m in messages]
+        if fail_on.intersection(ids):
+            return SendSummary(failed=[{"Id": "0"}])
+        sent.extend(ids)
+        return SendSummary(successful=len(ids))
+
+    mock_send_to_sqs.side_effect = send
+    query = Query("test", "2024-01-01", date_to="2024-01-04")
+
+    stats = run_backfill(query, "daily", shard_log)
+
+    assert sent == ["2024-01-01", "2024-01-02", "2024-01-04"]
+    assert [s.failed for s in stats] == [0, 0, 1, 0]
+    assert mock_iter_results.call_args.kwargs["order_by"] == "oldest"
+
+    sent.clear()
+    fail_on.clear()
+    run_backfill(query, "daily", shard_log)
+
+    assert sent == ["2024-01-03"]
+
+
+@patch("src.main.iter_shard_results")
+def test_run_backfill_buffers_a_whole_adaptive_shard(mock_iter_shard_results):
+    mock_iter_shard_results.return_value = iter([])
+    query = Query("test", "2024-01-01", date_to="2024-01-02")
+
+    run_backfill(query, "daily", max_shard_results=2000, queue_size=100)
+
+    assert mock_iter_shard_results.call_args.args[3] == 2000
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_run_backfill_with_dedup_dir_resends_a_failed_shard(
+    mock_iter_results, mock_send_to_sqs, tmp_path
+):
+    shard_log = str(tmp_path / "shards.log")
+    dedup_dir = str(tmp_path / "dedup")
+    mock_iter_results.side_effect = lambda term, date_from, **kw: iter(
+        [article(date_from, date_from)]
+    )
+    sent, fail_on = [], {"2024-01-01"}
+
+    def send(messages, queue, **kwargs):
+        ids = [m["id"] for m in messages]
+        if fail_on.intersection(ids):
+            return SendSummary(failed=[{"Id": "0"}])
+        sent.extend(ids)
+        return SendSummary(successful=len(ids))
+
+    mock_send_to_sqs.side_effect = send
+    query = Query("test", "2024-01-01", date_to="2024-01-02")
+
+    run_backfill(query, "daily", shard_log, dedup_dir=dedup_dir)
+    fail_on.clear()
+    stats = run_backfill(query, "daily", shard_log, dedup_dir=dedup_dir)
+
+    assert sent == ["2024-01-02", "2024-01-01"]
+    assert [(s.fetched, s.queued, s.sent) for s in stats] == [(1, 1, 1)]
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_run_backfill_does_not_mark_a_shard_with_failed_pages_done(
+    mock_iter_results, mock_send_to_sqs, tmp_path
+):
+    shard_log = str(tmp_path / "shards.log")
+    fail = True
+
+    def results(term, date_from, failed_pages, **kwargs):
+        yield article(date_from, date_from)
+        if fail:
+            failed_pages.append(2)
+
+    mock_iter_results.side_effect = results
+    mock_send_to_sqs.side_effect = lambda messages, queue, **kw: SendSummary(
+        successful=len(list(messages))
+    )
+    query = Query("test", "2024-01-01", date_to="2024-01-01")
+
+    [stats] = run_backfill(query, "daily", shard_log)
+    fail = False
+    resumed = run_backfill(query, "daily", shard_log)
+
+    assert stats.failed_pages == 1
+    assert [s.failed_pages for s in resumed] == [0]
+    assert run_backfill(query, "daily", shard_log) == []
+
+
+@patch("src.main.run_processes")
+def test_run_process_backfill_skips_units_in_shard_log(
+    mock_run_processes, tmp_path
+):
+    shard_log = str(tmp_path / "shards.log")
+    query = Query("test", "2024-01-01", date_to="2024-01-04")
+
+    def run(units, worker, max_processes, on_done, **options):
+        for unit in units:
+            on_done(
+                QueryStats(
+                    unit,
+                    failed=int(unit.date_from == "2024-01-02"),
+                    failed_pages=int(unit.date_from == "2024-01-03"),
+                )
+            )
+
+    mock_run_processes.side_effect = run
+    run_process_backfill(query, "daily", shard_log=shard_log)
+    run_process_backfill(query, "daily", shard_log=shard_log)
+
+    second_units = mock_run_processes.call_args_list[1].args[0]
+    assert [u.date_from for u in second_units] == [
+        "2024-01-02",
+        "2024-01-03",
+    ]
+    assert mock_run_processes.call_args.args[1] is backfill_unit
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_main_requests_show_fields_and_passes_message_format(
+    mock_iter_results, mock_send_to_sqs
+):
+    message_format = MessageFormat(("webTitle", "fields.trailText"), "gzip")
+    mock_iter_results.return_value = iter([{"id": "a", "webTitle": "A"}])
+    mock_send_to_sqs.return_value = SendSummary(successful=1)
+
+    main("machine learning", message_format=message_format)
+
+    assert mock_iter_results.call_args.kwargs["show_fields"] == ("trailText",)
+    assert (
+        mock_send_to_sqs.call_args.kwargs["message_format"] == message_format
+    )
+
+
+@patch("src.main.send_to_sqs")
+@patch("src.main.iter_results")
+def test_run_backfill_with_spool_writes_messages_instead_of_sending(
+    mock_iter_results, mock_send_to_sqs, tmp_path
+):
+    mock_iter_results.side_effect = lambda term, date_from, **kw: iter(
+        [article(date_from, date_from)]
+    )
+    spool = Spool(str(tmp_path))
+    query = Query("test", "2024-01-01", "q", "2024-01-03")
+
+    stats = run_backfill(query, "daily", spool=spool)
+
+    mock_send_to_sqs.assert_not_called()
+    assert [s.sent for s in stats] == [1, 1, 1]
+    entries = [
+        entry
+        for segment in spool.segments("q")
+        for entry in spool.read("q", segment)
+    ]
+    assert [json.loads(e["MessageBody"])["id"] for e in entries] == [
+        "2024-01-01",
+        "2024-01-02",
+        "2024-01-03",
+    ]
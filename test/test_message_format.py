@@ -0,0 +1,82 @@
+import base64
+import gzip
+import json
+import pytest
+from src.article import Article
+from src.message_format import (
+    DEFAULT_FIELDS,
+    MessageFormat,
+    decode,
+    parse_fields,
+)
+from test.fixtures import results_fixture
+
+
+@pytest.fixture
+def article():
+    return {**results_fixture[0], "fields": {"trailText": "A preview"}}
+
+
+def test_message_format_sends_whole_article_by_default(article):
+    entry = MessageFormat().entry("0", article)
+
+    assert entry == {"Id": "0", "MessageBody": json.dumps(article)}
+
+
+def test_message_format_serialises_articles_like_results(article):
+    entry = MessageFormat().entry("0", Article(article))
+
+    assert entry == {"Id": "0", "MessageBody": json.dumps(article)}
+
+
+def test_message_format_projects_allowed_fields(article):
+    projected = MessageFormat(DEFAULT_FIELDS).project(article)
+
+    assert projected == {key: article[key] for key in DEFAULT_FIELDS}
+
+
+def test_message_format_projects_show_fields_extras(article):
+    message_format = MessageFormat(("webTitle", "fields.trailText"))
+
+    assert message_format.show_fields == ("trailText",)
+    assert message_format.project(article) == {
+        "webTitle": article["webTitle"],
+        "fields": {"trailText": "A preview"},
+    }
+
+
+def test_message_format_skips_missing_fields(article):
+    message_format = MessageFormat(("webTitle", "missing", "fields.body"))
+
+    assert message_format.project(article) == {"webTitle": article["webTitle"]}
+
+
+def test_message_format_compact_encoding_is_minified(article):
+    entry = MessageFormat(encoding="compact").entry("0", article)
+
+    assert entry["MessageBody"] == json.dumps(article, separators=(",", ":"))
+    assert len(entry["MessageBody"]) < len(json.dumps(article))
+
+
+def test_message_format_gzip_encoding_is_marked_and_decodes(article):
+    entry = MessageFormat(encoding="gzip").entry("0", article)
+
+    attributes = entry["MessageAttributes"]
+    assert attributes["ContentEncoding"]["StringValue"] == "gzip+base64"
+    assert json.loads(
+        gzip.decompress(base64.b64decode(entry["MessageBody"]))
+    ) == (article)
+    assert decode(entry["MessageBody"], attributes) == article
+
+
+def test_message_format_rejects_unknown_encoding():
+    with pytest.raises(ValueError):
+        MessageFormat(encoding="zstd")
+
+
+def test_parse_fields_splits_and_strips():
+    assert parse_fields("webTitle, webUrl,,fields.trailText") == (
+        "webTitle",
+        "webUrl",
+        "fields.trailText",
+    )
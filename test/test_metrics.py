@@ -0,0 +1,184 @@
+import boto3
+import io
+import json
+from moto import mock_aws
+import os
+import pytest
+from src import aws_clients
+from src.metrics import (
+    MAX_EMF_VALUES,
+    Histogram,
+    Metrics,
+    _distribution,
+    metrics,
+)
+from src.send_to_sqs import send_to_sqs
+from test.fixtures import results_fixture
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    """Start every test with the process-wide metrics off and empty."""
+    metrics.configure(enabled=False)
+    aws_clients.clear()
+    yield
+    metrics.configure(enabled=False)
+    aws_clients.clear()
+
+
+@pytest.fixture(scope="function")
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "eu-west-2"
+
+
+@pytest.fixture(scope="function")
+def mock_sqs_client(aws_credentials):
+    """Return a mocked SQS client."""
+    with mock_aws():
+        yield boto3.client("sqs", region_name="eu-west-2")
+
+
+def test_histogram_percentiles_are_within_five_percent():
+    histogram = Histogram()
+    for ms in range(1, 1001):
+        histogram.add(ms / 1000)
+
+    for percent in (50, 95, 99):
+        exact = percent / 100
+        assert histogram.percentile(percent) == pytest.approx(exact, rel=0.05)
+    assert histogram.percentile(100) == 1.0
+    assert histogram.count == 1000
+    assert histogram.min == 0.001
+
+
+def test_histogram_counts_zero_values():
+    histogram = Histogram()
+    for value in (0.0, 0.0, 2.0, 2.0):
+        histogram.add(value)
+
+    assert histogram.percentile(50) == 0.0
+    assert histogram.percentile(75) == pytest.approx(2.0, rel=0.05)
+    assert histogram.percentile(99) == 2.0
+
+
+def test_disabled_metrics_record_nothing():
+    disabled = Metrics(enabled=False)
+
+    with disabled.timer("stage"):
+        pass
+    disabled.count("articles")
+
+    assert disabled.snapshot() == {"counters": {}, "timers": {}}
+
+
+def test_timer_records_durations():
+    ticks = iter([1.0, 1.25, 2.0, 2.5])
+    enabled = Metrics(enabled=True, clock=lambda: next(ticks))
+
+    for _ in range(2):
+        with enabled.timer("stage"):
+            pass
+
+    timer = enabled.snapshot()["timers"]["stage"]
+    assert timer["count"] == 2
+    assert timer["seconds"] == 0.75
+    assert timer["p99"] == 0.5
+
+
+def test_timer_records_blocks_that_raise():
+    enabled = Metrics(enabled=True)
+
+    with pytest.raises(RuntimeError):
+        with enabled.timer("stage"):
+            raise RuntimeError
+
+    assert enabled.snapshot()["timers"]["stage"]["count"] == 1
+
+
+def test_emf_document_defines_every_metric():
+    enabled = Metrics(enabled=True)
+    enabled.count("articles.sent", 3)
+    enabled.observe("guardian.request", 0.2)
+
+    document = enabled.emf({"FunctionName": "fetch"}, timestamp=1.5)
+
+    [directive] = document["_aws"]["CloudWatchMetrics"]
+    assert document["_aws"]["Timestamp"] == 1500
+    assert directive["Dimensions"] == [["FunctionName"]]
+    assert document["FunctionName"] == "fetch"
+    for definition in directive["Metrics"]:
+        assert definition["Name"] in document
+    assert document["articles.sent"] == 3
+    assert document["guardian.request"]["Counts"] == [1]
+    assert document["guardian.request.p99"] == pytest.approx(200)
+
+
+def test_emf_distribution_stays_within_value_limit():
+    histogram = Histogram()
+    for exponent in range(400):
+        histogram.add(1.05**exponent)
+
+    distribution = _distribution(histogram)
+
+    assert len(distribution["Values"]) <= MAX_EMF_VALUES
+    assert sum(distribution["Counts"]) == 400
+
+
+def test_emit_writes_one_json_line():
+    enabled = Metrics(enabled=True)
+    enabled.count("articles.sent")
+    out = io.StringIO()
+
+    enabled.emit(out)
+
+    [line] = out.getvalue().splitlines()
+    assert json.loads(line)["articles.sent"] == 1
+
+
+def test_summary_lists_timers_and_counters():
+    enabled = Metrics(enabled=True)
+    enabled.observe("guardian.request", 0.25)
+    enabled.count("articles.sent", 7)
+
+    lines = enabled.summary().splitlines()
+
+    assert lines[0].split() == [
+        "stage",
+        "count",
+        "seconds",
+        "p50",
+        "ms",
+        "p95",
+        "ms",
+        "p99",
+        "ms",
+    ]
+    assert lines[1].split() == [
+        "guardian.request",
+        "1",
+        "0.250",
+        "250.0",
+        "250.0",
+        "250.0",
+    ]
+    assert lines[2].split() == ["articles.sent", "7"]
+
+
+def test_send_to_sqs_records_stages(mock_sqs_client):
+    mock_sqs_client.create_queue(QueueName="SENTINEL")
+    metrics.configure(enabled=True)
+
+    send_to_sqs(results_fixture, "SENTINEL")
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["articles.sent"] == len(results_fixture)
+    assert snapshot["counters"]["sqs.batches"] == 1
+    assert snapshot["counters"]["sqs.bytes"] > 0
+    assert snapshot["timers"]["sqs.serialise"]["count"] == len(results_fixture)
+    assert snapshot["timers"]["sqs.send_message_batch"]["count"] == 1
+    assert snapshot["timers"]["sqs.get_queue_url"]["count"] == 1
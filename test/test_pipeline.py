@@ -0,0 +1,94 @@
+import pytest
+import threading
+import time
+from src.pipeline import Stage, staged
+
+
+def test_staged_yields_every_item_in_order():
+    assert list(staged(range(1000), maxsize=10)) == list(range(1000))
+
+
+def test_staged_produces_on_another_thread():
+    threads = set()
+
+    def produce():
+        for i in range(3):
+            threads.add(threading.current_thread())
+            yield i
+
+    list(staged(produce()))
+
+    assert threading.current_thread() not in threads
+
+
+def test_staged_holds_producer_back_when_queue_is_full():
+    produced = []
+
+    def produce():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    items = staged(produce(), maxsize=5)
+    next(items)
+    time.sleep(0.2)
+
+    # One item consumed, five queued and one waiting to be queued.
+    assert len(produced) <= 7
+    items.close()
+
+
+def test_staged_overlaps_producer_and_consumer():
+    def produce():
+        for i in range(5):
+            time.sleep(0.05)
+            yield i
+
+    start = time.perf_counter()
+    for _ in staged(produce()):
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.45
+
+
+def test_staged_raises_producer_errors_in_consumer():
+    def produce():
+        yield 1
+        raise RuntimeError("Test error")
+
+    items = staged(produce())
+
+    assert next(items) == 1
+    with pytest.raises(RuntimeError, match="Test error"):
+        next(items)
+
+
+def test_staged_stops_and_closes_producer_when_consumer_stops():
+    closed = threading.Event()
+
+    def produce():
+        try:
+            for i in range(1_000_000):
+                yield i
+        finally:
+            closed.set()
+
+    items = staged(produce(), maxsize=2)
+    next(items)
+    items.close()
+
+    assert closed.is_set()
+
+
+def test_stage_starts_producing_before_first_item_is_requested():
+    started = threading.Event()
+
+    def produce():
+        started.set()
+        yield 1
+
+    stage = Stage(produce())
+
+    assert started.wait(1)
+    stage.close()
@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+import pstats
+from src.article import Article
+from src.fetch import to_articles
+from src.message_format import MessageFormat
+from src.profiling import Profiler, peak_rss
+from test.fixtures import results_fixture
+
+
+def build_articles(count: int) -> list[Article]:
+    return [Article(results_fixture[i % 10]) for i in range(count)]
+
+
+def test_profiler_attributes_time_in_every_thread_to_stages(tmp_path):
+    message_format = MessageFormat()
+
+    with Profiler(str(tmp_path / "profile.txt")) as profiler:
+        articles = build_articles(100)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(
+                executor.map(
+                    message_format.entry, map(str, range(100)), articles
+                )
+            )
+
+    stages = {row[0]: row for row in profiler._stages(profiler.stats())}
+    assert stages["articles"][1] == "100"
+    assert stages["serialise"][1] == "100"
+    assert "send" not in stages
+
+
+def test_profiler_attributes_memory_at_peak_to_stages(tmp_path):
+    with Profiler(str(tmp_path / "profile.txt")) as profiler:
+        articles = list(
+            to_articles(results_fixture[i % 10] for i in range(5000))
+        )
+
+    stages = [row[0] for row in profiler._memory_by_stage()]
+    assert stages[1] == "fetch"
+    assert profiler.peak_traced > 0
+    assert len(articles) == 5000
+
+
+def test_profiler_writes_report_and_raw_profile(tmp_path):
+    path = tmp_path / "profile.txt"
+
+    with Profiler(str(path), top=5):
+        build_articles(100)
+
+    report = path.read_text()
+    for heading in (
+        "Peak RSS",
+        "Time by stage",
+        "Top functions by own time",
+        "Top functions by cumulative time",
+        "Memory by stage at peak",
+        "Top allocation sites at peak",
+    ):
+        assert heading in report
+    assert "article.py" in report
+    assert pstats.Stats(str(path) + ".prof").total_calls > 0
+
+
+def test_peak_rss_is_in_bytes():
+    assert peak_rss() > 1024 * 1024
@@ -0,0 +1,87 @@
+import json
+from src.queries import (
+    Query,
+    QueryStats,
+    SeenIds,
+    format_summary,
+    load_queries,
+)
+
+
+def test_load_queries_reads_strings_and_objects_with_defaults(tmp_path):
+    path = tmp_path / "queries.json"
+    path.write_text(
+        json.dumps(
+            {
+                "queries": [
+                    "brexit",
+                    {"search_term": "climate", "date_from": "2024-01-01"},
+                    {"search_term": "football", "sqs_queue_name": "sport"},
+                ]
+            }
+        )
+    )
+
+    queries = load_queries(str(path), "2023-01-01", "news")
+
+    assert queries == [
+        Query("brexit", "2023-01-01", "news"),
+        Query("climate", "2024-01-01", "news"),
+        Query("football", "2023-01-01", "sport"),
+    ]
+
+
+def test_load_queries_reads_top_level_list(tmp_path):
+    path = tmp_path / "queries.json"
+    path.write_text(json.dumps(["brexit"]))
+
+    assert load_queries(str(path)) == [Query("brexit")]
+
+
+def test_seen_ids_drops_repeated_ids_per_queue():
+    seen = SeenIds()
+
+    first = list(seen.filter([{"id": "a"}, {"id": "b"}], "q1"))
+    second = list(seen.filter([{"id": "b"}, {"id": "c"}], "q1"))
+    other_queue = list(seen.filter([{"id": "b"}], "q2"))
+
+    assert first == [{"id": "a"}, {"id": "b"}]
+    assert second == [{"id": "c"}]
+    assert other_queue == [{"id": "b"}]
+
+
+def test_query_stats_throughput_and_skipped():
+    stats = QueryStats(Query("test"), fetched=50, queued=40, seconds=2.0)
+
+    assert stats.throughput == 25.0
+    assert stats.skipped == 10
+    assert QueryStats(Query("test")).throughput == 0.0
+
+
+def test_format_summary_has_a_row_per_query():
+    summary = format_summary(
+        [
+            QueryStats(Query("brexit"), fetched=10, queued=10, sent=10),
+            QueryStats(Query("climate", sqs_queue_name="other"), fetched=3),
+        ]
+    )
+
+    lines = summary.splitlines()
+    assert lines[0].split() == [
+        "query",
+        "queue",
+        "fetched",
+        "skipped",
+        "sent",
+        "failed",
+        "seconds",
+        "articles/s",
+    ]
+    assert lines[1].split()[:5] == [
+        "brexit",
+        "guardian_content",
+        "10",
+        "0",
+        "10",
+    ]
+    assert lines[2].split()[:2] == ["climate", "other"]
@@ -0,0 +1,150 @@
+from datetime import datetime, timezone
+import json
+import pytest
+import threading
+from src.rate_limit import (
+    DailyCounter,
+    QuotaExhausted,
+    RateGovernor,
+    backoff,
+    retry_after,
+)
+
+
+class FakeTime:
+    """A clock that only moves when the governor sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def noon():
+    return datetime(2024, 12, 10, 12, tzinfo=timezone.utc)
+
+
+def governor(fake, **kwargs):
+    return RateGovernor(clock=fake.clock, sleep=fake.sleep, now=noon, **kwargs)
+
+
+def test_rate_governor_allows_burst_then_paces_requests():
+    fake = FakeTime()
+    rate = governor(fake, rate=2, burst=2)
+
+    for _ in range(4):
+        rate.acquire()
+
+    assert fake.slept == [0.5, 0.5]
+
+
+def test_rate_governor_without_limits_never_waits():
+    fake = FakeTime()
+    rate = governor(fake)
+
+    for _ in range(100):
+        rate.acquire()
+
+    assert fake.slept == []
+
+
+def test_rate_governor_pause_holds_back_every_caller():
+    fake = FakeTime()
+    rate = governor(fake)
+
+    rate.pause(3)
+    rate.acquire()
+
+    assert fake.slept == [3]
+
+
+def test_rate_governor_raises_once_quota_is_spent():
+    fake = FakeTime()
+    rate = governor(fake, daily_quota=10)
+
+    for _ in range(10):
+        rate.acquire()
+
+    with pytest.raises(QuotaExhausted):
+        rate.acquire()
+
+
+def test_rate_governor_spreads_reserve_over_rest_of_day():
+    fake = FakeTime()
+    rate = governor(fake, daily_quota=10)
+
+    for _ in range(10):
+        rate.acquire()
+
+    # The last two requests share the twelve hours left until midnight.
+    assert fake.slept == [6 * 60 * 60]
+
+
+def test_rate_governor_counts_quota_in_file_across_governors(tmp_path):
+    path = str(tmp_path / "quota.json")
+    first = governor(FakeTime(), daily_quota=100, quota_file=path)
+    second = governor(FakeTime(), daily_quota=100, quota_file=path)
+
+    for _ in range(3):
+        first.acquire()
+        second.acquire()
+
+    with open(path) as file:
+        assert json.load(file) == {"date": "2024-12-10", "count": 6}
+
+
+def test_daily_counter_resets_each_day(tmp_path):
+    counter = DailyCounter(str(tmp_path / "quota.json"))
+
+    counter.take("2024-12-10")
+    counter.take("2024-12-10")
+
+    assert counter.take("2024-12-11") == 1
+
+
+def test_daily_counter_does_not_count_past_limit():
+    counter = DailyCounter()
+
+    assert [counter.take("2024-12-10", limit=2) for _ in range(3)] == [
+        1,
+        2,
+        None,
+    ]
+
+
+def test_rate_governor_is_shared_safely_between_threads():
+    rate = RateGovernor(daily_quota=1000, sleep=lambda seconds: None)
+
+    threads = [
+        threading.Thread(target=lambda: [rate.acquire() for _ in range(50)])
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with pytest.raises(QuotaExhausted):
+        for _ in range(601):
+            rate.acquire()
+
+
+def test_retry_after_reads_seconds_and_http_dates():
+    now = datetime(2024, 12, 10, 12, tzinfo=timezone.utc)
+
+    assert retry_after("7") == 7
+    assert retry_after("Tue, 10 Dec 2024 12:00:30 GMT", now) == 30
+    assert retry_after(None) == 0
+    assert retry_after("soon") == 0
+
+
+def test_backoff_grows_with_jitter_and_respects_minimum():
+    assert 0.5 <= backoff(0, 1) <= 1.5
+    assert 4 <= backoff(3, 1) <= 12
+    assert backoff(0, 1, minimum=30) == 30
@@ -0,0 +1,106 @@
+from datetime import datetime, timezone
+import pytest
+from src.response_cache import ResponseCache, cache_key, ttl_for
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.db"), ttl=60, clock=clock)
+    yield cache
+    cache.close()
+
+
+def test_cache_key_ignores_api_key_and_parameter_order():
+    assert cache_key({"q": "brexit", "page": 2, "api-key": "one"}) == (
+        cache_key({"page": 2, "api-key": "two", "q": "brexit"})
+    )
+    assert cache_key({"q": "brexit", "page": 2}) != cache_key(
+        {"q": "brexit", "page": 3}
+    )
+
+
+def test_ttl_for_keeps_historical_queries_longer():
+    now = datetime(2024, 12, 10, tzinfo=timezone.utc)
+
+    assert ttl_for({"q": "brexit"}, 60, now) == 60
+    assert ttl_for({"to-date": "2024-12-10"}, 60, now) == 60
+    assert ttl_for({"to-date": "2024-11-30"}, 60, now) == 7 * 24 * 60 * 60
+
+
+def test_response_cache_returns_fresh_body(cache):
+    cache.put("key", b'{"response": {}}')
+
+    cached = cache.get("key")
+
+    assert cached.body == b'{"response": {}}'
+    assert cached.fresh
+
+
+def test_response_cache_stores_bodies_compressed(cache):
+    body = b'{"webTitle": "repeated"}' * 1000
+
+    cache.put("key", body)
+
+    assert cache.size() < len(body) / 10
+
+
+def test_response_cache_drops_expired_entry_without_validators(cache, clock):
+    cache.put("key", b"{}")
+
+    clock.now += 61
+
+    assert cache.get("key") is None
+
+
+def test_response_cache_keeps_expired_entry_to_revalidate(cache, clock):
+    cache.put("key", b"{}", etag='"v1"')
+    clock.now += 61
+
+    cached = cache.get("key")
+    assert not cached.fresh
+    assert cached.etag == '"v1"'
+
+    cache.revalidated("key")
+    assert cache.get("key").fresh
+
+
+def test_response_cache_honours_per_entry_ttl(cache, clock):
+    cache.put("short", b"{}", ttl=10)
+    cache.put("long", b"{}", ttl=1000)
+
+    clock.now += 100
+
+    assert cache.get("short") is None
+    assert cache.get("long").fresh
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.db"), clock=clock)
+    for key in ("a", "b", "c"):
+        clock.now += 1
+        cache.put(key, key.encode() * 1000)
+    size = cache.size()
+    clock.now += 1
+    cache.get("a")
+
+    cache.max_bytes = size
+    clock.now += 1
+    cache.put("d", b"d" * 1000)
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.get("d") is not None
@@ -0,0 +1,110 @@
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from moto import mock_aws
+import os
+import pytest
+from src import aws_clients
+from src.secret_cache import SecretCache
+
+
+@pytest.fixture(autouse=True)
+def clear_aws_clients():
+    """Start every test without cached AWS clients or queue URLs."""
+    aws_clients.clear()
+    yield
+    aws_clients.clear()
+
+
+@pytest.fixture(scope="function")
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "eu-west-2"
+
+
+@pytest.fixture(scope="function")
+def mock_sm_client(aws_credentials):
+    """Return a mocked Secrets Manager client with a stored secret."""
+    with mock_aws():
+        client = boto3.client("secretsmanager", region_name="eu-west-2")
+        client.create_secret(Name="SENTINEL", SecretString="first")
+        yield client
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_secret_cache_reuses_value_within_ttl(mock_sm_client, caplog):
+    clock = FakeClock()
+    cache = SecretCache("SENTINEL", ttl=60, clock=clock)
+
+    with caplog.at_level(logging.INFO):
+        assert cache.get() == "first"
+        mock_sm_client.put_secret_value(
+            SecretId="SENTINEL", SecretString="second"
+        )
+        clock.now = 59
+        assert cache.get() == "first"
+
+    assert caplog.text.count("Retrieving API key") == 1
+
+
+def test_secret_cache_refetches_after_ttl(mock_sm_client):
+    clock = FakeClock()
+    cache = SecretCache("SENTINEL", ttl=60, clock=clock)
+
+    cache.get()
+    mock_sm_client.put_secret_value(SecretId="SENTINEL", SecretString="second")
+    clock.now = 60
+
+    assert cache.get() == "second"
+
+
+def test_secret_cache_refresh_fetches_once_for_same_stale_value(
+    mock_sm_client, caplog
+):
+    cache = SecretCache("SENTINEL")
+    stale = cache.get()
+    mock_sm_client.put_secret_value(SecretId="SENTINEL", SecretString="second")
+
+    with caplog.at_level(logging.INFO):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            refreshed = list(executor.map(cache.refresh, [stale] * 8))
+
+    assert refreshed == ["second"] * 8
+    assert caplog.text.count("Retrieving API key") == 1
+
+
+def test_secret_cache_refresh_fetches_once_for_unchanged_secret(
+    mock_sm_client, caplog
+):
+    cache = SecretCache("SENTINEL")
+    stale = cache.get()
+
+    with caplog.at_level(logging.INFO):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            refreshed = list(executor.map(cache.refresh, [stale] * 8))
+
+    assert refreshed == [stale] * 8
+    assert caplog.text.count("Retrieving API key") == 1
+
+
+def test_secret_cache_returns_none_and_logs_missing_secret(
+    aws_credentials, caplog
+):
+    with mock_aws():
+        cache = SecretCache("MISSING")
+
+        with caplog.at_level(logging.ERROR):
+            assert cache.get() is None
+
+    assert "Failed to retrieve Guardian API key" in caplog.text
@@ -4,10 +4,27 @@ import json
 import logging
 import os
 import pytest
-from src.send_to_sqs import send_to_sqs
+from src import aws_clients
+from src.message_format import DEFAULT_FIELDS, MessageFormat, decode
+from src.send_to_sqs import (
+    SendSummary,
+    entry_size,
+    pack_batches,
+    send_batch,
+    send_to_sqs,
+)
+from unittest.mock import MagicMock, patch
 from test.fixtures import results_fixture
 
 
+@pytest.fixture(autouse=True)
+def clear_aws_clients():
+    """Start every test without cached AWS clients or queue URLs."""
+    aws_clients.clear()
+    yield
+    aws_clients.clear()
+
+
 @pytest.fixture(scope="function")
 def aws_credentials():
     """Mocked AWS Credentials for moto."""
@@ -74,3 +91,155 @@ def test__send_to_sqs__logs_number_of_articles_being_sent(
         send_to_sqs(messages[:7], test_queue_name)
 
     assert f"Sending 7 messages to queue {test_queue_name}" in caplog.text
+
+
+def test__send_to_sqs__sends_more_than_one_batch(mock_sqs_client):
+    test_queue_name = "SENTINEL"
+    response = mock_sqs_client.create_queue(QueueName=test_queue_name)
+    mock_queue_url = response["QueueUrl"]
+    messages = ({"id": i} for i in range(35))
+
+    summary = send_to_sqs(messages, test_queue_name)
+
+    attributes = mock_sqs_client.get_queue_attributes(
+        QueueUrl=mock_queue_url,
+        AttributeNames=["ApproximateNumberOfMessages"],
+    )["Attributes"]
+    assert attributes["ApproximateNumberOfMessages"] == "35"
+    assert summary == SendSummary(successful=35)
+
+
+def test__send_to_sqs__sends_projected_gzipped_messages(mock_sqs_client):
+    test_queue_name = "SENTINEL"
+    response = mock_sqs_client.create_queue(QueueName=test_queue_name)
+    mock_queue_url = response["QueueUrl"]
+
+    send_to_sqs(
+        results_fixture,
+        test_queue_name,
+        message_format=MessageFormat(DEFAULT_FIELDS, "gzip"),
+    )
+
+    retrieved_messages = mock_sqs_client.receive_message(
+        QueueUrl=mock_queue_url,
+        MaxNumberOfMessages=10,
+        MessageAttributeNames=["All"],
+    )["Messages"]
+    retrieved_messages = [
+        decode(message["Body"], message["MessageAttributes"])
+        for message in retrieved_messages
+    ]
+
+    assert len(retrieved_messages) == len(results_fixture)
+    assert all(set(m) == set(DEFAULT_FIELDS) for m in retrieved_messages)
+
+
+def test__entry_size__counts_message_attributes():
+    entry = MessageFormat(encoding="gzip").entry("0", {"id": "a"})
+
+    assert entry_size(entry) == (
+        len(entry["MessageBody"])
+        + len("ContentEncoding")
+        + len("String")
+        + len("gzip+base64")
+    )
+
+
+def test__pack_batches__respects_entry_count_limit():
+    entries = [{"Id": str(i), "MessageBody": "x"} for i in range(25)]
+
+    batches = list(pack_batches(entries))
+
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+
+
+def test__pack_batches__respects_payload_size_limit():
+    entries = [{"Id": str(i), "MessageBody": "x" * 100} for i in range(7)]
+
+    batches = list(pack_batches(entries, max_bytes=250))
+
+    assert [len(batch) for batch in batches] == [2, 2, 2, 1]
+
+
+def test__pack_batches__places_oversized_entry_in_its_own_batch():
+    entries = [
+        {"Id": "0", "MessageBody": "x"},
+        {"Id": "1", "MessageBody": "x" * 300},
+        {"Id": "2", "MessageBody": "x"},
+    ]
+
+    batches = list(pack_batches(entries, max_bytes=250))
+
+    assert [[e["Id"] for e in batch] for batch in batches] == [
+        ["0"],
+        ["1"],
+        ["2"],
+    ]
+
+
+def test__send_batch__retries_only_failed_entries():
+    sqs = MagicMock()
+    sqs.send_message_batch.side_effect = [
+        {
+            "Successful": [{"Id": "0"}, {"Id": "2"}],
+            "Failed": [{"Id": "1", "Code": "InternalError"}],
+        },
+        {"Successful": [{"Id": "1"}]},
+    ]
+    entries = [{"Id": str(i), "MessageBody": "x"} for i in range(3)]
+
+    summary = send_batch(sqs, "url", entries, backoff=0)
+
+    retried = sqs.send_message_batch.call_args_list[1].kwargs["Entries"]
+    assert [entry["Id"] for entry in retried] == ["1"]
+    assert summary == SendSummary(successful=3, retries=1)
+
+
+def test__send_batch__does_not_retry_sender_faults():
+    sqs = MagicMock()
+    failure = {"Id": "0", "Code": "InvalidMessage", "SenderFault": True}
+    sqs.send_message_batch.return_value = {"Failed": [failure]}
+    entries = [{"Id": "0", "MessageBody": "x"}]
+
+    summary = send_batch(sqs, "url", entries, backoff=0)
+
+    assert sqs.send_message_batch.call_count == 1
+    assert summary.failed == [failure]
+
+
+def test__send_batch__reports_entries_still_failing_after_max_retries():
+    sqs = MagicMock()
+    failure = {"Id": "0", "Code": "InternalError", "SenderFault": False}
+    sqs.send_message_batch.return_value = {"Failed": [failure]}
+    entries = [{"Id": "0", "MessageBody": "x"}]
+
+    summary = send_batch(sqs, "url", entries, max_retries=2, backoff=0)
+
+    assert sqs.send_message_batch.call_count == 3
+    assert summary == SendSummary(failed=[failure], retries=2)
+
+
+def test__send_to_sqs__resolves_queue_url_once_across_calls(
+    mock_sqs_client, messages
+):
+    mock_sqs_client.create_queue(QueueName="SENTINEL")
+    send_to_sqs(messages[:2], "SENTINEL")
+    sqs = aws_clients.get_client("sqs")
+
+    with patch.object(sqs, "get_queue_url") as mock_get_queue_url:
+        send_to_sqs(messages[2:4], "SENTINEL")
+
+    mock_get_queue_url.assert_not_called()
+
+
+def test__send_to_sqs__looks_up_redeployed_queue_again(
+    mock_sqs_client, messages
+):
+    response = mock_sqs_client.create_queue(QueueName="SENTINEL")
+    mock_queue_url = response["QueueUrl"]
+    aws_clients._queue_urls[(None, "SENTINEL")] = mock_queue_url + "-stale"
+
+    summary = send_to_sqs(messages[:3], "SENTINEL")
+
+    assert summary.successful == 3
+    assert aws_clients.get_queue_url("SENTINEL") == mock_queue_url
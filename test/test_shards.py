@@ -0,0 +1,120 @@
+import pytest
+import threading
+import time
+from src.shards import (
+    Shard,
+    ShardLog,
+    iter_shard_results,
+    plan_adaptive,
+    split_range,
+)
+
+
+def test_split_range_makes_consecutive_inclusive_shards():
+    assert split_range("2024-01-01", "2024-01-17", 7) == [
+        Shard("2024-01-01", "2024-01-07"),
+        Shard("2024-01-08", "2024-01-14"),
+        Shard("2024-01-15", "2024-01-17"),
+    ]
+
+
+def test_split_range_accepts_dates_with_times():
+    assert split_range("2024-01-01T10:00:00Z", "2024-01-02", 1) == [
+        Shard("2024-01-01", "2024-01-01"),
+        Shard("2024-01-02", "2024-01-02"),
+    ]
+
+
+def test_split_range_rejects_reversed_range():
+    with pytest.raises(ValueError):
+        split_range("2024-01-02", "2024-01-01", 1)
+
+
+def test_plan_adaptive_splits_busy_ranges_more_finely():
+    # 100 results a day in the first week, 1 a day afterwards.
+    def count(shard):
+        days = split_range(shard.date_from, shard.date_to, 1)
+        return sum(100 if d.date_from < "2024-01-08" else 1 for d in days)
+
+    shards = plan_adaptive("2024-01-01", "2024-01-31", count, max_results=150)
+
+    assert shards[0].date_from == "2024-01-01"
+    assert shards[-1].date_to == "2024-01-31"
+    assert all(a.date_to < b.date_from for a, b in zip(shards, shards[1:]))
+    assert all(count(shard) <= 150 for shard in shards)
+    assert max(s.days for s in shards if s.date_from >= "2024-01-08") > 7
+    assert sum(s.days for s in shards) == 31
+
+
+def test_plan_adaptive_keeps_single_days_over_the_limit():
+    shards = plan_adaptive(
+        "2024-01-01", "2024-01-02", lambda shard: 1000, max_results=10
+    )
+
+    assert shards == [
+        Shard("2024-01-01", "2024-01-01"),
+        Shard("2024-01-02", "2024-01-02"),
+    ]
+
+
+def test_shard_log_records_finished_shards_across_instances(tmp_path):
+    path = str(tmp_path / "shards.log")
+    log = ShardLog(path)
+    log.mark_done("query", Shard("2024-01-01", "2024-01-07"))
+
+    reopened = ShardLog(path)
+
+    assert reopened.is_done("query", Shard("2024-01-01", "2024-01-07"))
+    assert not reopened.is_done("query", Shard("2024-01-08", "2024-01-14"))
+    assert not reopened.is_done("other", Shard("2024-01-01", "2024-01-07"))
+
+
+def test_shard_log_ignores_line_cut_short(tmp_path):
+    path = tmp_path / "shards.log"
+    path.write_text('{"query": "q", "date_from": "2024-01-01", "dat')
+
+    assert not ShardLog(str(path)).is_done("q", Shard("2024-01-01", "x"))
+
+
+def test_iter_shard_results_yields_shards_in_order_fetched_in_parallel():
+    shards = split_range("2024-01-01", "2024-01-06", 1)
+    active, peak = 0, 0
+    lock = threading.Lock()
+
+    def fetch_shard(shard):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        # Later shards finish first.
+        time.sleep(0.01 * (7 - int(shard.date_from[-2:])))
+        with lock:
+            active -= 1
+        yield shard.date_from
+        yield shard.date_to
+
+    result = [
+        (shard, list(results))
+        for shard, results in iter_shard_results(shards, fetch_shard, 3)
+    ]
+
+    assert [shard for shard, _ in result] == shards
+    assert all(items == [s.date_from, s.date_to] for s, items in result)
+    assert peak > 1
+
+
+def test_iter_shard_results_fetches_later_shards_within_their_buffer():
+    shards = split_range("2024-01-01", "2024-01-03", 1)
+    finished = {shard: threading.Event() for shard in shards}
+
+    def fetch_shard(shard):
+        yield from range(10)
+        finished[shard].set()
+
+    results = iter_shard_results(shards, fetch_shard, 3, queue_size=10)
+    first, items = next(results)
+
+    # Later shards download whole before the first is consumed.
+    assert all(finished[shard].wait(5) for shard in shards)
+    assert list(items) == list(range(10))
+    assert [len(list(items)) for _, items in results] == [10, 10]
@@ -0,0 +1,279 @@
+import boto3
+from moto import mock_aws
+import gzip
+import json
+import os
+import pickle
+import pytest
+from src import aws_clients
+from src.message_format import MessageFormat, decode
+from src.send_to_sqs import SendSummary
+from src.spool import ReplayLog, Spool, replay
+from unittest.mock import patch
+from test.fixtures import results_fixture
+
+
+@pytest.fixture(autouse=True)
+def clear_aws_clients():
+    """Start every test without cached AWS clients or queue URLs."""
+    aws_clients.clear()
+    yield
+    aws_clients.clear()
+
+
+@pytest.fixture(scope="function")
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "eu-west-2"
+
+
+@pytest.fixture(scope="function")
+def mock_sqs_client(aws_credentials):
+    """Return a mocked SQS client."""
+    with mock_aws():
+        yield boto3.client("sqs", region_name="eu-west-2")
+
+
+def messages(count: int) -> list[dict]:
+    return [{"id": str(i), "webTitle": f"Title {i}"} for i in range(count)]
+
+
+def receive_all(sqs, queue_url: str) -> list[dict]:
+    received = []
+    while True:
+        batch = sqs.receive_message(
+            QueueUrl=queue_url,
+            MaxNumberOfMessages=10,
+            MessageAttributeNames=["All"],
+        ).get("Messages", [])
+        if not batch:
+            return received
+        received += batch
+        sqs.delete_message_batch(
+            QueueUrl=queue_url,
+            Entries=[
+                {"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]}
+                for i, m in enumerate(batch)
+            ],
+        )
+
+
+def test_append_writes_complete_segments_of_at_most_segment_size(tmp_path):
+    spool = Spool(str(tmp_path), segment_size=10)
+
+    written = spool.append("q", iter(messages(25)))
+
+    assert written == 25
+    segments = spool.segments("q")
+    assert len(segments) == 3
+    assert not [n for n in os.listdir(tmp_path / "q") if n.endswith(".part")]
+    entries = [e for s in segments for e in spool.read("q", s)]
+    assert [json.loads(e["MessageBody"]) for e in entries] == messages(25)
+    assert [e["Id"] for e in entries[:2]] == ["0", "1"]
+
+
+def test_append_writes_each_message_to_the_open_segment(tmp_path):
+    spool = Spool(str(tmp_path), segment_size=10)
+    partials = []
+
+    def produce():
+        for message in messages(3):
+            yield message
+            partials.append(
+                [n for n in os.listdir(tmp_path / "q") if n.endswith(".part")]
+            )
+
+    spool.append("q", produce())
+
+    # The segment is open from the first message until the input ends.
+    assert [len(p) for p in partials] == [1, 1, 1]
+    assert len(spool.segments("q")) == 1
+
+
+def test_append_completes_the_segment_when_messages_raise(tmp_path):
+    spool = Spool(str(tmp_path))
+
+    def produce():
+        yield from messages(2)
+        raise RuntimeError("Test error")
+
+    with pytest.raises(RuntimeError):
+        spool.append("q", produce())
+
+    [segment] = spool.segments("q")
+    assert len(list(spool.read("q", segment))) == 2
+
+
+def test_append_serialises_with_the_message_format(tmp_path):
+    spool = Spool(str(tmp_path))
+
+    spool.append("q", results_fixture, MessageFormat(("webTitle",), "gzip"))
+
+    [segment] = spool.segments("q")
+    entry = next(spool.read("q", segment))
+    assert decode(entry["MessageBody"], entry["MessageAttributes"]) == {
+        "webTitle": results_fixture[0]["webTitle"]
+    }
+
+
+def test_read_starts_from_a_line(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append("q", messages(5))
+    [segment] = spool.segments("q")
+
+    assert [e["Id"] for e in spool.read("q", segment, 3)] == ["3", "4"]
+
+
+def test_spool_survives_pickling(tmp_path):
+    spool = pickle.loads(pickle.dumps(Spool(str(tmp_path), segment_size=3)))
+
+    assert spool.append("q", messages(4)) == 4
+    assert len(spool.segments("q")) == 2
+
+
+def test_recover_keeps_whole_lines_of_abandoned_segments(tmp_path):
+    spool = Spool(str(tmp_path))
+    os.makedirs(tmp_path / "q")
+    lines = b"".join(
+        json.dumps({"MessageBody": str(i)}).encode() + b"\n" for i in range(3)
+    )
+    data = gzip.compress(lines + b'{"MessageBody": "cut')
+    # A gzip stream cut short, as left by a writer killed part way, whose
+    # process id has since been reused by a live process, this one.
+    crashed = tmp_path / "q" / f"{0:020d}-{os.getpid()}-000000.ndjson.gz.part"
+    crashed.write_bytes(data[:-8])
+
+    assert spool.recover("q") == 3
+
+    [segment] = spool.segments("q")
+    assert [e["MessageBody"] for e in spool.read("q", segment)] == [
+        "0",
+        "1",
+        "2",
+    ]
+    assert not crashed.exists()
+
+
+def test_recover_leaves_segments_being_written(tmp_path):
+    spool = Spool(str(tmp_path))
+    os.makedirs(tmp_path / "q")
+    writer = spool._open_segment("q")
+    writer.write({"MessageBody": "0"})
+
+    assert spool.recover("q") == 0
+    assert spool.segments("q") == []
+
+    writer.close()
+    [segment] = spool.segments("q")
+    assert [e["MessageBody"] for e in spool.read("q", segment)] == ["0"]
+
+
+def test_replay_log_ignores_a_line_cut_short(tmp_path):
+    path = tmp_path / "q.log"
+    log = ReplayLog(str(path))
+    log.mark_sent("a", 10)
+    log.mark_done("b")
+    with open(path, "a") as f:
+        f.write('{"segment": "a", "se')
+
+    log = ReplayLog(str(path))
+
+    assert log.sent("a") == 10
+    assert log.is_done("b")
+    assert not log.is_done("a")
+
+
+def test_replay_sends_every_message_once_and_marks_segments_done(
+    mock_sqs_client, tmp_path
+):
+    queue_url = mock_sqs_client.create_queue(QueueName="q")["QueueUrl"]
+    spool = Spool(str(tmp_path), segment_size=15)
+    spool.append("q", messages(40), MessageFormat(encoding="gzip"))
+
+    summary = replay(spool)
+    again = replay(spool)
+
+    assert summary.successful == 40
+    assert again.successful == 0
+    received = receive_all(mock_sqs_client, queue_url)
+    assert sorted(
+        int(decode(m["Body"], m["MessageAttributes"])["id"]) for m in received
+    ) == list(range(40))
+
+
+def test_replay_sends_to_another_queue_independently(
+    mock_sqs_client, tmp_path
+):
+    mock_sqs_client.create_queue(QueueName="q")
+    other_url = mock_sqs_client.create_queue(QueueName="other")["QueueUrl"]
+    spool = Spool(str(tmp_path))
+    spool.append("q", messages(12))
+    replay(spool)
+
+    summary = replay(spool, queue="other")
+
+    assert summary.successful == 12
+    assert len(receive_all(mock_sqs_client, other_url)) == 12
+
+
+def test_replay_resumes_after_the_last_batch_sent(mock_sqs_client, tmp_path):
+    queue_url = mock_sqs_client.create_queue(QueueName="q")["QueueUrl"]
+    spool = Spool(str(tmp_path))
+    spool.append("q", messages(30))
+
+    def fail_after_first(sqs, queue_url, batch, **kwargs):
+        if batch[0]["Id"] != "0":
+            return SendSummary(
+                failed=[{"Id": e["Id"], "SenderFault": False} for e in batch]
+            )
+        sqs.send_message_batch(QueueUrl=queue_url, Entries=batch)
+        return SendSummary(successful=len(batch))
+
+    with patch("src.spool.send_batch", side_effect=fail_after_first):
+        summary = replay(spool, max_workers=1)
+
+    assert summary.successful == 10
+    assert summary.failed
+
+    resumed = replay(spool)
+
+    assert resumed.successful == 20
+    received = receive_all(mock_sqs_client, queue_url)
+    assert sorted(int(json.loads(m["Body"])["id"]) for m in received) == list(
+        range(30)
+    )
+
+
+def test_replay_skips_messages_sqs_rejects(mock_sqs_client, tmp_path):
+    mock_sqs_client.create_queue(QueueName="q")
+    spool = Spool(str(tmp_path))
+    spool.append("q", messages(3))
+
+    def reject_first(sqs, queue_url, batch, **kwargs):
+        return SendSummary(
+            successful=len(batch) - 1,
+            failed=[{"Id": "0", "Code": "Invalid", "SenderFault": True}],
+        )
+
+    with patch("src.spool.send_batch", side_effect=reject_first):
+        summary = replay(spool)
+
+    assert summary.successful == 2
+    assert replay(spool).successful == 0
+
+
+@patch("src.spool.RateGovernor.acquire")
+def test_replay_takes_a_token_per_message(
+    mock_acquire, mock_sqs_client, tmp_path
+):
+    mock_sqs_client.create_queue(QueueName="q")
+    spool = Spool(str(tmp_path))
+    spool.append("q", messages(25))
+
+    replay(spool, rate=5)
+
+    assert mock_acquire.call_count == 25
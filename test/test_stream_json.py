@@ -0,0 +1,89 @@
+from functools import partial
+import io
+import json
+import pytest
+from src.stream_json import ResultsStream
+from test.fixtures import response_fixture
+
+body_fixture = json.dumps(response_fixture).encode("utf-8")
+
+
+def chunked(body, size):
+    return list(iter(partial(io.BytesIO(body).read, size), b""))
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 1 << 20])
+def test_results_stream_yields_every_result_for_any_chunk_size(size):
+    body = json.dumps(response_fixture, indent=2).encode("utf-8")
+
+    stream = ResultsStream(chunked(body, size))
+
+    assert list(stream) == response_fixture["response"]["results"]
+    assert stream.fields["pages"] == response_fixture["response"]["pages"]
+    assert stream.fields["total"] == response_fixture["response"]["total"]
+
+
+def test_results_stream_yields_before_body_is_read():
+    chunks_read = []
+
+    def chunks():
+        for chunk in chunked(body_fixture, 16):
+            chunks_read.append(chunk)
+            yield chunk
+
+    next(ResultsStream(chunks()))
+
+    assert len(chunks_read) < len(chunked(body_fixture, 16))
+
+
+def test_results_stream_collects_header_fields_before_first_result():
+    stream = ResultsStream(chunked(body_fixture, 5))
+
+    next(stream)
+
+    assert stream.fields["pages"] == response_fixture["response"]["pages"]
+
+
+def test_results_stream_does_not_split_numbers_across_chunks():
+    body = b'{"response": {"results": [12345, 6.5e3], "pages": 10}}'
+
+    stream = ResultsStream([body[:30], body[30:42], body[42:]])
+
+    assert list(stream) == [12345, 6500.0]
+    assert stream.fields["pages"] == 10
+
+
+def test_results_stream_decodes_characters_split_across_chunks():
+    body = json.dumps(
+        {"response": {"results": [{"webTitle": "café – naïve"}]}},
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+    stream = ResultsStream(chunked(body, 1))
+
+    assert list(stream) == [{"webTitle": "café – naïve"}]
+
+
+def test_results_stream_handles_empty_results():
+    stream = ResultsStream([b'{"response": {"results": [], "pages": 0}}'])
+
+    assert list(stream) == []
+    assert stream.fields["pages"] == 0
+
+
+def test_results_stream_raises_on_truncated_body():
+    with pytest.raises(ValueError):
+        list(ResultsStream(chunked(body_fixture, 1000)[:1]))
+
+
+def test_results_stream_calls_on_close_when_closed_early():
+    closed = []
+    stream = ResultsStream(
+        chunked(body_fixture, 64),
+        on_close=lambda: closed.append(True),
+    )
+
+    next(stream)
+    stream.close()
+
+    assert closed == [True]